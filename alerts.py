@@ -0,0 +1,249 @@
+"""
+Failure and recovery alerts
+
+The scheduler reports failed and recovered runs to an AlertManager, which
+only puts an event on a queue. A background thread applies the alert
+policy and hands messages to the channels, so a slow mail server or
+webhook never holds up a task:
+
+- a task's first failure is sent at once; later failures of the same task
+  within its dedup window (the alert_window task option, ALERT_WINDOW
+  seconds by default) are held back
+- when a task's window ends with failures held back, they go out as one
+  digest together with those of every other task due at the same time,
+  and the window starts again, so a task failing every minute sends one
+  message per window instead of one per run
+- across all tasks at most ALERT_RATE immediate alerts go out per minute;
+  failures over the limit are held for a digest ALERT_DIGEST_DELAY seconds
+  later
+- a task succeeding after failures sends a recovery notice
+
+Channels: email to ALERT_EMAIL_TO (comma-separated), queued in the email
+outbox, and a JSON POST to ALERT_WEBHOOK_URL. Anything with a
+send(alert: dict) method can be added with add_channel().
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+ALERT_EMAIL_TO = [address.strip() for address in os.environ.get('ALERT_EMAIL_TO', '').split(',')
+                  if address.strip()]
+ALERT_WEBHOOK_URL = os.environ.get('ALERT_WEBHOOK_URL')
+ALERT_WINDOW_SECONDS = int(os.environ.get('ALERT_WINDOW', '600'))
+ALERT_RATE_PER_MINUTE = int(os.environ.get('ALERT_RATE', '10'))
+ALERT_DIGEST_DELAY_SECONDS = int(os.environ.get('ALERT_DIGEST_DELAY', '60'))
+WEBHOOK_TIMEOUT_SECONDS = 10
+
+# Error text kept per event
+MAX_ERROR_CHARS = 500
+
+
+@dataclass
+class AlertEvent:
+    task_id: int
+    task_name: str
+    kind: str  # 'failure' or 'recovery'
+    time: datetime
+    error: Optional[str] = None
+    attempt: int = 1
+    failures: int = 0  # Failed runs before a recovery
+
+    def to_dict(self) -> Dict:
+        event = asdict(self)
+        event['time'] = self.time.isoformat()
+        return event
+
+
+@dataclass
+class _TaskState:
+    window: float
+    due_at: float  # When held failures go out and the dedup window ends
+    held: List[AlertEvent] = field(default_factory=list)
+
+
+class EmailChannel:
+    """Queue alerts in the email outbox"""
+
+    def __init__(self, recipients: List[str]):
+        self.recipients = recipients
+
+    def send(self, alert: Dict):
+        from outbox import queue_email
+
+        for recipient in self.recipients:
+            queue_email(recipient, alert['subject'], alert['text'])
+
+
+class WebhookChannel:
+    """POST alerts as JSON"""
+
+    def __init__(self, url: str, timeout: float = WEBHOOK_TIMEOUT_SECONDS):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert: Dict):
+        request = urllib.request.Request(self.url, data=json.dumps(alert).encode(), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def default_channels() -> List:
+    """Channels configured through the environment"""
+    channels = []
+    if ALERT_EMAIL_TO:
+        channels.append(EmailChannel(ALERT_EMAIL_TO))
+    if ALERT_WEBHOOK_URL:
+        channels.append(WebhookChannel(ALERT_WEBHOOK_URL))
+    return channels
+
+
+def _failure_alert(event: AlertEvent, window: float) -> Dict:
+    text = (f"Task: {event.task_name} (id {event.task_id})\n"
+            f"Time: {event.time.isoformat()}\n"
+            f"Attempt: {event.attempt}\n"
+            f"Error: {event.error or 'unknown'}\n")
+    if window:
+        text += f"\nFurther failures of this task in the next {window:g}s will be sent as one digest.\n"
+    return {'kind': 'failure', 'subject': f"🚨 Task failed: {event.task_name}", 'text': text,
+            'events': [event.to_dict()]}
+
+
+def _recovery_alert(event: AlertEvent) -> Dict:
+    text = (f"Task: {event.task_name} (id {event.task_id})\n"
+            f"Time: {event.time.isoformat()}\n"
+            f"Succeeded after {event.failures} failed run(s).\n")
+    return {'kind': 'recovery', 'subject': f"✅ Task recovered: {event.task_name}", 'text': text,
+            'events': [event.to_dict()]}
+
+
+def _digest_alert(held: Dict[int, List[AlertEvent]]) -> Dict:
+    failures = sum(len(events) for events in held.values())
+    lines = [f"{failures} failure(s) of {len(held)} task(s) were held back:\n"]
+    for events in held.values():
+        last = events[-1]
+        lines.append(f"- {last.task_name} (id {last.task_id}): {len(events)} failure(s) "
+                     f"from {events[0].time.isoformat()} to {last.time.isoformat()}; "
+                     f"last error: {last.error or 'unknown'}")
+    return {'kind': 'digest', 'subject': f"🚨 {failures} task failure(s) in {len(held)} task(s)",
+            'text': '\n'.join(lines) + '\n',
+            'events': [event.to_dict() for events in held.values() for event in events]}
+
+
+class AlertManager:
+    """Asynchronous failure/recovery alerting with per-task dedup and digests"""
+
+    def __init__(self, channels: List = None, window: float = ALERT_WINDOW_SECONDS,
+                 rate_per_minute: int = ALERT_RATE_PER_MINUTE,
+                 digest_delay: float = ALERT_DIGEST_DELAY_SECONDS, clock=time.monotonic):
+        self.channels = default_channels() if channels is None else list(channels)
+        self.window = window
+        self.digest_delay = digest_delay
+        self._clock = clock
+        self._bucket = TokenBucket(max(1, rate_per_minute) / 60, max(1, rate_per_minute), clock)
+        self._events = queue.Queue()
+        self._states: Dict[int, _TaskState] = {}
+        self._thread = None
+
+    def add_channel(self, channel):
+        self.channels.append(channel)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='alerts', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Handle the events already reported and send held failures"""
+        if self._thread:
+            self._events.put(None)
+            self._thread.join(timeout=WEBHOOK_TIMEOUT_SECONDS + 5)
+            self._thread = None
+
+    def failure(self, task, error: str = None, attempt: int = 1):
+        """Report a failed run of a task"""
+        if not self.channels:
+            return
+        window = task.get('alert_window')
+        self._events.put((AlertEvent(task['id'], task['task_name'], 'failure', datetime.now(timezone.utc),
+                                     (error or '')[:MAX_ERROR_CHARS] or None, attempt),
+                          self.window if window is None else window))
+
+    def recovery(self, task, failures: int):
+        """Report a successful run of a task after failed ones"""
+        if not self.channels:
+            return
+        self._events.put((AlertEvent(task['id'], task['task_name'], 'recovery', datetime.now(timezone.utc),
+                                     failures=failures), None))
+
+    def _run(self):
+        while True:
+            try:
+                item = self._events.get(timeout=self._next_due())
+            except queue.Empty:
+                item = False
+            if item is None:
+                self._flush(everything=True)
+                return
+            try:
+                if item:
+                    self._handle(*item)
+                self._flush()
+            except Exception as e:
+                logger.error(f"Alerting error: {e}")
+
+    def _next_due(self) -> float:
+        due = [state.due_at for state in self._states.values()]
+        return max(0.0, min(due) - self._clock()) if due else 60.0
+
+    def _handle(self, event: AlertEvent, window: Optional[float]):
+        now = self._clock()
+        state = self._states.get(event.task_id)
+        if event.kind == 'recovery':
+            if state is not None:
+                del self._states[event.task_id]
+            self._deliver(_recovery_alert(event))
+            return
+
+        if state is None or (not state.held and now >= state.due_at):
+            if self._bucket.try_acquire():
+                self._states[event.task_id] = _TaskState(window, now + window)
+                self._deliver(_failure_alert(event, window))
+                return
+            # Over the rate limit: hold it for a digest shortly
+            state = self._states[event.task_id] = _TaskState(window, now + self.digest_delay)
+        state.window = window
+        state.held.append(event)
+
+    def _flush(self, everything: bool = False):
+        """Send one digest with the held failures of every task whose window ended"""
+        now = self._clock()
+        held = {}
+        for task_id, state in list(self._states.items()):
+            if state.due_at > now and not everything:
+                continue
+            if state.held:
+                held[task_id], state.held = state.held, []
+                state.due_at = now + state.window
+            else:
+                del self._states[task_id]
+        if held:
+            self._deliver(_digest_alert(held))
+
+    def _deliver(self, alert: Dict):
+        for channel in self.channels:
+            try:
+                channel.send(alert)
+            except Exception as e:
+                logger.error(f"Could not send {alert['kind']} alert via {type(channel).__name__}: {e}")
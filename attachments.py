@@ -0,0 +1,249 @@
+"""
+Streaming attachment encoding for outgoing email
+
+Attachments are never held in memory whole:
+
+- each file is read in chunks, hashed, and base64-encoded into an on-disk
+  cache keyed by its SHA-256 and compression mode, so a report attached
+  again with the same content is not encoded again
+- StreamedMessage writes the message to SMTP part by part, copying the
+  encoded attachments from the cache in chunks (see
+  SMTPPool.send_stream())
+
+Compression is optional: 'gzip' compresses each file on its own, 'zip'
+bundles all of a message's attachments into one archive. The cache is
+trimmed to ATTACHMENT_CACHE_MB, least recently used first, sparing entries
+used in the last TRIM_MIN_AGE_SECONDS as they may be in a message being
+sent. Cached entries are attached as they are, so the cache directory must
+be owned by this user and closed to others.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import re
+import secrets
+import stat
+import tempfile
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass
+from email import policy
+from email.message import Message
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from typing import Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+_USER_SUFFIX = f"-{os.getuid()}" if hasattr(os, 'getuid') else ''
+ATTACHMENT_CACHE_DIR = os.environ.get('ATTACHMENT_CACHE', os.path.join(tempfile.gettempdir(),
+                                                                       f"task-scheduler-attachments{_USER_SUFFIX}"))
+ATTACHMENT_CACHE_MB = int(os.environ.get('ATTACHMENT_CACHE_MB', '512'))
+TRIM_MIN_AGE_SECONDS = 600
+
+COMPRESS_MODES = ('gzip', 'zip')
+BUNDLE_NAME = 'attachments.zip'
+
+# 57 bytes encode to one 76-character base64 line, the MIME maximum
+_LINE_BYTES = 57
+CHUNK_BYTES = _LINE_BYTES * 1024
+
+# Fixed timestamp inside zip bundles, so equal content gives an equal archive
+_ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+_LEADING_DOT = re.compile(rb'(?m)^\.')
+
+
+@dataclass
+class EncodedAttachment:
+    filename: str
+    content_type: str
+    path: str  # Cached base64 body with CRLF line endings
+    size: int  # Encoded size in bytes
+
+
+def validate_compress(compress):
+    if compress is not None and compress not in COMPRESS_MODES:
+        raise ValueError(f"compress must be one of {', '.join(COMPRESS_MODES)}")
+
+
+def _read_chunks(file) -> Iterator[bytes]:
+    while True:
+        chunk = file.read(CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in _read_chunks(file):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _base64_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Base64-encode a byte stream as CRLF-terminated 76-character lines"""
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        whole = len(pending) - len(pending) % _LINE_BYTES
+        if whole:
+            encoded = base64.b64encode(pending[:whole])
+            pending = pending[whole:]
+            yield b'\r\n'.join([encoded[i:i + 76] for i in range(0, len(encoded), 76)]) + b'\r\n'
+    if pending:
+        yield base64.b64encode(pending) + b'\r\n'
+
+
+def _gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    # wbits=31 writes a gzip header, with a zero timestamp
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _cache_dir() -> str:
+    """Create the cache directory if needed, and check no other user can write to it"""
+    os.makedirs(ATTACHMENT_CACHE_DIR, mode=0o700, exist_ok=True)
+    info = os.lstat(ATTACHMENT_CACHE_DIR)
+    if not stat.S_ISDIR(info.st_mode) or (os.name == 'posix' and (info.st_uid != os.getuid()
+                                                                   or info.st_mode & 0o077)):
+        raise PermissionError(f"Attachment cache {ATTACHMENT_CACHE_DIR} must be a directory owned by this user "
+                              f"and not accessible to others")
+    return ATTACHMENT_CACHE_DIR
+
+
+def _cached(key: str, filename: str, content_type: str, produce) -> EncodedAttachment:
+    """Get an encoded attachment from the cache, encoding it with produce() on a miss"""
+    cache_dir = _cache_dir()
+    path = os.path.join(cache_dir, f"{key}.b64")
+    try:
+        os.utime(path)  # Mark as recently used
+    except FileNotFoundError:
+        fd, partial = tempfile.mkstemp(dir=cache_dir, suffix='.partial')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for lines in _base64_lines(produce()):
+                    out.write(lines)
+            os.replace(partial, path)
+        except BaseException:
+            os.unlink(partial)
+            raise
+        _trim_cache(cache_dir)
+    return EncodedAttachment(filename, content_type, path, os.path.getsize(path))
+
+
+def _trim_cache(cache_dir: str):
+    limit = ATTACHMENT_CACHE_MB * 1024 * 1024
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.b64'):
+            info = entry.stat()
+            entries.append((info.st_mtime, info.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    recent = time.time() - TRIM_MIN_AGE_SECONDS
+    for used, size, path in sorted(entries):
+        if total <= limit or used > recent:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def encode_file(path: str, compress: str = None) -> EncodedAttachment:
+    """Encode one file, gzip-compressed if compress is 'gzip'"""
+    name = os.path.basename(path)
+
+    def produce():
+        with open(path, 'rb') as file:
+            chunks = _read_chunks(file)
+            yield from _gzip_chunks(chunks) if compress == 'gzip' else chunks
+
+    if compress == 'gzip':
+        return _cached(f"{file_digest(path)}-gzip", f"{name}.gz", 'application/gzip', produce)
+    return _cached(file_digest(path), name, 'application/octet-stream', produce)
+
+
+def encode_bundle(paths: List[str], name: str = BUNDLE_NAME) -> EncodedAttachment:
+    """Encode files as one zip archive"""
+    members = [(os.path.basename(path), path, file_digest(path)) for path in paths]
+    key = hashlib.sha256(''.join(f"{member}\0{digest}\0" for member, _, digest in members).encode()).hexdigest()
+
+    def produce():
+        # The archive is assembled in a temporary file, not in memory
+        with tempfile.TemporaryFile() as archive:
+            with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as bundle:
+                for member, path, _ in members:
+                    info = zipfile.ZipInfo(member, _ZIP_DATE)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with open(path, 'rb') as source, bundle.open(info, 'w') as target:
+                        for chunk in _read_chunks(source):
+                            target.write(chunk)
+            archive.seek(0)
+            yield from _read_chunks(archive)
+
+    return _cached(f"{key}-zip", name, 'application/zip', produce)
+
+
+def encode_attachments(paths: List[str], compress: str = None) -> List[EncodedAttachment]:
+    """Encode the existing files among paths; missing files are skipped"""
+    validate_compress(compress)
+    existing = []
+    for path in paths:
+        if os.path.isfile(path):
+            existing.append(path)
+        else:
+            logger.warning(f"Attachment not found, skipping: {path}")
+    if compress == 'zip':
+        return [encode_bundle(existing)] if existing else []
+    return [encode_file(path, compress) for path in existing]
+
+
+class StreamedMessage:
+    """A message with attachments that are streamed from the encoding cache"""
+
+    def __init__(self, body: Message, attachments: List[EncodedAttachment]):
+        outer = MIMEMultipart('mixed')
+        for header in ('From', 'To', 'Subject'):
+            if header in body:
+                outer[header] = body[header]
+                del body[header]
+        outer.attach(body)
+
+        # Each attachment is generated with a placeholder body, which
+        # chunks() swaps for the cached encoding
+        token = secrets.token_hex(16)
+        for index, attachment in enumerate(attachments):
+            part = MIMEBase(*attachment.content_type.split('/'))
+            part['Content-Transfer-Encoding'] = 'base64'
+            part.add_header('Content-Disposition', 'attachment', filename=attachment.filename)
+            part.set_payload(f"{token}-{index}")
+            outer.attach(part)
+        skeleton = outer.as_bytes(policy=policy.SMTP)
+        self._pieces = re.split(f"{token}-\\d+\r\n".encode(), skeleton)
+        self.attachments = attachments
+
+    @property
+    def size(self) -> int:
+        return sum(len(piece) for piece in self._pieces) + sum(item.size for item in self.attachments)
+
+    def chunks(self) -> Iterator[bytes]:
+        """The message as dot-stuffed, CRLF-terminated chunks for the SMTP DATA command"""
+        for index, piece in enumerate(self._pieces):
+            if not piece.endswith(b'\r\n') and index == len(self._pieces) - 1:
+                piece += b'\r\n'
+            yield _LEADING_DOT.sub(b'..', piece)
+            if index < len(self.attachments):
+                # Base64 lines never start with a dot, so no stuffing is needed
+                with open(self.attachments[index].path, 'rb') as encoded:
+                    yield from _read_chunks(encoded)
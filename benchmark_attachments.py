@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark memory and time to encode email attachments
+
+Writes three CSV reports of the given size to a scratch directory and
+produces the full SMTP message for them:
+
+- in memory, as send_email used to: read() each file, encode_base64, then
+  as_string() for the whole message
+- streamed through StreamedMessage with an empty encoding cache
+- streamed again with the encodings cached (the same reports attached to
+  another email)
+- with gzip and zip compression
+
+The message bytes go to a counting sink instead of a server, so the peak
+(tracemalloc) is the memory the encoding itself needs. Times are taken
+from a separate run without tracemalloc.
+
+Usage: python benchmark_attachments.py [megabytes_per_file]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+DEFAULT_MEGABYTES = 50
+FILES = 3
+
+
+def write_reports(directory, megabytes):
+    row = b"2025-11-07T09:00:00,backup,success,1234,/var/backups/db-2025-11-07.sql.gz\n"
+    paths = []
+    for index in range(FILES):
+        path = os.path.join(directory, f"report-{index}.csv")
+        with open(path, 'wb') as report:
+            block = row * (1024 * 1024 // len(row))
+            for _ in range(megabytes):
+                report.write(block)
+            report.write(f"{index}\n".encode())
+        paths.append(path)
+    return paths
+
+
+def body():
+    msg = MIMEMultipart('alternative')
+    msg['From'] = 'Task Scheduler <scheduler@example.com>'
+    msg['To'] = 'ops@example.com'
+    msg['Subject'] = 'Nightly reports'
+    msg.attach(MIMEText('Reports attached.', 'plain'))
+    return msg
+
+
+def in_memory(paths):
+    msg = body()
+    for path in paths:
+        with open(path, 'rb') as attachment:
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(attachment.read())
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', f'attachment; filename= {os.path.basename(path)}')
+        msg.attach(part)
+    return len(msg.as_string())
+
+
+def streamed(paths, compress=None):
+    from attachments import StreamedMessage, encode_attachments
+
+    message = StreamedMessage(body(), encode_attachments(paths, compress))
+    return sum(len(chunk) for chunk in message.chunks())
+
+
+def measure(label, call, cold=False):
+    """Time call() and then trace its peak memory; cold empties the encoding cache before each"""
+    def run():
+        if cold:
+            shutil.rmtree(os.environ['ATTACHMENT_CACHE'], ignore_errors=True)
+        return call()
+
+    start = time.perf_counter()
+    size = run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<30} {elapsed:>8.2f} {peak / 2**20:>10.1f} {size / 2**20:>12.1f}")
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MEGABYTES
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ['ATTACHMENT_CACHE'] = os.path.join(scratch, 'cache')
+        paths = write_reports(scratch, megabytes)
+        print(f"{FILES} attachments of {megabytes} MB\n")
+        print(f"{'mode':<30} {'seconds':>8} {'peak MB':>10} {'message MB':>12}")
+        measure("in memory (before)", lambda: in_memory(paths))
+        measure("streamed, cache empty", lambda: streamed(paths), cold=True)
+        measure("streamed, cached", lambda: streamed(paths))
+        measure("gzip, cache empty", lambda: streamed(paths, 'gzip'), cold=True)
+        measure("zip bundle, cache empty", lambda: streamed(paths, 'zip'), cold=True)
+        measure("zip bundle, cached", lambda: streamed(paths, 'zip'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark the client SDK against per-call requests
+
+Starts the API with uvicorn on a scratch database and creates N tasks:
+
+- one requests.post() per task, a new connection each, as simple_client.py
+  and test_api.py used to
+- SchedulerClient.create_task() on its pooled keep-alive session
+- SchedulerClient.bulk_create(), BULK_BATCH_SIZE tasks per request
+
+then reads them back as one JSON list, page by page and as an NDJSON
+stream, and deletes them one by one vs bulk_delete().
+
+Usage: python benchmark_client.py [tasks]
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import uvicorn
+
+import database
+from scheduler_client import SchedulerClient
+
+DEFAULT_TASKS = 2000
+SCHEDULE = '0 0 1 1 *'  # Never fires during the run
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(port: int) -> uvicorn.Server:
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def tasks(prefix: str, count: int):
+    return [{'task_name': f"{prefix}-{n}", 'command': 'true', 'schedule': SCHEDULE} for n in range(count)]
+
+
+def timed(label: str, count: int, call):
+    start = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:>8.2f}s {count / elapsed:>10.0f}/s")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TASKS
+    with tempfile.TemporaryDirectory() as scratch:
+        database.DATABASE_FILE = os.path.join(scratch, 'benchmark.db')
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(port)
+        client = SchedulerClient(base_url)
+
+        try:
+            print(f"{count} tasks per mode against {base_url}\n")
+            print(f"{'mode':<32} {'time':>9} {'rate':>11}")
+            ids = timed("create: requests, no session", count, lambda: [
+                requests.post(f"{base_url}/tasks", json=task).json()['id'] for task in tasks('plain', count)])
+            ids += timed("create: SchedulerClient", count, lambda: [
+                client.create_task(task)['id'] for task in tasks('pooled', count)])
+            ids += [result['id'] for result in timed("create: bulk_create", count,
+                                                     lambda: client.bulk_create(tasks('bulk', count)))]
+
+            total = len(ids)
+            print()
+            timed("list: GET /tasks", total, client.list_tasks)
+            timed("list: iter_tasks", total, lambda: sum(1 for _ in client.iter_tasks()))
+            timed("list: stream_tasks (NDJSON)", total, lambda: sum(1 for _ in client.stream_tasks()))
+
+            print()
+            timed("delete: requests, no session", count, lambda: [
+                requests.delete(f"{base_url}/tasks/{task_id}") for task_id in ids[:count]])
+            timed("delete: bulk_delete", total - count, lambda: client.bulk_delete(ids[count:]))
+        finally:
+            client.close()
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark the schedule forecast and histogram
+
+Builds N active tasks with a realistic mix of schedules (many sharing
+'0 * * * *' and '*/5 * * * *', plus a long tail of distinct daily times)
+and times a 24-hour forecast and per-minute histogram.
+
+Usage: python benchmark_forecast.py [tasks]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import database
+import forecast
+
+DEFAULT_TASKS = 100_000
+
+
+def build_tasks(path, count):
+    """Fill a scratch database with active tasks"""
+    database.DATABASE_FILE = path
+    database.init_db()
+    rng = random.Random(42)
+    common = ["0 * * * *", "*/5 * * * *", "*/15 * * * *", "0 9 * * *", "0 9 * * 1", "0 2 * * *"]
+
+    def schedule():
+        if rng.random() < 0.7:
+            return rng.choice(common)
+        return f"{rng.randrange(60)} {rng.randrange(24)} * * *"
+
+    with database.get_connection() as conn:
+        conn.executemany('''
+            INSERT INTO tasks (task_name, command, schedule) VALUES (?, ?, ?)
+        ''', [(f"Task {i}", "true", schedule()) for i in range(count)])
+        conn.commit()
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<34} {time.perf_counter() - start:>8.3f} s")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TASKS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_tasks(os.path.join(tmp, "bench.db"), count)
+        start = datetime.now(timezone.utc)
+
+        print(f"{count} active tasks\n")
+        timed("forecast 24h (cold plan cache)", lambda: forecast.forecast(start, start + timedelta(hours=24)))
+        result = timed("forecast 24h (warm plan cache)", lambda: forecast.forecast(start, start + timedelta(hours=24)))
+        hist = timed("histogram 24h x 1 min", lambda: forecast.histogram(start, 24, 1))
+
+        print(f"\nfires in next 24h: {result['total']}")
+        print(f"peak minute: {hist['peak']['start']:%H:%M} with {hist['peak']['count']} fires")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark command spawn latency from a large process vs the fork server
+
+Grows this process's resident memory to the given size (the scheduler's
+uvicorn + FastAPI + APScheduler process stands in for it), then times N
+runs of 'true' started:
+
+- with subprocess.run(shell=True) from this process
+- with runner.CommandRun from this process, without limits (vfork) and
+  with a cpu_seconds limit (preexec_fn, so a full fork)
+- through a fork server launched on a temporary socket
+
+Usage: python benchmark_fork_server.py [runs] [resident_mb]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from forkserver import ForkServer
+from runner import ResourceLimits, run_command
+
+DEFAULT_RUNS = 200
+DEFAULT_RESIDENT_MB = 512
+
+
+def measure(run_once, runs):
+    """Time each run in milliseconds"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_once()
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)
+
+
+def report(label, times):
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:<22} {statistics.median(times):>8.2f}ms {p95:>8.2f}ms {times[-1]:>8.2f}ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RUNS
+    resident_mb = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_RESIDENT_MB
+    # Touch every page so it is resident and has to be mapped in each fork
+    ballast = bytearray(os.urandom(1024 * 1024)) * resident_mb
+
+    limits = ResourceLimits(timeout=60)
+    cpu_limited = ResourceLimits(timeout=60, cpu_seconds=60)
+    server = ForkServer(os.path.join(tempfile.mkdtemp(), 'fork.sock'))
+    server.start()
+    try:
+        print(f"{runs} runs of 'true' from a process with {len(ballast) // (1024 * 1024)} MB resident\n")
+        print(f"{'mode':<22} {'p50':>10} {'p95':>10} {'max':>10}")
+        report("subprocess.run", measure(lambda: subprocess.run('true', shell=True), runs))
+        report("CommandRun", measure(lambda: run_command('true', limits), runs))
+        report("CommandRun, cpu limit", measure(lambda: run_command('true', cpu_limited), runs))
+        report("fork server", measure(lambda: server.run('true', limits).wait(), runs))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark HTTP tasks against calling the URL with curl from a shell
+
+Calls the local stub server N times, one after another and then in a
+burst of concurrent runs (as when many webhooks share a schedule):
+
+- as a shell task running 'curl', a new process and connection per run
+- as an 'http' task on the shared keep-alive client
+
+and compares per-run latency and the connections the server saw.
+
+Usage: python benchmark_http_tasks.py [runs]
+"""
+
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from http_stub_server import StubHTTPServer
+from http_tasks import HttpClient, HttpRequest
+from runner import CommandRun, ResourceLimits
+
+DEFAULT_RUNS = 200
+CONCURRENCY = 20
+
+
+def measure(run_once, runs, concurrency=1):
+    """Time each run in milliseconds, and the whole batch in seconds"""
+    def timed(_):
+        start = time.perf_counter()
+        result = run_once()
+        if result.returncode != 0:
+            raise RuntimeError(f"Run failed: {result.error}")
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        times = sorted(executor.map(timed, range(runs)))
+    return times, time.perf_counter() - start
+
+
+def report(label, stub, run_once, runs, concurrency=1):
+    connections = stub.connections
+    times, total = measure(run_once, runs, concurrency)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:<24} {statistics.median(times):>9.2f}ms {p95:>9.2f}ms {runs / total:>9.0f}/s "
+          f"{stub.connections - connections:>12}")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RUNS
+    stub = StubHTTPServer(port=0)
+    stub.start()
+    client = HttpClient()
+    client.start()
+    url = f"{stub.url}/hooks/deploy"
+    limits = ResourceLimits(timeout=60)
+    request = HttpRequest(url, 'POST', {'Content-Type': 'application/json'}, b'{"ref": "main"}')
+    curl = f"curl -sf -X POST -H 'Content-Type: application/json' -d '{{\"ref\": \"main\"}}' {url}"
+
+    try:
+        print(f"{runs} POSTs to the stub server\n")
+        print(f"{'mode':<24} {'p50':>11} {'p95':>11} {'rate':>11} {'connections':>12}")
+        report("curl", stub, lambda: CommandRun(curl, limits).wait(), runs)
+        report("http task", stub, lambda: client.run(request).wait(), runs)
+        report(f"curl x{CONCURRENCY}", stub, lambda: CommandRun(curl, limits).wait(), runs, CONCURRENCY)
+        report(f"http task x{CONCURRENCY}", stub, lambda: client.run(request).wait(), runs, CONCURRENCY)
+    finally:
+        client.shutdown()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark how long a task waits to hand off an email
+
+Compares the caller-side latency of sending inline over a fresh SMTP
+connection (what send_email did before the outbox) with queue_email(),
+which only inserts a row into email_outbox in a scratch database. The SMTP
+side is smtp_stub_server.py with a handshake delay standing in for a real
+provider.
+
+Usage: python benchmark_outbox.py [messages] [handshake_delay_seconds]
+"""
+
+import os
+import smtplib
+import statistics
+import sys
+import tempfile
+import time
+from email.mime.text import MIMEText
+
+import database
+from smtp_stub_server import StubSMTPServer
+
+DEFAULT_MESSAGES = 200
+DEFAULT_HANDSHAKE_DELAY = 0.05
+SENDER = 'scheduler@example.com'
+
+
+def send_inline(port, index):
+    msg = MIMEText(f"Alert {index}: disk usage above threshold")
+    msg['From'] = SENDER
+    msg['To'] = f"oncall{index % 10}@example.com"
+    msg['Subject'] = f"ALERT {index}"
+    server = smtplib.SMTP('127.0.0.1', port)
+    server.login(SENDER, 'password')
+    server.send_message(msg)
+    server.quit()
+
+
+def measure(label, messages, call):
+    timings = []
+    for index in range(messages):
+        start = time.perf_counter()
+        call(index)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    p50 = statistics.median(timings) * 1e6
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6
+    print(f"{label:<28} {p50:>12.1f} {p99:>12.1f}")
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MESSAGES
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_HANDSHAKE_DELAY
+
+    with tempfile.TemporaryDirectory() as scratch:
+        database.DATABASE_FILE = os.path.join(scratch, 'benchmark.db')
+        database.init_db()
+        from outbox import queue_email  # No worker runs here, so nothing is delivered
+
+        stub = StubSMTPServer(port=0, handshake_delay=delay)
+        stub.start()
+        try:
+            print(f"{messages} messages, {delay * 1000:g}ms stand-in for each SMTP handshake\n")
+            print(f"{'caller waits for':<28} {'p50 (us)':>12} {'p99 (us)':>12}")
+            measure("inline SMTP send", messages, lambda index: send_inline(stub.port, index))
+            measure("queue_email (outbox insert)", messages,
+                    lambda index: queue_email(f"oncall{index % 10}@example.com", f"ALERT {index}",
+                                              "disk usage above threshold"))
+        finally:
+            stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark Python callable tasks against the equivalent shell command
+
+Runs example_tasks.health_check N times as a shell command
+('python example_tasks.py health_check', a fresh interpreter each time)
+and as a 'python' task on the warm worker pool, and compares per-run
+latency.
+
+Usage: python benchmark_python_tasks.py [runs]
+"""
+
+import statistics
+import sys
+import time
+
+from runner import ResourceLimits, run_command
+from workers import PythonWorkerPool
+
+DEFAULT_RUNS = 50
+
+
+def measure(run_once, runs):
+    """Time each run in milliseconds"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run_once()
+        times.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"Run failed: {result.error}")
+    return sorted(times)
+
+
+def report(label, times):
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:<16} {statistics.median(times):>9.2f}ms {p95:>9.2f}ms {times[-1]:>9.2f}ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RUNS
+    limits = ResourceLimits(timeout=60)
+    shell_command = f"{sys.executable} example_tasks.py health_check"
+
+    pool = PythonWorkerPool(size=1, preload=['example_tasks'])
+    start = time.perf_counter()
+    pool.start()
+    # The first run waits for the worker to finish starting
+    pool.run('example_tasks:health_check', 60).wait()
+    warmup = (time.perf_counter() - start) * 1000
+
+    try:
+        print(f"{runs} runs of example_tasks.health_check (pool warm-up {warmup:.0f}ms)\n")
+        print(f"{'mode':<16} {'p50':>11} {'p95':>11} {'max':>11}")
+        report("shell", measure(lambda: run_command(shell_command, limits), runs))
+        report("python worker", measure(lambda: pool.run('example_tasks:health_check', 60).wait(), runs))
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark memory used by loaded task and history rows
+
+Measures with tracemalloc how much memory get_all_tasks() and
+get_task_history() results hold as per-row dicts (the previous behaviour)
+versus the tuple-backed TaskRecord/ExecutionRecord.
+
+Usage: python benchmark_records.py [rows]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import database
+from benchmark_serialization import build_database
+
+DEFAULT_ROWS = 100_000
+
+
+def load_dicts(query):
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        return [dict(row) for row in cursor.execute(query).fetchall()]
+
+
+def load_records(query):
+    with database.get_connection() as conn:
+        return conn.execute(query).fetchall()
+
+
+def measure(loader, query):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = loader(query)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Touch the result so it is alive while measured
+    assert rows[0]['id'] is not None
+    return current, peak, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_database(os.path.join(tmp, "bench.db"), count)
+
+        print(f"{count} rows per table\n")
+        print(f"{'table':<16} {'format':<8} {'retained MB':>12} {'peak MB':>9} {'bytes/row':>10} {'seconds':>8}")
+        for table in ["tasks", "task_executions"]:
+            query = f"SELECT * FROM {table}"
+            results = {}
+            for name, loader in [("dict", load_dicts), ("record", load_records)]:
+                current, peak, elapsed = measure(loader, query)
+                results[name] = current
+                print(f"{table:<16} {name:<8} {current / 1e6:>12.1f} {peak / 1e6:>9.1f} "
+                      f"{current / count:>10.0f} {elapsed:>8.3f}")
+            saved = results["dict"] - results["record"]
+            print(f"{'':<16} saved {saved / 1e6:.1f} MB ({saved / results['dict']:.0%})\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark building the weekly report from rollups vs scanning history
+
+Fills a scratch database with N executions of 200 tasks spread over 90
+days, builds the daily rollups from them (what init_db does on the first
+start after upgrading), then times the aggregates for the last 7 days:
+
+- scanning task_executions: GROUP BY for the counts plus every duration
+  loaded and sorted for exact p50/p95
+- reading execution_daily and execution_daily_durations, as reports.py does
+
+Also times log_task_execution(), which now updates the rollups as well.
+
+Usage: python benchmark_reports.py [executions]
+"""
+
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import database
+import queries
+import reports
+
+DEFAULT_EXECUTIONS = 1_000_000
+TASKS = 200
+DAYS = 90
+EPOCH_MS_PER_DAY = 86_400_000
+
+
+def fill(executions):
+    now_ms = queries.adapt_datetime(datetime.now(timezone.utc))
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO tasks (task_name, command, schedule) VALUES (?, 'true', '* * * * *')",
+                           [(f"task-{n}",) for n in range(TASKS)])
+        rows = ((random.randint(1, TASKS), now_ms - random.randrange(DAYS * EPOCH_MS_PER_DAY),
+                 'failed' if random.random() < 0.02 else 'success', round(random.lognormvariate(7, 1)))
+                for _ in range(executions))
+        cursor.executemany("INSERT INTO task_executions (task_id, execution_time, status, duration_ms) "
+                           "VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+
+
+def scan_week(first_day, last_day):
+    """The report's numbers straight from task_executions"""
+    start = datetime(first_day.year, first_day.month, first_day.day, tzinfo=timezone.utc)
+    end = datetime(last_day.year, last_day.month, last_day.day, tzinfo=timezone.utc) + timedelta(days=1)
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute("SELECT task_id, COUNT(*), SUM(status = 'success'), SUM(status = 'failed') "
+                       "FROM task_executions WHERE execution_time >= ? AND execution_time < ? GROUP BY task_id",
+                       (start, end))
+        counts = cursor.fetchall()
+        durations = {}
+        cursor.execute("SELECT task_id, duration_ms FROM task_executions "
+                       "WHERE execution_time >= ? AND execution_time < ? AND duration_ms IS NOT NULL",
+                       (start, end))
+        for task_id, duration_ms in cursor:
+            durations.setdefault(task_id, []).append(duration_ms)
+    percentiles = {}
+    for task_id, values in durations.items():
+        values.sort()
+        percentiles[task_id] = (values[math.ceil(0.5 * len(values)) - 1], values[math.ceil(0.95 * len(values)) - 1])
+    return counts, percentiles
+
+
+def timed(call, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    executions = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_EXECUTIONS
+    with tempfile.TemporaryDirectory() as scratch:
+        database.DATABASE_FILE = os.path.join(scratch, 'benchmark.db')
+        database.init_db()
+        start = time.perf_counter()
+        fill(executions)
+        print(f"{executions} executions of {TASKS} tasks over {DAYS} days "
+              f"(inserted in {time.perf_counter() - start:.1f}s)")
+        start = time.perf_counter()
+        database.rebuild_rollups()
+        print(f"Rollups built from history in {time.perf_counter() - start:.2f}s\n")
+
+        report = reports.weekly_summary()
+        first_day, last_day = report['first_day'], report['last_day']
+        scan_seconds, (_, exact) = timed(lambda: scan_week(first_day, last_day), repeat=3)
+        rollup_seconds, report = timed(lambda: reports.weekly_summary())
+        render_seconds, _ = timed(lambda: reports.render(report))
+
+        errors = [abs(task[key] - exact[task['task_id']][index]) / exact[task['task_id']][index]
+                  for task in report['tasks'] for index, key in enumerate(('p50_ms', 'p95_ms'))]
+        print(f"{'weekly report aggregates':<28} {'ms':>10}")
+        print(f"{'scan task_executions':<28} {scan_seconds * 1000:>10.1f}")
+        print(f"{'read rollups':<28} {rollup_seconds * 1000:>10.1f}")
+        print(f"{'render text + HTML':<28} {render_seconds * 1000:>10.1f}")
+        print(f"\nPercentile error vs exact: mean {sum(errors) / len(errors) * 100:.1f}%, "
+              f"max {max(errors) * 100:.1f}%")
+
+        runs = 2000
+        start = time.perf_counter()
+        for n in range(runs):
+            database.log_task_execution(n % TASKS + 1, 'success', duration_ms=n)
+        print(f"log_task_execution with rollups: {(time.perf_counter() - start) / runs * 1e6:.0f}us per run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON serialization of task and history responses
+
+Compares the default FastAPI path (dict(row) -> jsonable_encoder -> json)
+against the fast row serializers at 1k, 10k and 100k rows.
+
+Usage: python benchmark_serialization.py [rows ...]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+import database
+from serializers import StdlibRowSerializer, OrjsonRowSerializer, orjson
+
+ROW_COUNTS = [1_000, 10_000, 100_000]
+LAST_RUN = datetime(2025, 11, 7, 4, 0, 0, 30000, tzinfo=timezone.utc)
+NEXT_RUN = datetime(2025, 11, 7, 4, 5, tzinfo=timezone.utc)
+REPEATS = 3
+
+
+def build_database(path, rows):
+    """Fill a scratch database with tasks and execution history"""
+    database.DATABASE_FILE = path
+    database.init_db()
+    with database.get_connection() as conn:
+        conn.executemany('''
+            INSERT INTO tasks (task_name, command, schedule, description, last_run, next_run)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(f"Task {i}", f"python example_tasks.py health_check --id {i}", "*/5 * * * *",
+               "Benchmark task with \"quotes\" and ünïcode", LAST_RUN, NEXT_RUN) for i in range(rows)])
+        conn.executemany('''
+            INSERT INTO task_executions (task_id, status, output, error)
+            VALUES (?, ?, ?, ?)
+        ''', [(1, "success", "CPU: OK\nMemory: OK\nDisk: OK\n", None) for _ in range(rows)])
+        conn.commit()
+
+
+def fetch(query):
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        return [column[0] for column in cursor.description], rows
+
+
+def default_path(columns, rows):
+    """What FastAPI does when an endpoint returns [dict(row) ...]"""
+    content = jsonable_encoder([dict(row) for row in rows])
+    return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def measure(func, columns, rows):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        body = func(columns, rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(body), best
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or ROW_COUNTS
+
+    serializers = [("default", default_path), ("stdlib", StdlibRowSerializer().dumps_rows)]
+    if orjson is not None:
+        serializers.append(("orjson", OrjsonRowSerializer().dumps_rows))
+    else:
+        print("(orjson not installed, skipping orjson serializer)")
+
+    print(f"{'rows':>8} {'query':<10} {'serializer':<10} {'bytes':>12} {'seconds':>9} {'MB/s':>9} {'speedup':>8}")
+    for count in row_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            build_database(os.path.join(tmp, "bench.db"), count)
+            for label, query in [("tasks", "SELECT * FROM tasks"),
+                                 ("history", "SELECT * FROM task_executions")]:
+                columns, rows = fetch(query)
+                baseline = None
+                for name, func in serializers:
+                    size, seconds = measure(func, columns, rows)
+                    baseline = baseline or seconds
+                    print(f"{count:>8} {label:<10} {name:<10} {size:>12} {seconds:>9.4f} "
+                          f"{size / seconds / 1e6:>9.1f} {baseline / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
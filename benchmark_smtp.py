@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark email sending throughput with and without the SMTP pool
+
+Starts smtp_stub_server.py in-process with a handshake delay standing in
+for a real provider's TLS and AUTH round trips, then sends N messages:
+
+- one connection per message (connect, login, send, QUIT), as send_email
+  used to
+- through an SMTPPool of size 1 from one thread
+- through an SMTPPool of size 4 from 4 threads
+
+Usage: python benchmark_smtp.py [messages] [handshake_delay_seconds]
+"""
+
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+from smtp_pool import SMTPPool
+from smtp_stub_server import StubSMTPServer
+
+DEFAULT_MESSAGES = 200
+DEFAULT_HANDSHAKE_DELAY = 0.05
+SENDER = 'scheduler@example.com'
+
+
+def make_message(index):
+    msg = MIMEText(f"Alert {index}: disk usage above threshold")
+    msg['From'] = SENDER
+    msg['To'] = f"oncall{index % 10}@example.com"
+    msg['Subject'] = f"ALERT {index}"
+    return msg
+
+
+def send_unpooled(port, msg):
+    server = smtplib.SMTP('127.0.0.1', port)
+    server.login(SENDER, 'password')
+    server.send_message(msg)
+    server.quit()
+
+
+def run(label, stub, messages, send, threads=1):
+    before = stub.connections
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(send, [make_message(index) for index in range(messages)]))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {messages / elapsed:>10.1f} {stub.connections - before:>12}")
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MESSAGES
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_HANDSHAKE_DELAY
+    stub = StubSMTPServer(port=0, handshake_delay=delay)
+    stub.start()
+    try:
+        print(f"{messages} messages, {delay * 1000:g}ms stand-in for each of the TLS and AUTH handshakes\n")
+        print(f"{'mode':<24} {'msgs/sec':>10} {'connections':>12}")
+        run("connection per message", stub, messages, lambda msg: send_unpooled(stub.port, msg))
+        for size in (1, 4):
+            pool = SMTPPool('127.0.0.1', stub.port, SENDER, 'password', use_tls=False, size=size)
+            run(f"pool of {size}, {size} thread(s)", stub, messages, pool.send_message, threads=size)
+            pool.close()
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the scheduler and API, with machine-readable results
+
+Runs offline, in process, each benchmark on its own scratch database:
+
+- add_task: TaskScheduler.add_task() calls per second
+- startup: TaskScheduler.start() with N tasks in the database (best of 3)
+- dispatch: lag from fire time to run start at N runs per minute, through
+  APScheduler, the dispatcher and the worker threads (the runs are 'true')
+- api: GET /tasks and GET /tasks/{id}/history latency with large tables,
+  through the FastAPI app
+- log_execution: log_task_execution() writes per second
+
+Results are written as JSON (default benchmark_results/<commit>.json) with
+the commit, Python and SQLite versions and the parameters used. --compare
+prints the change against an earlier results file and exits with status 1
+if any metric got worse by more than --threshold percent.
+
+Usage: python benchmark_suite.py [--quick] [--only add_task,api] [--output FILE]
+                                 [--compare FILE] [--threshold PERCENT]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from apscheduler.triggers.date import DateTrigger
+
+import database
+import queries
+
+SCHEDULE = '0 0 1 1 *'  # Never fires during a benchmark
+STARTUP_REPEAT = 3  # Best of, as one start is noisy
+
+PARAMS = {
+    'add_tasks': 2000,
+    'startup_tasks': 5000,
+    'dispatch_per_minute': 600,
+    'dispatch_seconds': 20,
+    'api_tasks': 50000,
+    'api_executions': 1000000,
+    'api_requests': 50,
+    'log_executions': 20000,
+}
+
+QUICK_PARAMS = {
+    'add_tasks': 300,
+    'startup_tasks': 1000,
+    'dispatch_per_minute': 600,
+    'dispatch_seconds': 5,
+    'api_tasks': 5000,
+    'api_executions': 100000,
+    'api_requests': 20,
+    'log_executions': 2000,
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def metric(value, unit, better):
+    return {'value': round(value, 3), 'unit': unit, 'better': better}
+
+
+def latency_metrics(name, seconds):
+    milliseconds = [value * 1000 for value in seconds]
+    return {
+        f"{name}.p50_ms": metric(percentile(milliseconds, 0.5), 'ms', 'lower'),
+        f"{name}.p95_ms": metric(percentile(milliseconds, 0.95), 'ms', 'lower'),
+        f"{name}.p99_ms": metric(percentile(milliseconds, 0.99), 'ms', 'lower'),
+    }
+
+
+@contextmanager
+def scratch_database():
+    """Point database.py at a fresh database for the duration"""
+    previous = database.DATABASE_FILE
+    with tempfile.TemporaryDirectory() as scratch:
+        database.DATABASE_FILE = os.path.join(scratch, 'benchmark.db')
+        database.init_db()
+        try:
+            yield
+        finally:
+            database.DATABASE_FILE = previous
+
+
+@contextmanager
+def running_scheduler():
+    from scheduler import TaskScheduler
+
+    scheduler = TaskScheduler()
+    scheduler.start()
+    try:
+        yield scheduler
+    finally:
+        scheduler.shutdown()
+
+
+def fill_tasks(count, prefix='task'):
+    return database.create_tasks([{'task_name': f"{prefix}-{n}", 'command': 'true', 'schedule': SCHEDULE}
+                                  for n in range(count)])
+
+
+def bench_add_task(params):
+    with scratch_database(), running_scheduler() as scheduler:
+        count = params['add_tasks']
+        start = time.perf_counter()
+        for n in range(count):
+            scheduler.add_task(f"task-{n}", 'true', SCHEDULE)
+        elapsed = time.perf_counter() - start
+    return {'add_task.per_second': metric(count / elapsed, 'ops/s', 'higher')}
+
+
+def bench_startup(params):
+    from scheduler import TaskScheduler
+
+    with scratch_database():
+        fill_tasks(params['startup_tasks'])
+        best = float('inf')
+        for _ in range(STARTUP_REPEAT):
+            scheduler = TaskScheduler()
+            start = time.perf_counter()
+            scheduler.start()
+            best = min(best, time.perf_counter() - start)
+            scheduler.shutdown()
+    return {'startup.seconds': metric(best, 's', 'lower')}
+
+
+def bench_dispatch(params):
+    per_minute, seconds = params['dispatch_per_minute'], params['dispatch_seconds']
+    count = max(1, per_minute * seconds // 60)
+    with scratch_database(), running_scheduler() as scheduler:
+        task_ids = fill_tasks(count)
+        lags = []
+        done = threading.Semaphore(0)
+        execute = scheduler._execute_task
+
+        def timed_execute(task_id, *args, **kwargs):
+            lags.append(time.time() - fire_times[task_id])
+            try:
+                execute(task_id, *args, **kwargs)
+            finally:
+                done.release()
+
+        # Each task fires once, on the same path as its cron job would
+        scheduler._execute_task = timed_execute
+        first = datetime.now(timezone.utc) + timedelta(seconds=1)
+        interval = 60 / per_minute
+        fire_times = {}
+        for index, task_id in enumerate(task_ids):
+            fire_time = first + timedelta(seconds=index * interval)
+            fire_times[task_id] = fire_time.timestamp()
+            scheduler.scheduler.add_job(scheduler._dispatch_scheduled, DateTrigger(fire_time), args=[task_id],
+                                        id=str(task_id), misfire_grace_time=None)
+        for _ in task_ids:
+            done.acquire(timeout=seconds + 60)
+    return latency_metrics('dispatch.lag', lags)
+
+
+def fill_executions(task_ids, count):
+    now_ms = queries.adapt_datetime(datetime.now(timezone.utc))
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+
+        rows = ((task_ids[n % len(task_ids)], now_ms - n * 1000, 'success', 'ok', n % 5000)
+                for n in range(count))
+        cursor.executemany("INSERT INTO task_executions (task_id, execution_time, status, output, duration_ms) "
+                           "VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+
+def bench_api(params):
+    from fastapi.testclient import TestClient
+    import main
+    from scheduler import TaskScheduler
+
+    with scratch_database():
+        task_ids = fill_tasks(params['api_tasks'])
+        # Most history goes to a few busy tasks, as with frequent schedules
+        fill_executions(task_ids[:10], params['api_executions'])
+        main.scheduler = TaskScheduler()  # Not started: the endpoints only read
+        client = TestClient(main.app)
+        results = {}
+        for name, path in (('api.list_tasks', '/tasks'),
+                           ('api.list_tasks_page', '/tasks?limit=1000'),
+                           ('api.history', f'/tasks/{task_ids[0]}/history'),
+                           ('api.history_page', f'/tasks/{task_ids[0]}/history?limit=1000')):
+            times = []
+            for _ in range(params['api_requests']):
+                start = time.perf_counter()
+                response = client.get(path)
+                times.append(time.perf_counter() - start)
+                response.raise_for_status()
+            results.update(latency_metrics(name, times))
+        main.scheduler = None
+    return results
+
+
+def bench_log_execution(params):
+    with scratch_database():
+        task_ids = fill_tasks(100)
+        count = params['log_executions']
+        start = time.perf_counter()
+        for n in range(count):
+            database.log_task_execution(task_ids[n % len(task_ids)], 'success', 'ok', duration_ms=n % 5000)
+        elapsed = time.perf_counter() - start
+    return {'log_execution.per_second': metric(count / elapsed, 'ops/s', 'higher')}
+
+
+BENCHMARKS = {
+    'add_task': bench_add_task,
+    'startup': bench_startup,
+    'dispatch': bench_dispatch,
+    'api': bench_api,
+    'log_execution': bench_log_execution,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline, threshold):
+    """Print each metric against the baseline; returns the names that regressed"""
+    regressions = []
+    print(f"\n{'metric':<32} {'baseline':>12} {'now':>12} {'change':>9}")
+    for name, current in results['metrics'].items():
+        previous = baseline['metrics'].get(name)
+        if previous is None:
+            continue
+        change = (current['value'] - previous['value']) / previous['value'] * 100 if previous['value'] else 0.0
+        worse = change > threshold if current['better'] == 'lower' else change < -threshold
+        if worse:
+            regressions.append(name)
+        print(f"{name:<32} {previous['value']:>12g} {current['value']:>12g} {change:>+8.1f}%"
+              f"{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scheduler and API benchmark suite")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes, for a fast check")
+    parser.add_argument('--only', help=f"Comma-separated benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--output', help="Results file (default benchmark_results/<commit>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=10.0, help="Percent change counted as a regression")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    params = dict(QUICK_PARAMS if args.quick else PARAMS)
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'params': params,
+        'metrics': {},
+    }
+    for name in names:
+        start = time.perf_counter()
+        metrics = BENCHMARKS[name](params)
+        results['metrics'].update(metrics)
+        print(f"{name} ({time.perf_counter() - start:.1f}s)")
+        for metric_name, value in metrics.items():
+            print(f"  {metric_name:<30} {value['value']:>12g} {value['unit']}")
+
+    output = args.output or os.path.join('benchmark_results', f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:g}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
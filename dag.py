@@ -0,0 +1,157 @@
+"""
+Task dependency graphs and DAG runs
+
+Dependencies are (task_id, depends_on) edges. A task with upstream
+dependencies has no cron job of its own: it runs when its upstream tasks
+succeed. When a task with downstream dependents runs on its schedule, it
+starts a DAG run covering itself and everything reachable downstream of it.
+Each task in the run starts as soon as all of its upstream tasks within the
+run have succeeded, so independent branches run in parallel; anything
+downstream of a failed or paused task is skipped.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Edge = Tuple[int, int]  # (task_id, depends_on)
+
+
+class DependencyCycleError(ValueError):
+    """Raised when dependencies would make the graph cyclic"""
+
+
+def build_graph(edges: Iterable[Edge]) -> Tuple[Dict[int, Set[int]], Dict[int, Set[int]]]:
+    """Get the (upstream, downstream) adjacency maps for a set of edges"""
+    upstream = defaultdict(set)
+    downstream = defaultdict(set)
+    for task_id, depends_on in edges:
+        upstream[task_id].add(depends_on)
+        downstream[depends_on].add(task_id)
+    return upstream, downstream
+
+
+def find_cycle(edges: Iterable[Edge]) -> Optional[List[int]]:
+    """Get the task ids along a dependency cycle, or None if there is none"""
+    upstream, _ = build_graph(edges)
+    visiting, done = set(), set()
+
+    for start in list(upstream):
+        if start in done:
+            continue
+        # Iterative DFS over upstream edges; path holds the current chain
+        path = [start]
+        stack = [iter(sorted(upstream[start]))]
+        visiting.add(start)
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                finished = path.pop()
+                visiting.discard(finished)
+                done.add(finished)
+            elif node in visiting:
+                return path[path.index(node):] + [node]
+            elif node not in done:
+                visiting.add(node)
+                path.append(node)
+                stack.append(iter(sorted(upstream.get(node, ()))))
+    return None
+
+
+def check_dependencies(edges: Iterable[Edge], task_id: int, depends_on: Iterable[int]):
+    """Raise DependencyCycleError if replacing task_id's dependencies adds a cycle"""
+    depends_on = set(depends_on)
+    if task_id in depends_on:
+        raise DependencyCycleError(f"Task {task_id} cannot depend on itself")
+    candidate = [(task, upstream) for task, upstream in edges if task != task_id]
+    candidate += [(task_id, upstream) for upstream in depends_on]
+    cycle = find_cycle(candidate)
+    if cycle:
+        raise DependencyCycleError("Dependency cycle: " + " -> ".join(str(task) for task in cycle))
+
+
+def reachable(downstream: Dict[int, Set[int]], root: int) -> Set[int]:
+    """Get the root and every task downstream of it"""
+    seen = {root}
+    stack = [root]
+    while stack:
+        for node in downstream.get(stack.pop(), ()):
+            if node not in seen:
+                seen.add(node)
+                stack.append(node)
+    return seen
+
+
+class DagRun:
+    """Progress of one run through a dependency graph"""
+
+    def __init__(self, run_id: int, root_id: int, edges: Iterable[Edge]):
+        upstream, downstream = build_graph(edges)
+        self.run_id = run_id
+        self.root_id = root_id
+        self.nodes = reachable(downstream, root_id)
+        self.upstream = {node: upstream.get(node, set()) & self.nodes for node in self.nodes}
+        self.downstream = {node: downstream.get(node, set()) & self.nodes for node in self.nodes}
+        self.states = {node: 'pending' for node in self.nodes}
+        self.started: Dict[int, float] = {}
+        self.finished: Dict[int, float] = {}
+        self.created = time.monotonic()
+        self._lock = threading.Lock()
+
+    def start(self, task_id: int):
+        with self._lock:
+            self.states[task_id] = 'running'
+            self.started[task_id] = time.monotonic()
+
+    def complete(self, task_id: int, outcome: str) -> Tuple[List[int], List[int], bool]:
+        """Record a task's outcome ('success', 'failed', 'cancelled' or 'skipped')
+
+        Returns the tasks that became ready, the tasks skipped because of
+        this outcome, and whether the run is now finished.
+        """
+        with self._lock:
+            self.states[task_id] = outcome
+            self.finished[task_id] = time.monotonic()
+
+            ready, skipped = [], []
+            if outcome == 'success':
+                for node in sorted(self.downstream[task_id]):
+                    if self.states[node] == 'pending' and all(
+                            self.states[upstream] == 'success' for upstream in self.upstream[node]):
+                        self.states[node] = 'queued'
+                        ready.append(node)
+            else:
+                stack = sorted(self.downstream[task_id])
+                while stack:
+                    node = stack.pop()
+                    if self.states[node] == 'pending':
+                        self.states[node] = 'skipped'
+                        skipped.append(node)
+                        stack.extend(self.downstream[node])
+
+            done = all(state in ('success', 'failed', 'cancelled', 'skipped') for state in self.states.values())
+            return ready, skipped, done
+
+    @property
+    def status(self) -> str:
+        if all(state == 'success' for state in self.states.values()):
+            return 'success'
+        return 'failed'
+
+    def critical_path(self) -> Tuple[float, List[int]]:
+        """Get the longest chain of task durations (seconds) and its task ids
+
+        This is the shortest time the run could take with unlimited workers.
+        """
+        longest: Dict[int, Tuple[float, List[int]]] = {}
+        # An upstream task always finishes before its downstream starts
+        for node in sorted(self.finished, key=self.finished.get):
+            if node not in self.started:
+                continue
+            before = max((longest[upstream] for upstream in self.upstream[node] if upstream in longest),
+                         key=lambda entry: entry[0], default=(0.0, []))
+            duration = self.finished[node] - self.started[node]
+            longest[node] = (before[0] + duration, before[1] + [node])
+        return max(longest.values(), key=lambda entry: entry[0], default=(0.0, []))
@@ -1,151 +1,830 @@
-import sqlite3
-from datetime import datetime
-from typing import List, Dict, Optional
+import math
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
 import json
+import queries
+from records import record_factory, TaskRecord, ExecutionRecord
 
 DATABASE_FILE = "tasks.db"
 
+# Optional per-task settings (column -> definition). NULL means "use the
+# service-wide default". They are added to older databases by init_db()
+# and accepted by create_task() and update_task().
+TASK_OPTIONS = {
+    'spread_mode': 'TEXT',
+    'spread_window': 'INTEGER',
+    'misfire_policy': 'TEXT',
+    'misfire_grace': 'INTEGER',
+    'max_attempts': 'INTEGER',
+    'retry_backoff': 'INTEGER',
+    'retry_exit_codes': 'TEXT',
+    'breaker_threshold': 'INTEGER',
+    'breaker_cooldown': 'INTEGER',
+    'timeout_seconds': 'INTEGER',
+    'cpu_seconds': 'INTEGER',
+    'memory_mb': 'INTEGER',
+    'nice': 'INTEGER',
+    'io_priority': 'TEXT',
+    'task_type': 'TEXT',
+    'priority': 'TEXT',
+    'weight': 'INTEGER',
+    'alert_window': 'INTEGER',
+    'http_method': 'TEXT',
+    'http_headers': 'TEXT',
+    'http_body': 'TEXT',
+    'expected_status': 'TEXT',
+}
+
+# Circuit breaker state kept on each task by the scheduler
+BREAKER_COLUMNS = {
+    'consecutive_failures': 'INTEGER NOT NULL DEFAULT 0',
+    'breaker_open_until': 'EPOCH_MS INTEGER',
+}
+
+_EXTRA_TASK_COLUMNS = ''.join(f",\n            {column} {definition}"
+                               for column, definition in {**BREAKER_COLUMNS, **TASK_OPTIONS}.items())
+
+# Columns update_task() is allowed to change
+UPDATABLE_COLUMNS = ({'task_name', 'command', 'schedule', 'description', 'status', 'last_run', 'next_run'}
+                     | set(BREAKER_COLUMNS) | set(TASK_OPTIONS))
+
+# One persistent connection per thread (and database file), so the named
+# statements in queries.py stay compiled in its statement cache
+_local = threading.local()
+
+# In-memory mirror of the change versions so conditional requests can be
+# answered without opening a connection
+_versions_lock = threading.Lock()
+_table_version = 0
+_table_changed_at = datetime.now(timezone.utc)
+_task_versions: Dict[int, Tuple[int, datetime]] = {}  # Task id -> (version, changed_at)
+
 def get_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    conn.row_factory = sqlite3.Row
+    """Get this thread's database connection"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    
+    conn = connections.get(DATABASE_FILE)
+    if conn is None:
+        conn = queries.connect(DATABASE_FILE)
+        conn.row_factory = record_factory
+        connections[DATABASE_FILE] = conn
     return conn
 
+# Timestamps are stored as integer epoch milliseconds (UTC). The leading
+# EPOCH_MS in the declared type selects the converter in queries.py; the
+# trailing INTEGER gives the column integer affinity.
+TABLES = {
+    'tasks': f'''
+        CREATE TABLE IF NOT EXISTS {{name}} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_name TEXT NOT NULL,
+            command TEXT NOT NULL,
+            schedule TEXT NOT NULL,
+            description TEXT,
+            status TEXT DEFAULT 'active',
+            created_at EPOCH_MS INTEGER DEFAULT {queries.NOW_MS},
+            last_run EPOCH_MS INTEGER,
+            next_run EPOCH_MS INTEGER,
+            version INTEGER NOT NULL DEFAULT 0{_EXTRA_TASK_COLUMNS}
+        )
+    ''',
+    'task_executions': f'''
+        CREATE TABLE IF NOT EXISTS {{name}} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER,
+            execution_time EPOCH_MS INTEGER DEFAULT {queries.NOW_MS},
+            status TEXT NOT NULL,
+            output TEXT,
+            error TEXT,
+            dag_run_id INTEGER,
+            attempt INTEGER NOT NULL DEFAULT 1,
+            duration_ms INTEGER,
+            FOREIGN KEY (task_id) REFERENCES tasks (id)
+        )
+    ''',
+    # Execution counts per task and UTC day, kept up to date as executions
+    # are logged so reports never scan task_executions
+    'execution_daily': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            day TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            runs INTEGER NOT NULL DEFAULT 0,
+            successes INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            missed INTEGER NOT NULL DEFAULT 0,
+            timed_runs INTEGER NOT NULL DEFAULT 0,
+            total_duration_ms INTEGER NOT NULL DEFAULT 0,
+            max_duration_ms INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, task_id)
+        )
+    ''',
+    # Run durations per task and day as a histogram over duration_bucket()
+    'execution_daily_durations': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            day TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, task_id, bucket)
+        )
+    ''',
+    # Dependency edges: task_id runs after depends_on succeeds
+    'task_dependencies': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            task_id INTEGER NOT NULL,
+            depends_on INTEGER NOT NULL,
+            PRIMARY KEY (task_id, depends_on)
+        )
+    ''',
+    # One row per run through a dependency graph, started by its root task
+    'dag_runs': f'''
+        CREATE TABLE IF NOT EXISTS {{name}} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            root_task_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            started_at EPOCH_MS INTEGER DEFAULT {queries.NOW_MS},
+            finished_at EPOCH_MS INTEGER,
+            duration_ms INTEGER,
+            critical_path_ms INTEGER,
+            critical_path TEXT,
+            tasks_run INTEGER
+        )
+    ''',
+    # Emails waiting for the outbox delivery worker (see outbox.py)
+    'email_outbox': f'''
+        CREATE TABLE IF NOT EXISTS {{name}} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            html_body TEXT,
+            attachments TEXT,
+            compress TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at EPOCH_MS INTEGER DEFAULT {queries.NOW_MS},
+            next_attempt_at EPOCH_MS INTEGER DEFAULT {queries.NOW_MS},
+            sent_at EPOCH_MS INTEGER
+        )
+    ''',
+    # Change tracking: a table-wide counter plus tombstones for deleted tasks
+    'change_versions': f'''
+        CREATE TABLE IF NOT EXISTS {{name}} (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            changed_at EPOCH_MS INTEGER DEFAULT {queries.NOW_MS}
+        )
+    ''',
+    'deleted_tasks': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            task_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    ''',
+}
+
+OUTBOX_INDEX = 'CREATE INDEX IF NOT EXISTS idx_outbox_due ON email_outbox (status, next_attempt_at)'
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_tasks_version ON tasks (version)',
+    'CREATE INDEX IF NOT EXISTS idx_tasks_next_run ON tasks (next_run)',
+    'CREATE INDEX IF NOT EXISTS idx_executions_task_time ON task_executions (task_id, execution_time)',
+    'CREATE INDEX IF NOT EXISTS idx_executions_time ON task_executions (execution_time)',
+    'CREATE INDEX IF NOT EXISTS idx_executions_dag_run ON task_executions (dag_run_id)',
+    'CREATE INDEX IF NOT EXISTS idx_dependencies_upstream ON task_dependencies (depends_on)',
+    'CREATE INDEX IF NOT EXISTS idx_dag_runs_root ON dag_runs (root_task_id, id)',
+    OUTBOX_INDEX,
+]
+
 def init_db():
     """Initialize the database with required tables"""
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        # Create tasks table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                task_name TEXT NOT NULL,
-                command TEXT NOT NULL,
-                schedule TEXT NOT NULL,
-                description TEXT,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_run TIMESTAMP,
-                next_run TIMESTAMP
-            )
-        ''')
+        # Readers don't block the writer, and commits are appends to the log
+        cursor.execute('PRAGMA journal_mode = WAL')
+        
+        for name, create_sql in TABLES.items():
+            cursor.execute(create_sql.format(name=name))
+        
+        # Bring databases created by older versions up to date
+        _ensure_column(cursor, 'tasks', 'version', 'INTEGER NOT NULL DEFAULT 0')
+        for column, definition in {**BREAKER_COLUMNS, **TASK_OPTIONS}.items():
+            _ensure_column(cursor, 'tasks', column, definition)
+        _ensure_column(cursor, 'task_executions', 'dag_run_id', 'INTEGER')
+        _ensure_column(cursor, 'task_executions', 'attempt', 'INTEGER NOT NULL DEFAULT 1')
+        _ensure_column(cursor, 'task_executions', 'duration_ms', 'INTEGER')
+        _ensure_column(cursor, 'email_outbox', 'compress', 'TEXT')
+        for table in TABLES:
+            _migrate_epoch_columns(conn, table)
+        
+        cursor.execute("INSERT OR IGNORE INTO change_versions (name, version) VALUES ('tasks', 0)")
+        for index_sql in INDEXES:
+            cursor.execute(index_sql)
+        
+        # First start with the rollup tables: build them from the history
+        if not queries.execute(cursor, 'rollups.exists').fetchone():
+            rebuild_rollups()
+        
+        conn.commit()
+    
+    _load_versions()
+
+def init_outbox():
+    """Make sure just the email outbox table exists, for processes that only queue email"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.execute(TABLES['email_outbox'].format(name='email_outbox'))
+        _ensure_column(cursor, 'email_outbox', 'compress', 'TEXT')
+        cursor.execute(OUTBOX_INDEX)
+        conn.commit()
+
+def _table_columns(cursor, table: str) -> Dict[str, str]:
+    """Get a table's column names and declared types"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row['name']: row['type'] for row in cursor.fetchall()}
+
+def _ensure_column(cursor, table: str, column: str, definition: str):
+    """Add a column to an existing table if an older database lacks it"""
+    if column not in _table_columns(cursor, table):
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def _migrate_epoch_columns(conn, table: str):
+    """Rebuild a table whose timestamps are still CURRENT_TIMESTAMP text
+    
+    SQLite cannot change a column's type in place, so the table is copied
+    into a new one with EPOCH_MS columns, converting text timestamps
+    (including ones with a UTC offset) to epoch milliseconds on the way.
+    """
+    cursor = conn.cursor()
+    old_columns = _table_columns(cursor, table)
+    if 'TIMESTAMP' not in old_columns.values():
+        return
+    
+    conn.commit()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))
+        sequence = cursor.fetchone()
         
-        # Create task_executions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS task_executions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                task_id INTEGER,
-                execution_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT NOT NULL,
-                output TEXT,
-                error TEXT,
-                FOREIGN KEY (task_id) REFERENCES tasks (id)
-            )
+        new_table = f'{table}_epoch_ms'
+        cursor.execute(f'DROP TABLE IF EXISTS {new_table}')
+        cursor.execute(TABLES[table].format(name=new_table))
+        new_columns = _table_columns(cursor, new_table)
+        
+        copied = [column for column in new_columns if column in old_columns]
+        selects = [
+            queries.epoch_ms_sql(column) if old_columns[column] == 'TIMESTAMP' else column
+            for column in copied
+        ]
+        cursor.execute(f'''
+            INSERT INTO {new_table} ({', '.join(copied)})
+            SELECT {', '.join(selects)} FROM {table}
         ''')
         
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+        if sequence:
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name = ?', (table,))
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, sequence['seq']))
         conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _load_versions():
+    """Populate the in-memory version cache from the database"""
+    global _table_version, _table_changed_at
+    
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        row = queries.execute(cursor, 'versions.get').fetchone()
+        queries.execute(cursor, 'tasks.versions')
+        task_rows = cursor.fetchall()
+    
+    with _versions_lock:
+        _table_version = row['version'] if row else 0
+        if row and row['changed_at']:
+            _table_changed_at = row['changed_at']
+        # Only the table's change time is stored; no task changed after it
+        _task_versions.clear()
+        _task_versions.update((task['id'], (task['version'], _table_changed_at)) for task in task_rows)
+
+def _bump_version(cursor, task_id: int, deleted: bool = False) -> int:
+    """Advance the table version and stamp it on the changed task
+    
+    Must be called inside the write transaction; call _publish_version()
+    once it has been committed.
+    """
+    queries.execute(cursor, 'versions.bump')
+    version = queries.execute(cursor, 'versions.get').fetchone()[0]
+    
+    if deleted:
+        queries.execute(cursor, 'deleted.insert', (task_id, version))
+    else:
+        queries.execute(cursor, 'tasks.set_version', (version, task_id))
+    
+    return version
 
-def create_task(task_name: str, command: str, schedule: str, description: str = None) -> int:
-    """Create a new task in the database"""
+def _publish_version(task_id: int, version: int, deleted: bool = False):
+    """Expose a committed version to the in-memory cache"""
+    global _table_version, _table_changed_at
+    
+    now = datetime.now(timezone.utc)
+    with _versions_lock:
+        if version > _table_version:
+            _table_version = version
+            _table_changed_at = now
+        if deleted:
+            _task_versions.pop(task_id, None)
+        elif version > _task_versions.get(task_id, (0, None))[0]:
+            # Writers can publish out of commit order; never go back to an older version
+            _task_versions[task_id] = (version, now)
+
+def get_table_version() -> Tuple[int, datetime]:
+    """Get the current tasks table version and when it last changed"""
+    with _versions_lock:
+        return _table_version, _table_changed_at
+
+def get_task_version(task_id: int) -> Optional[Tuple[int, datetime]]:
+    """Get the current version of a task and when it last changed, or None if it is unknown"""
+    with _versions_lock:
+        return _task_versions.get(task_id)
+
+def create_task(task_name: str, command: str, schedule: str, description: str = None, options: Dict = None) -> int:
+    """Create a new task in the database, with optional TASK_OPTIONS settings"""
+    options = {key: value for key, value in (options or {}).items() if key in TASK_OPTIONS and value is not None}
+    
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO tasks (task_name, command, schedule, description)
-            VALUES (?, ?, ?, ?)
-        ''', (task_name, command, schedule, description))
+        queries.execute(cursor, 'tasks.insert', (task_name, command, schedule, description))
         
         task_id = cursor.lastrowid
+        if options:
+            statement, columns = queries.update_statement(options)
+            queries.execute(cursor, statement, [queries.adapt(column, options[column]) for column in columns] + [task_id])
+        version = _bump_version(cursor, task_id)
         conn.commit()
-        return task_id
+    
+    _publish_version(task_id, version)
+    return task_id
 
-def get_task(task_id: int) -> Optional[Dict]:
-    """Get a task by ID"""
+def create_tasks(tasks: List[Dict]) -> List[int]:
+    """Create many tasks in one transaction; each dict has create_task()'s arguments"""
+    created = []
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
-        row = cursor.fetchone()
+        for task in tasks:
+            queries.execute(cursor, 'tasks.insert', (task['task_name'], task['command'], task['schedule'],
+                                                     task.get('description')))
+            task_id = cursor.lastrowid
+            options = {key: value for key, value in (task.get('options') or {}).items()
+                       if key in TASK_OPTIONS and value is not None}
+            if options:
+                statement, columns = queries.update_statement(options)
+                queries.execute(cursor, statement,
+                                [queries.adapt(column, options[column]) for column in columns] + [task_id])
+            created.append((task_id, _bump_version(cursor, task_id)))
+        conn.commit()
+    
+    for task_id, version in created:
+        _publish_version(task_id, version)
+    return [task_id for task_id, _ in created]
+
+def get_task(task_id: int) -> Optional[TaskRecord]:
+    """Get a task by ID"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
         
-        if row:
-            return dict(row)
-        return None
+        queries.execute(cursor, 'tasks.get', (task_id,))
+        return cursor.fetchone()
 
-def get_all_tasks() -> List[Dict]:
+def get_all_tasks() -> List[TaskRecord]:
     """Get all tasks"""
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM tasks ORDER BY created_at DESC')
+        queries.execute(cursor, 'tasks.all')
+        return cursor.fetchall()
+
+def get_all_tasks_rows() -> Tuple[List[str], List[tuple]]:
+    """Get all tasks as column names plus raw rows, for direct serialization"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        
+        queries.execute(cursor, 'tasks.all')
         rows = cursor.fetchall()
         
-        return [dict(row) for row in rows]
+        return [column[0] for column in cursor.description], rows
+
+def get_tasks_page_rows(after_id: int = 0, limit: int = 1000) -> Tuple[List[str], List[tuple]]:
+    """Get up to `limit` tasks with ids above after_id, in id order, as column names plus raw rows"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        
+        queries.execute(cursor, 'tasks.page', (after_id, limit))
+        rows = cursor.fetchall()
+        
+        return [column[0] for column in cursor.description], rows
 
 def update_task(task_id: int, updates: Dict) -> bool:
     """Update a task"""
     if not updates:
         return False
         
+    columns = [key for key in updates if key in UPDATABLE_COLUMNS]
+    if not columns:
+        return False
+    
+    # One registered statement per column set, so repeated patterns reuse it
+    statement, columns = queries.update_statement(columns)
+    values = [queries.adapt(column, updates[column]) for column in columns]
+    values.append(task_id)
+    
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        # Build dynamic update query
-        set_clauses = []
-        values = []
-        
-        for key, value in updates.items():
-            if key in ['task_name', 'command', 'schedule', 'description', 'status', 'last_run', 'next_run']:
-                set_clauses.append(f"{key} = ?")
-                values.append(value)
-        
-        if not set_clauses:
-            return False
-        
-        query = f"UPDATE tasks SET {', '.join(set_clauses)} WHERE id = ?"
-        values.append(task_id)
-        
-        cursor.execute(query, values)
+        queries.execute(cursor, statement, values)
         success = cursor.rowcount > 0
+        if success:
+            version = _bump_version(cursor, task_id)
         conn.commit()
-        
-        return success
+    
+    if success:
+        _publish_version(task_id, version)
+    return success
 
 def delete_task(task_id: int) -> bool:
     """Delete a task"""
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+        queries.execute(cursor, 'tasks.delete', (task_id,))
         success = cursor.rowcount > 0
+        if success:
+            queries.execute(cursor, 'dependencies.delete_task', (task_id, task_id))
+            version = _bump_version(cursor, task_id, deleted=True)
         conn.commit()
+    
+    if success:
+        _publish_version(task_id, version, deleted=True)
+    return success
+
+def delete_tasks(task_ids: List[int]) -> List[int]:
+    """Delete many tasks in one transaction; returns the ids that existed"""
+    deleted = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
         
-        return success
+        for task_id in task_ids:
+            queries.execute(cursor, 'tasks.delete', (task_id,))
+            if cursor.rowcount > 0:
+                queries.execute(cursor, 'dependencies.delete_task', (task_id, task_id))
+                deleted.append((task_id, _bump_version(cursor, task_id, deleted=True)))
+        conn.commit()
+    
+    for task_id, version in deleted:
+        _publish_version(task_id, version, deleted=True)
+    return [task_id for task_id, _ in deleted]
+
+# Durations are rolled up into log-scale buckets 10% wide, so a percentile
+# over any range of days is within 5% of the exact value
+DURATION_BUCKET_BASE = 1.1
 
-def log_task_execution(task_id: int, status: str, output: str = None, error: str = None):
+_ROLLUP_STATUSES = ('success', 'failed', 'cancelled', 'skipped', 'missed')
+
+def duration_bucket(duration_ms: int) -> int:
+    """Histogram bucket holding a run duration"""
+    return int(math.log(max(duration_ms, 1), DURATION_BUCKET_BASE))
+
+def bucket_duration_ms(bucket: int) -> float:
+    """Representative duration of a histogram bucket (its geometric midpoint)"""
+    return DURATION_BUCKET_BASE ** (bucket + 0.5)
+
+def _rollup_execution(cursor, task_id: int, day: date, status: str, duration_ms: int = None):
+    """Add one execution to the daily rollups"""
+    counts = [int(status == counted) for counted in _ROLLUP_STATUSES]
+    ran = int(status in ('success', 'failed', 'cancelled'))
+    timed = duration_ms is not None
+    queries.execute(cursor, 'rollups.add', (day, task_id, ran, *counts, int(timed),
+                                            duration_ms or 0, duration_ms or 0))
+    if timed:
+        queries.execute(cursor, 'rollups.add_duration', (day, task_id, duration_bucket(duration_ms)))
+
+def log_task_execution(task_id: int, status: str, output: str = None, error: str = None,
+                       dag_run_id: int = None, attempt: int = 1, duration_ms: int = None):
     """Log task execution result"""
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO task_executions (task_id, status, output, error)
-            VALUES (?, ?, ?, ?)
-        ''', (task_id, status, output, error))
+        queries.execute(cursor, 'executions.insert',
+                        (task_id, status, output, error, dag_run_id, attempt, duration_ms))
+        _rollup_execution(cursor, task_id, datetime.now(timezone.utc).date(), status, duration_ms)
         
+        # New history rows change the task's history representation
+        version = _bump_version(cursor, task_id)
         conn.commit()
+    
+    _publish_version(task_id, version)
 
-def get_task_history(task_id: int) -> List[Dict]:
-    """Get execution history for a task"""
+def log_missed_runs(task_id: int, run_times: List[datetime], reason: str):
+    """Record fires that did not run as 'missed' executions at their scheduled times"""
+    if not run_times:
+        return
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM task_executions 
-            WHERE task_id = ? 
-            ORDER BY execution_time DESC 
-            LIMIT 50
-        ''', (task_id,))
+        queries.executemany(cursor, 'executions.insert_at',
+                            [(task_id, run_time, 'missed', None, reason) for run_time in run_times])
+        for run_time in run_times:
+            day = (run_time if run_time.tzinfo else run_time.replace(tzinfo=timezone.utc)).astimezone(timezone.utc)
+            _rollup_execution(cursor, task_id, day.date(), 'missed')
+        
+        version = _bump_version(cursor, task_id)
+        conn.commit()
+    
+    _publish_version(task_id, version)
+
+def get_task_history(task_id: int, limit: int = 50, offset: int = 0) -> List[ExecutionRecord]:
+    """Get execution history for a task, newest first"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
         
+        queries.execute(cursor, 'executions.page', (task_id, limit, offset))
+        return cursor.fetchall()
+
+def get_task_history_rows(task_id: int, limit: int = 50, offset: int = 0) -> Tuple[List[str], List[tuple]]:
+    """Get execution history as column names plus raw rows, for direct serialization"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        
+        queries.execute(cursor, 'executions.page', (task_id, limit, offset))
+        rows = cursor.fetchall()
+        
+        return [column[0] for column in cursor.description], rows
+
+def get_task_history_page_rows(task_id: int, before: Tuple[int, int], limit: int = 50) -> Tuple[List[str], List[tuple]]:
+    """Get the executions older than before, an (epoch ms execution_time, id) pair, newest first"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        
+        queries.execute(cursor, 'executions.page_before', (task_id, before[0], before[1], limit))
         rows = cursor.fetchall()
         
-        return [dict(row) for row in rows]
\ No newline at end of file
+        return [column[0] for column in cursor.description], rows
+
+def get_changes_since(since: int) -> Dict:
+    """Get tasks changed and ids deleted after the given table version"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        version = queries.execute(cursor, 'versions.get').fetchone()[0]
+        
+        queries.execute(cursor, 'tasks.changed_since', (since,))
+        changed = cursor.fetchall()
+        
+        queries.execute(cursor, 'deleted.since', (since,))
+        deleted = [row['task_id'] for row in cursor.fetchall()]
+        
+        return {"version": version, "changed": changed, "deleted": deleted}
+
+
+def get_rollups(first_day: date, last_day: date) -> Tuple[List[Dict], Dict[int, Dict[int, int]]]:
+    """Get per-task execution totals and duration histograms for the UTC days first_day..last_day"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'rollups.between', (first_day, last_day))
+        totals = [dict(row) for row in cursor.fetchall()]
+        
+        # Thousands of histogram rows; plain tuples skip the record layer
+        cursor.row_factory = None
+        histograms: Dict[int, Dict[int, int]] = {}
+        for task_id, bucket, count in queries.execute(cursor, 'rollups.durations_between', (first_day, last_day)):
+            histograms.setdefault(task_id, {})[bucket] = count
+        return totals, histograms
+
+def rebuild_rollups():
+    """Recompute the daily rollups from the full execution history"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        conn.create_function('duration_bucket', 1, duration_bucket, deterministic=True)
+        
+        queries.execute(cursor, 'rollups.clear')
+        queries.execute(cursor, 'rollups.clear_durations')
+        queries.execute(cursor, 'rollups.rebuild')
+        queries.execute(cursor, 'rollups.rebuild_durations')
+        conn.commit()
+
+def get_executions_between(start: datetime, end: datetime) -> List[ExecutionRecord]:
+    """Get executions of all tasks in [start, end), newest first"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'executions.between', (start, end))
+        return cursor.fetchall()
+
+def get_recent_executions(minutes: int = 60) -> List[ExecutionRecord]:
+    """Get executions of all tasks in the last N minutes, e.g. runs in the last hour"""
+    now = datetime.now(timezone.utc)
+    return get_executions_between(now - timedelta(minutes=minutes), now + timedelta(milliseconds=1))
+
+def get_active_schedules() -> List[tuple]:
+    """Get (id, task_name, schedule, spread_mode, spread_window) for every active task"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        
+        queries.execute(cursor, 'tasks.active_schedules')
+        return cursor.fetchall()
+
+def get_tasks_due_within(minutes: int) -> List[TaskRecord]:
+    """Get active tasks whose next run falls in the next N minutes"""
+    now = datetime.now(timezone.utc)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'tasks.due_between', (now, now + timedelta(minutes=minutes)))
+        return cursor.fetchall()
+
+def get_dependency_edges() -> List[Tuple[int, int]]:
+    """Get every dependency as a (task_id, depends_on) pair"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        
+        queries.execute(cursor, 'dependencies.all')
+        return cursor.fetchall()
+
+def set_dependencies(task_id: int, depends_on: List[int]):
+    """Replace the upstream dependencies of a task"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'dependencies.clear', (task_id,))
+        queries.executemany(cursor, 'dependencies.insert', [(task_id, upstream) for upstream in sorted(set(depends_on))])
+        version = _bump_version(cursor, task_id)
+        conn.commit()
+    
+    _publish_version(task_id, version)
+
+def create_dag_run(root_task_id: int) -> int:
+    """Start recording a DAG run"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'dag_runs.insert', (root_task_id,))
+        conn.commit()
+        return cursor.lastrowid
+
+def finish_dag_run(run_id: int, status: str, duration_ms: int, critical_path_ms: int,
+                   critical_path: List[int], tasks_run: int):
+    """Record how a DAG run ended"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'dag_runs.finish', (status, datetime.now(timezone.utc), duration_ms, critical_path_ms,
+                                                    json.dumps(critical_path), tasks_run, run_id))
+        conn.commit()
+
+def interrupt_dag_runs():
+    """Mark DAG runs left running by a previous process as interrupted"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'dag_runs.interrupt')
+        conn.commit()
+        return cursor.rowcount
+
+def get_dag_run(run_id: int) -> Optional[Dict]:
+    """Get a DAG run with the executions that belong to it"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        run = queries.execute(cursor, 'dag_runs.get', (run_id,)).fetchone()
+        if not run:
+            return None
+        executions = queries.execute(cursor, 'executions.for_dag_run', (run_id,)).fetchall()
+        
+        result = dict(run)
+        result['critical_path'] = json.loads(run['critical_path']) if run['critical_path'] else []
+        result['executions'] = [dict(execution) for execution in executions]
+        return result
+
+def get_dag_runs(root_task_id: int, limit: int = 50, offset: int = 0) -> List[Dict]:
+    """Get DAG runs started by a task, newest first"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'dag_runs.page', (root_task_id, limit, offset))
+        runs = [dict(run) for run in cursor.fetchall()]
+    
+    for run in runs:
+        run['critical_path'] = json.loads(run['critical_path']) if run['critical_path'] else []
+    return runs
+
+def enqueue_email(recipient: str, subject: str, body: str, html_body: str = None,
+                  attachments: List[str] = None, compress: str = None) -> int:
+    """Add an email to the outbox"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'outbox.insert', (recipient, subject, body, html_body,
+                                                  json.dumps(attachments) if attachments else None, compress))
+        conn.commit()
+        return cursor.lastrowid
+
+def get_due_emails(now: datetime, limit: int) -> List[Dict]:
+    """Get queued emails whose next attempt is due, oldest first"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'outbox.due', (now, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+def claim_email(email_id: int) -> bool:
+    """Mark a queued email as being sent; False if something else claimed it"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'outbox.claim', (email_id,))
+        conn.commit()
+        return cursor.rowcount == 1
+
+def mark_email_sent(email_id: int):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'outbox.sent', (datetime.now(timezone.utc), email_id))
+        conn.commit()
+
+def retry_email(email_id: int, next_attempt_at: datetime, error: str):
+    """Put an email back in the queue for another attempt"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'outbox.retry', (next_attempt_at, error, email_id))
+        conn.commit()
+
+def fail_email(email_id: int, error: str):
+    """Give up on an email"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'outbox.fail', (error, email_id))
+        conn.commit()
+
+def defer_email(email_id: int, next_attempt_at: datetime):
+    """Push back a queued email without counting an attempt"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'outbox.defer', (next_attempt_at, email_id))
+        conn.commit()
+
+def recover_outbox() -> int:
+    """Requeue emails a previous process was sending when it stopped"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'outbox.recover')
+        conn.commit()
+        return cursor.rowcount
+
+def get_outbox_counts() -> Dict[str, int]:
+    """Count outbox emails by status"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        queries.execute(cursor, 'outbox.counts')
+        return {row['status']: row['count'] for row in cursor.fetchall()}
+
+def get_outbox(status: str = None, limit: int = 50, offset: int = 0) -> List[Dict]:
+    """Get outbox emails, newest first"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        if status:
+            queries.execute(cursor, 'outbox.page_status', (status, limit, offset))
+        else:
+            queries.execute(cursor, 'outbox.page', (limit, offset))
+        rows = [dict(row) for row in cursor.fetchall()]
+    
+    for row in rows:
+        row['attachments'] = json.loads(row['attachments']) if row['attachments'] else []
+    return rows
@@ -0,0 +1,193 @@
+"""
+Priority dispatch queue in front of the task workers
+
+APScheduler only decides when a task is due; the run itself goes through
+this queue to a fixed pool of worker threads. The queue serves priority
+classes strictly in order (high, then normal, then low), and within a
+class shares workers between tasks by weight using self-clocked weighted
+fair queuing: each queued run gets a virtual finish tag
+
+    finish = max(class virtual time, previous finish of the same task) + 1 / weight
+
+and the smallest tag goes next. A task with weight 3 gets three times the
+dispatches of a weight-1 task while both have runs waiting, and a task
+with a backlog of runs cannot hold the class to itself.
+
+Queue wait (dispatch lag) is tracked per class.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Strict priority order, highest first
+PRIORITY_CLASSES = ('high', 'normal', 'low')
+DEFAULT_PRIORITY = 'normal'
+
+# Recent waits kept per class for the percentiles
+WAIT_SAMPLES = 1000
+
+
+def validate_priority(priority, weight):
+    """Check per-task priority settings"""
+    if priority is not None and priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Invalid priority {priority!r}. Expected one of: {', '.join(PRIORITY_CLASSES)}")
+    if weight is not None and weight < 1:
+        raise ValueError("Weight must be at least 1")
+
+
+class _Item:
+    __slots__ = ('func', 'args', 'kwargs', 'flow', 'key', 'enqueued')
+
+    def __init__(self, func, args, kwargs, flow, key, enqueued):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.flow = flow
+        self.key = key
+        self.enqueued = enqueued
+
+
+class _FairClass:
+    """One priority class: weighted fair queuing between flows"""
+
+    def __init__(self):
+        self.heap = []
+        self.virtual_time = 0.0
+        self.last_finish: Dict[object, float] = {}
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.dispatched = 0
+
+    def push(self, item, weight: float, seq: int):
+        start = max(self.virtual_time, self.last_finish.get(item.flow, 0.0))
+        finish = start + 1.0 / weight
+        self.last_finish[item.flow] = finish
+        heapq.heappush(self.heap, (finish, seq, item))
+
+    def pop(self):
+        finish, _, item = heapq.heappop(self.heap)
+        self.virtual_time = finish
+        if not self.heap:
+            # Nothing waiting, so no flow has credit or debt to carry over
+            self.last_finish.clear()
+        return item
+
+
+class FairQueue:
+    """Strict priority classes with weighted fair queuing inside each (not thread-safe)"""
+
+    def __init__(self, clock=time.monotonic):
+        self._classes = {priority: _FairClass() for priority in PRIORITY_CLASSES}
+        self._seq = itertools.count()
+        self._clock = clock
+
+    def __len__(self):
+        return sum(len(fair_class.heap) for fair_class in self._classes.values())
+
+    def push(self, item, priority: str = DEFAULT_PRIORITY, weight: float = 1):
+        self._classes[priority].push(item, weight, next(self._seq))
+
+    def pop(self):
+        """Get the next item and its priority class, or None if empty"""
+        for priority, fair_class in self._classes.items():
+            if fair_class.heap:
+                item = fair_class.pop()
+                fair_class.dispatched += 1
+                fair_class.waits.append(self._clock() - item.enqueued)
+                return item, priority
+        return None
+
+    def stats(self) -> dict:
+        result = {}
+        for priority, fair_class in self._classes.items():
+            waits = sorted(fair_class.waits)
+            result[priority] = {
+                'queued': len(fair_class.heap),
+                'dispatched': fair_class.dispatched,
+                'wait_ms': {
+                    'mean': round(sum(waits) / len(waits) * 1000, 1) if waits else None,
+                    'p50': round(waits[len(waits) // 2] * 1000, 1) if waits else None,
+                    'p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else None,
+                    'max': round(waits[-1] * 1000, 1) if waits else None,
+                },
+            }
+        return result
+
+
+class Dispatcher:
+    """A FairQueue served by a fixed pool of worker threads"""
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._queue = FairQueue()
+        self._in_flight = set()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._busy = 0
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"dispatch-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func: Callable, args=(), kwargs=None, priority: str = None, weight: int = None,
+               flow=None, key=None) -> bool:
+        """Queue a call; False if `key` is already queued or running, or the dispatcher is stopped
+
+        flow identifies who the call is fair-shared for (a task id).
+        """
+        with self._condition:
+            if self._stopping:
+                return False
+            if key is not None:
+                if key in self._in_flight:
+                    return False
+                self._in_flight.add(key)
+            item = _Item(func, args, kwargs or {}, flow, key, time.monotonic())
+            self._queue.push(item, priority or DEFAULT_PRIORITY, weight or 1)
+            self._condition.notify()
+        return True
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not len(self._queue) and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                item, _ = self._queue.pop()
+                self._busy += 1
+            try:
+                item.func(*item.args, **item.kwargs)
+            except Exception as e:
+                logger.error(f"Dispatched call {getattr(item.func, '__name__', item.func)} failed: {e}")
+            finally:
+                with self._condition:
+                    self._busy -= 1
+                    if item.key is not None:
+                        self._in_flight.discard(item.key)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {'workers': self.workers, 'busy': self._busy, 'classes': self._queue.stats()}
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Stop taking work and wait for running calls; queued calls are dropped"""
+        with self._condition:
+            self._stopping = True
+            dropped = len(self._queue)
+            self._condition.notify_all()
+        if dropped:
+            logger.warning(f"Dropped {dropped} queued task run(s) at shutdown")
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
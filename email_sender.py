@@ -3,15 +3,19 @@
 Email sending functionality for scheduled tasks
 """
 
-import smtplib
+import atexit
 import sys
 import os
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
-from datetime import datetime
+from datetime import date, datetime
 import json
+from smtp_pool import SMTPPool
+from attachments import StreamedMessage, encode_attachments
+from database import init_db, init_outbox
+from outbox import queue_email
+import reports
 
 # Email configuration - Update these with your email settings
 EMAIL_CONFIG = {
@@ -22,9 +26,63 @@ EMAIL_CONFIG = {
     "sender_name": "Task Scheduler"
 }
 
-def send_email(to_email, subject, body, html_body=None, attachments=None):
+# SMTP sessions are pooled and reused between sends from the same process,
+# e.g. alert fan-out from a Python task or a script sending many mails.
+# Set SMTP_USE_TLS=0 for a local server without STARTTLS (smtp_stub_server.py).
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', '4'))
+SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', '1') != '0'
+
+_smtp_pool = None
+_smtp_pool_lock = threading.Lock()
+
+def get_smtp_pool():
+    """Get the shared SMTP connection pool for EMAIL_CONFIG"""
+    global _smtp_pool
+    with _smtp_pool_lock:
+        if _smtp_pool is None:
+            _smtp_pool = SMTPPool(
+                EMAIL_CONFIG['smtp_server'],
+                EMAIL_CONFIG['smtp_port'],
+                EMAIL_CONFIG['sender_email'],
+                EMAIL_CONFIG['sender_password'],
+                use_tls=SMTP_USE_TLS,
+                size=SMTP_POOL_SIZE
+            )
+            atexit.register(_smtp_pool.close)
+        return _smtp_pool
+
+def build_message(to_email, subject, body, html_body=None):
+    """Build the MIME message for an email, without attachments"""
+    # Create message
+    msg = MIMEMultipart('alternative')
+    msg['From'] = f"{EMAIL_CONFIG['sender_name']} <{EMAIL_CONFIG['sender_email']}>"
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    
+    # Add plain text body
+    text_part = MIMEText(body, 'plain')
+    msg.attach(text_part)
+    
+    # Add HTML body if provided
+    if html_body:
+        html_part = MIMEText(html_body, 'html')
+        msg.attach(html_part)
+    
+    return msg
+
+def deliver(to_email, subject, body, html_body=None, attachments=None, compress=None):
+    """Send an email over the SMTP pool, streaming any attachments from the encoding cache"""
+    msg = build_message(to_email, subject, body, html_body)
+    encoded = encode_attachments(attachments, compress) if attachments else []
+    if encoded:
+        message = StreamedMessage(msg, encoded)
+        get_smtp_pool().send_stream(EMAIL_CONFIG['sender_email'], [to_email], message.chunks)
+    else:
+        get_smtp_pool().send_message(msg, EMAIL_CONFIG['sender_email'], to_email)
+
+def send_email(to_email, subject, body, html_body=None, attachments=None, compress=None):
     """
-    Send an email
+    Send an email now, without going through the outbox
     
     Args:
         to_email (str): Recipient email address
@@ -32,49 +90,14 @@ def send_email(to_email, subject, body, html_body=None, attachments=None):
         body (str): Plain text body
         html_body (str, optional): HTML body
         attachments (list, optional): List of file paths to attach
+        compress (str, optional): 'gzip' each attachment or 'zip' them into one archive
     
     Returns:
         bool: True if email sent successfully, False otherwise
     """
     try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['From'] = f"{EMAIL_CONFIG['sender_name']} <{EMAIL_CONFIG['sender_email']}>"
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Add plain text body
-        text_part = MIMEText(body, 'plain')
-        msg.attach(text_part)
-        
-        # Add HTML body if provided
-        if html_body:
-            html_part = MIMEText(html_body, 'html')
-            msg.attach(html_part)
-        
-        # Add attachments if provided
-        if attachments:
-            for file_path in attachments:
-                if os.path.isfile(file_path):
-                    with open(file_path, "rb") as attachment:
-                        part = MIMEBase('application', 'octet-stream')
-                        part.set_payload(attachment.read())
-                    
-                    encoders.encode_base64(part)
-                    part.add_header(
-                        'Content-Disposition',
-                        f'attachment; filename= {os.path.basename(file_path)}'
-                    )
-                    msg.attach(part)
-        
-        # Connect to server and send email
-        server = smtplib.SMTP(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port'])
-        server.starttls()  # Enable encryption
-        server.login(EMAIL_CONFIG['sender_email'], EMAIL_CONFIG['sender_password'])
-        
-        text = msg.as_string()
-        server.sendmail(EMAIL_CONFIG['sender_email'], to_email, text)
-        server.quit()
+        # Send over a pooled session that is already connected and logged in
+        deliver(to_email, subject, body, html_body, attachments, compress)
         
         print(f"✅ Email sent successfully to {to_email}")
         return True
@@ -83,113 +106,30 @@ def send_email(to_email, subject, body, html_body=None, attachments=None):
         print(f"❌ Failed to send email: {str(e)}")
         return False
 
-def send_daily_report():
-    """Send a daily report email"""
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    subject = f"Daily Report - {datetime.now().strftime('%Y-%m-%d')}"
-    
-    body = f"""
-Daily System Report
-==================
-
-Report Generated: {current_time}
+def queue(to_email, subject, body, html_body=None, attachments=None, compress=None):
+    """Queue an email in the outbox; the scheduler service delivers it"""
+    email_id = queue_email(to_email, subject, body, html_body, attachments, compress)
+    print(f"📬 Email queued for {to_email} (outbox id {email_id})")
+    return email_id
 
-System Status: ✅ All systems operational
-Tasks Completed: 15
-Errors: 0
-Uptime: 99.9%
-
-This is an automated report from your Task Scheduler.
-
-Best regards,
-Task Scheduler System
-"""
-    
-    html_body = f"""
-<html>
-<body>
-    <h2>📊 Daily System Report</h2>
-    <p><strong>Report Generated:</strong> {current_time}</p>
-    
-    <table border="1" style="border-collapse: collapse; width: 100%;">
-        <tr style="background-color: #f2f2f2;">
-            <th style="padding: 8px;">Metric</th>
-            <th style="padding: 8px;">Value</th>
-            <th style="padding: 8px;">Status</th>
-        </tr>
-        <tr>
-            <td style="padding: 8px;">System Status</td>
-            <td style="padding: 8px;">Operational</td>
-            <td style="padding: 8px;">✅</td>
-        </tr>
-        <tr>
-            <td style="padding: 8px;">Tasks Completed</td>
-            <td style="padding: 8px;">15</td>
-            <td style="padding: 8px;">✅</td>
-        </tr>
-        <tr>
-            <td style="padding: 8px;">Errors</td>
-            <td style="padding: 8px;">0</td>
-            <td style="padding: 8px;">✅</td>
-        </tr>
-        <tr>
-            <td style="padding: 8px;">Uptime</td>
-            <td style="padding: 8px;">99.9%</td>
-            <td style="padding: 8px;">✅</td>
-        </tr>
-    </table>
-    
-    <p><em>This is an automated report from your Task Scheduler.</em></p>
-</body>
-</html>
-"""
+def send_daily_report(day=None):
+    """Send a report of the task runs on one day (default: yesterday, UTC)"""
+    report = reports.daily_report(day)
+    body, html_body = reports.render(report)
     
     # Replace with actual recipient email
     recipient = "recipient@example.com"  # Update this!
     
-    return send_email(recipient, subject, body, html_body)
+    return queue(recipient, report['title'], body, html_body)
 
-def send_weekly_summary():
-    """Send a weekly summary email"""
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    subject = f"Weekly Summary - Week of {datetime.now().strftime('%Y-%m-%d')}"
-    
-    body = f"""
-Weekly System Summary
-====================
-
-Report Generated: {current_time}
-
-📈 This Week's Highlights:
-- Total Tasks Executed: 105
-- Success Rate: 98.1%
-- Average Response Time: 2.3 seconds
-- New Tasks Created: 3
-- Tasks Completed: 2
-
-🔧 System Maintenance:
-- Database cleanup performed
-- Log files rotated
-- Security updates applied
-
-📊 Performance Metrics:
-- CPU Usage: 15% average
-- Memory Usage: 45% average
-- Disk Usage: 67%
-
-Next Week's Scheduled Maintenance:
-- Server restart: Sunday 2:00 AM
-- Database backup: Daily at 3:00 AM
-
-Best regards,
-Task Scheduler System
-"""
+def send_weekly_summary(last_day=None):
+    """Send a summary of the task runs over the last 7 days"""
+    report = reports.weekly_summary(last_day)
+    body, html_body = reports.render(report)
     
     recipient = "admin@example.com"  # Update this!
     
-    return send_email(recipient, subject, body)
+    return queue(recipient, report['title'], body, html_body)
 
 def send_alert_email(alert_type, message):
     """Send an alert email"""
@@ -212,7 +152,7 @@ This is an automated alert from your Task Scheduler.
     
     recipient = "admin@example.com"  # Update this!
     
-    return send_email(recipient, subject, body)
+    return queue(recipient, subject, body)
 
 def send_custom_email():
     """Send a custom email with user input"""
@@ -224,7 +164,7 @@ def send_custom_email():
     subject = sys.argv[3]
     message = sys.argv[4] if len(sys.argv) > 4 else "Hello from Task Scheduler!"
     
-    return send_email(recipient, subject, message)
+    return queue(recipient, subject, message)
 
 def main():
     """Main function to handle command line arguments"""
@@ -232,8 +172,8 @@ def main():
         print("📧 Email Sender for Task Scheduler")
         print("=" * 40)
         print("Available commands:")
-        print("  python email_sender.py daily_report")
-        print("  python email_sender.py weekly_summary")
+        print("  python email_sender.py daily_report [YYYY-MM-DD]")
+        print("  python email_sender.py weekly_summary [YYYY-MM-DD]")
         print("  python email_sender.py alert <alert_type> <message>")
         print("  python email_sender.py send_custom <recipient> <subject> <message>")
         print()
@@ -241,11 +181,15 @@ def main():
         return
     
     command = sys.argv[1]
+    if command in ("daily_report", "weekly_summary"):
+        init_db()  # Reports read the execution rollups, built on first use
+    else:
+        init_outbox()  # Queuing only needs the outbox table, not the full init_db()
     
     if command == "daily_report":
-        send_daily_report()
+        send_daily_report(date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None)
     elif command == "weekly_summary":
-        send_weekly_summary()
+        send_weekly_summary(date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None)
     elif command == "alert":
         if len(sys.argv) >= 4:
             alert_type = sys.argv[2]
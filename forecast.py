@@ -0,0 +1,211 @@
+"""
+Upcoming-run forecasting and load histograms
+
+Tasks are grouped by schedule expression, each distinct expression is
+expanded once over the horizon, and the result is shifted by each load
+spreading offset in use and broadcast to every task that shares it.
+Expansion works on whole fields rather than stepping a trigger fire by
+fire: the cron expression is parsed by the same build_trigger() used by the
+scheduler, its hour/minute/second fields are turned into sets of allowed
+values, and every matching day contributes the cross product of those sets
+at once.
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+from database import get_active_schedules
+from scheduler import build_trigger, resolve_spread, spread_offset
+
+DAY_FIELDS = ('year', 'month', 'week', 'day', 'day_of_week')
+
+
+def _allowed_values(field, count: int) -> List[int]:
+    """Get the values in 0..count-1 a time-of-day field accepts"""
+    values = []
+    for value in range(count):
+        probe = SimpleNamespace(**{field.name: value})
+        if field.get_next_value(probe) == value:
+            values.append(value)
+    return values
+
+
+class SchedulePlan:
+    """A cron expression pre-expanded into per-field allowed values"""
+    __slots__ = ('timezone', 'day_fields', 'hours')
+
+    def __init__(self, schedule: str):
+        trigger = build_trigger(schedule)
+        fields = {field.name: field for field in trigger.fields}
+
+        self.timezone = trigger.timezone
+        self.day_fields = [fields[name] for name in DAY_FIELDS]
+
+        # Second offsets within each allowed hour
+        minutes = _allowed_values(fields['minute'], 60)
+        seconds = _allowed_values(fields['second'], 60)
+        offsets = [minute * 60 + second for minute in minutes for second in seconds]
+        self.hours = [(hour, offsets) for hour in _allowed_values(fields['hour'], 24)]
+
+    def matches_day(self, day_start: datetime) -> bool:
+        return all(field.get_next_value(day_start) == field.get_value(day_start)
+                   for field in self.day_fields)
+
+    def fire_times(self, start: float, end: float) -> List[float]:
+        """Get fire times as epoch seconds in [start, end)"""
+        tz = self.timezone
+        day = datetime.fromtimestamp(start, tz).date()
+        last_day = datetime.fromtimestamp(end, tz).date()
+
+        fires = []
+        while day <= last_day:
+            day_start = datetime(day.year, day.month, day.day, tzinfo=tz)
+            if self.matches_day(day_start):
+                for hour, offsets in self.hours:
+                    base = datetime(day.year, day.month, day.day, hour, tzinfo=tz).timestamp()
+                    fires.extend([base + offset for offset in offsets])
+            day += timedelta(days=1)
+
+        return [fire for fire in fires if start <= fire < end]
+
+
+@lru_cache(maxsize=4096)
+def get_plan(schedule: str) -> SchedulePlan:
+    """Get the (cached) expansion plan for a schedule expression"""
+    return SchedulePlan(schedule)
+
+
+def _group_by_schedule(tasks) -> Dict[str, Dict[float, List[Tuple[int, str]]]]:
+    """Group tasks by schedule, then by their load-spreading start offset
+
+    Jittered tasks are grouped at offset 0: their expected start is the cron
+    time, with the actual start falling somewhere in the jitter window.
+    """
+    groups = defaultdict(lambda: defaultdict(list))
+    for task_id, task_name, schedule, spread_mode, spread_window in tasks:
+        offset = spread_offset(task_id, *resolve_spread(spread_mode, spread_window))
+        groups[schedule][offset].append((task_id, task_name))
+    return groups
+
+
+def _expand_groups(tasks, start: float, end: float):
+    """Yield (base_fire_times, {offset: tasks}) for each distinct schedule
+
+    Base fire times cover [start - largest offset, end) so that every
+    shifted fire in [start, end) is included.
+    """
+    for schedule, by_offset in _group_by_schedule(tasks).items():
+        try:
+            plan = get_plan(schedule)
+        except ValueError:
+            continue  # Invalid expressions are never scheduled either
+        fires = plan.fire_times(start - max(by_offset), end)
+        if fires:
+            yield fires, by_offset
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def _shifted(fires: List[float], low: int, high: int, offset: float, index: int):
+    for i in range(low, high):
+        yield fires[i] + offset, index
+
+
+def forecast(start: datetime, end: datetime, limit: int = 1000, tasks=None) -> Dict:
+    """List upcoming fire times of all active tasks in [start, end)"""
+    if tasks is None:
+        tasks = get_active_schedules()
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+
+    # One lazily shifted stream per (schedule, offset); totals come from
+    # bisecting the base fire times, so nothing past the limit is built
+    total = 0
+    candidates = []
+    for fires, by_offset in _expand_groups(tasks, start_ts, end_ts):
+        for offset, members in by_offset.items():
+            low = bisect_left(fires, start_ts - offset)
+            high = bisect_left(fires, end_ts - offset)
+            if high > low:
+                total += (high - low) * len(members)
+                candidates.append((fires[low] + offset, fires, low, high, offset, members))
+
+    # A stream whose first fire comes after the first fires of `limit`
+    # other entries can't make the cut, so only the earliest are merged
+    candidates.sort(key=lambda candidate: candidate[0])
+    streams = []
+    members_by_stream = []
+    seen = 0
+    for first, fires, low, high, offset, members in candidates:
+        if seen >= limit:
+            break
+        seen += len(members)
+        streams.append(_shifted(fires, low, high, offset, len(streams)))
+        members_by_stream.append(members)
+
+    entries = []
+    for fire, index in heapq.merge(*streams):
+        fire_time = _to_datetime(fire)
+        for task_id, task_name in members_by_stream[index]:
+            if len(entries) >= limit:
+                break
+            entries.append({"fire_time": fire_time, "task_id": task_id, "task_name": task_name})
+        if len(entries) >= limit:
+            break
+
+    return {
+        "from": start,
+        "to": end,
+        "total": total,
+        "truncated": total > len(entries),
+        "fires": entries,
+    }
+
+
+def histogram(start: datetime, hours: int = 24, bucket_minutes: int = 1, tasks=None) -> Dict:
+    """Count expected fires per bucket over a horizon, buckets aligned to the minute"""
+    if tasks is None:
+        tasks = get_active_schedules()
+    bucket_seconds = bucket_minutes * 60
+    start_ts = start.timestamp() // bucket_seconds * bucket_seconds
+    bucket_count = -(-hours * 60 // bucket_minutes)
+    end_ts = start_ts + bucket_count * bucket_seconds
+
+    counts = [0] * bucket_count
+    for fires, by_offset in _expand_groups(tasks, start_ts, end_ts):
+        # Split base fires into (bucket, remainder) once. A fire shifted by
+        # an offset lands in bucket + (remainder + offset) // bucket_seconds,
+        # so offsets only matter through that whole-bucket shift.
+        by_remainder = defaultdict(lambda: defaultdict(int))
+        for fire in fires:
+            bucket, remainder = divmod(fire - start_ts, bucket_seconds)
+            by_remainder[remainder][int(bucket)] += 1
+
+        shifts = defaultdict(int)
+        for offset, members in by_offset.items():
+            for remainder in by_remainder:
+                shifts[remainder, int((remainder + offset) // bucket_seconds)] += len(members)
+
+        for (remainder, shift), weight in shifts.items():
+            for bucket, count in by_remainder[remainder].items():
+                bucket += shift
+                if 0 <= bucket < bucket_count:
+                    counts[bucket] += count * weight
+
+    buckets = [{"start": _to_datetime(start_ts + i * bucket_seconds), "count": count}
+               for i, count in enumerate(counts)]
+    peak = max(buckets, key=lambda bucket: bucket["count"]) if buckets else None
+
+    return {
+        "from": _to_datetime(start_ts),
+        "bucket_minutes": bucket_minutes,
+        "total": sum(counts),
+        "peak": peak,
+        "buckets": buckets,
+    }
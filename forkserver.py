@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Fork server for shell task commands
+
+Forking the scheduler itself for every command copies the page tables of
+a large uvicorn + FastAPI + APScheduler process, and gets slower as that
+process grows. The fork server is a small separate process that listens
+on a Unix socket and starts commands from its own minimal address space,
+with the same process groups and resource limits as runner.CommandRun.
+
+Each run uses one connection carrying newline-delimited JSON:
+
+    client: {"command": "...", "limits": {...}}
+    server: {"event": "started", "pid": 1234}
+    client: {"cancel": true}                      (optional)
+    server: {"event": "exit", "returncode": 0, "stdout": "...", ...}
+
+or {"event": "error", "error": "..."} when the command cannot start.
+Closing the connection early also cancels the run.
+
+Usage: python forkserver.py <socket_path>
+"""
+
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, fields
+
+from runner import CommandResult, CommandRun, ResourceLimits
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a launched fork server to start listening
+START_TIMEOUT_SECONDS = 10
+
+RESULT_FIELDS = [field.name for field in fields(CommandResult)]
+
+
+def _send(sock: socket.socket, message: dict):
+    sock.sendall(json.dumps(message).encode() + b'\n')
+
+
+def _watch_for_cancel(reader, run: CommandRun):
+    """Cancel the run when the client asks to or goes away"""
+    for line in reader:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if message.get('cancel'):
+            break
+    if run.process.poll() is None:
+        run.cancel()
+
+
+def _handle(conn: socket.socket):
+    """Run one command for a client connection"""
+    with conn:
+        reader = conn.makefile('rb')
+        line = reader.readline()
+        if not line:
+            return  # A liveness check
+
+        try:
+            request = json.loads(line)
+            run = CommandRun(request['command'], ResourceLimits(**request.get('limits', {})))
+        except Exception as e:
+            _send(conn, {'event': 'error', 'error': str(e)})
+            return
+
+        try:
+            _send(conn, {'event': 'started', 'pid': run.pid})
+        except OSError:
+            run.cancel()
+        threading.Thread(target=_watch_for_cancel, args=(reader, run), daemon=True).start()
+        result = run.wait()
+        try:
+            _send(conn, {'event': 'exit', **asdict(result)})
+        except OSError:
+            logger.warning(f"Client left before the result of pid {run.pid}")
+
+
+def serve(path: str):
+    """Accept run requests on a Unix socket until killed"""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(64)
+    logger.info(f"Fork server listening on {path} (pid {os.getpid()})")
+    try:
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=_handle, args=(conn,), daemon=True).start()
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+class ForkServerRun:
+    """A command running in the fork server, with the same wait()/cancel() as runner.CommandRun"""
+
+    def __init__(self, sock: socket.socket, command: str, limits: ResourceLimits):
+        self._sock = sock
+        self._reader = sock.makefile('rb')
+        try:
+            _send(sock, {'command': command, 'limits': asdict(limits)})
+            event = self._read()
+        except Exception:
+            self._close()
+            raise
+        if event['event'] == 'error':
+            self._close()
+            raise RuntimeError(event['error'])
+        self.pid = event['pid']
+
+    def _read(self) -> dict:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Fork server closed the connection")
+        return json.loads(line)
+
+    def wait(self) -> CommandResult:
+        """Wait for the exit event; the server enforces the timeout"""
+        try:
+            event = self._read()
+        finally:
+            self._close()
+        return CommandResult(**{name: event[name] for name in RESULT_FIELDS})
+
+    def cancel(self):
+        try:
+            _send(self._sock, {'cancel': True})
+        except OSError:
+            pass
+
+    def _close(self):
+        self._reader.close()
+        self._sock.close()
+
+
+class ForkServer:
+    """Client for a fork server, launching one if nothing is listening"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._process = None
+
+    def connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def is_running(self) -> bool:
+        try:
+            self.connect().close()
+            return True
+        except OSError:
+            return False
+
+    def start(self):
+        """Use the fork server at path, or launch one there"""
+        if self.is_running():
+            logger.info(f"Using fork server at {self.path}")
+            return
+
+        # No preexec_fn, so this is a cheap vfork/posix_spawn even from a large process
+        self._process = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.path])
+        deadline = time.monotonic() + START_TIMEOUT_SECONDS
+        while not self.is_running():
+            if self._process.poll() is not None or time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError(f"Fork server did not start on {self.path}")
+            time.sleep(0.05)
+        logger.info(f"Started fork server on {self.path} (pid {self._process.pid})")
+
+    def run(self, command: str, limits: ResourceLimits) -> ForkServerRun:
+        """Start a command in the fork server"""
+        return ForkServerRun(self.connect(), command, limits)
+
+    def stop(self):
+        """Stop the fork server if this client launched it"""
+        if self._process is None:
+            return
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        self._process = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python forkserver.py <socket_path>")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    # Exit through serve()'s cleanup when the scheduler stops us
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        serve(sys.argv[1])
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Local HTTP stand-in for trying HTTP tasks without a real endpoint
+
+Speaks HTTP/1.1 with keep-alive and answers any method on any path:
+
+- /status/<code> responds with that status, anything else with 200
+- ?delay=<seconds> waits before responding
+- the response body echoes the method, path and request body size
+
+It counts connections and requests, so connection reuse can be checked.
+With keep_alive_header it also sends "Connection: keep-alive", as nginx
+and many other servers do on HTTP/1.1.
+
+Usage: python http_stub_server.py [port]
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_PORT = 8080
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this a kept-alive
+    # connection stalls on Nagle and delayed ACKs
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with self.server.lock:
+            self.server.requests += 1
+        delay = float(parse_qs(url.query).get('delay', ['0'])[0])
+        if delay:
+            time.sleep(delay)
+        status = int(url.path.rsplit('/', 1)[-1]) if url.path.startswith('/status/') else 200
+
+        self.send_response(status)
+        if self.server.keep_alive_header:
+            self.send_header('Connection', 'keep-alive')
+        if status in (204, 304):
+            self.end_headers()
+            return
+        content = json.dumps({'method': self.command, 'path': url.path, 'received': len(body)}).encode()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    do_GET = do_HEAD = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = respond
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    """Threaded stub HTTP server; port 0 picks a free port"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, keep_alive_header: bool = False):
+        super().__init__((host, port), _Handler)
+        self.keep_alive_header = keep_alive_header
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        pass  # Clients hanging up on a delayed response (timeouts, cancels)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name='stub-http', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    stub = StubHTTPServer(port=port)
+    print(f"🌐 Stub HTTP server on {stub.url}. Ctrl+C to stop.")
+    stub.start()
+    try:
+        while True:
+            time.sleep(5)
+            with stub.lock:
+                print(f"{stub.requests} request(s) over {stub.connections} connection(s)")
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,219 @@
+"""
+HTTP tasks on a shared asyncio connection pool
+
+Tasks with task_type 'http' call a URL (the task's command) instead of
+running a shell command. The request is described by task options:
+http_method (default GET), http_headers (a JSON object), http_body and
+expected_status ('200', '200-299' or '200,204'; default any 2xx). The
+timeout is the task's timeout_seconds, or HTTP_TIMEOUT_SECONDS.
+
+Every HTTP task runs on one event loop thread through one httpx.AsyncClient:
+
+- connections are kept alive and reused per scheme, host and port, so a
+  fire costs one request instead of forking a shell and curl and doing a
+  new TCP/TLS handshake; idle connections are closed after
+  HTTP_IDLE_SECONDS
+- at most HTTP_MAX_PER_HOST requests to a host are in flight; the rest wait
+
+Results map onto CommandResult like other runs: the status line and the
+start of the body go to stdout, and the exit code is 0 for an expected
+status, 1 for any other status and 2 when the request could not be made.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from runner import CommandResult
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_PER_HOST = int(os.environ.get('SCHEDULER_HTTP_MAX_PER_HOST', '10'))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get('SCHEDULER_HTTP_TIMEOUT', '30'))
+HTTP_IDLE_SECONDS = 30.0  # Idle connections older than this are closed
+HTTP_MAX_CONNECTIONS = 100  # Across all hosts
+
+HTTP_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+EXIT_UNEXPECTED_STATUS = 1
+EXIT_REQUEST_FAILED = 2
+
+# Response body kept for the execution log; up to MAX_BODY_BYTES are read
+# so the connection can be reused, beyond that it is closed
+OUTPUT_BODY_BYTES = 64 * 1024
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+USER_AGENT = 'task-scheduler'
+
+
+def parse_expected_status(spec: Optional[str]) -> List[Tuple[int, int]]:
+    """Parse '200', '200-299' or '200,204' into inclusive ranges; default 2xx"""
+    if not spec:
+        return [(200, 299)]
+    ranges = []
+    try:
+        for part in spec.split(','):
+            low, _, high = part.strip().partition('-')
+            low, high = int(low), int(high or low)
+            if not 100 <= low <= high <= 599:
+                raise ValueError
+            ranges.append((low, high))
+    except ValueError:
+        raise ValueError(f"Invalid expected_status {spec!r}. Expected e.g. '200', '200-299' or '200,204'") from None
+    return ranges
+
+
+def parse_headers(text: Optional[str]) -> Dict[str, str]:
+    """Parse the http_headers option, a JSON object of header names to values"""
+    if not text:
+        return {}
+    try:
+        headers = json.loads(text)
+    except ValueError:
+        headers = None
+    if not isinstance(headers, dict) or not all(isinstance(value, str) for value in headers.values()):
+        raise ValueError("http_headers must be a JSON object of header names to string values")
+    return headers
+
+
+def validate_url(url: str):
+    parts = urlsplit(url or '')
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f"Invalid URL {url!r}. Expected an http:// or https:// URL")
+
+
+def validate_http_options(options: dict):
+    """Check the http_* settings and expected_status"""
+    method = options.get('http_method')
+    if method is not None and method.upper() not in HTTP_METHODS:
+        raise ValueError(f"Invalid http_method {method!r}. Expected one of: {', '.join(HTTP_METHODS)}")
+    parse_headers(options.get('http_headers'))
+    if options.get('expected_status') is not None:
+        parse_expected_status(options['expected_status'])
+
+
+@dataclass
+class HttpRequest:
+    url: str
+    method: str = 'GET'
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: Optional[bytes] = None
+    expected_status: Optional[str] = None
+    timeout: float = HTTP_TIMEOUT_SECONDS
+
+    @classmethod
+    def from_task(cls, task, timeout: Optional[float] = None) -> 'HttpRequest':
+        body = task.get('http_body')
+        return cls(task['command'], (task.get('http_method') or 'GET').upper(), parse_headers(task.get('http_headers')),
+                   body.encode() if body is not None else None, task.get('expected_status'),
+                   timeout or HTTP_TIMEOUT_SECONDS)
+
+
+class HttpRun:
+    """A pending HTTP task run; wait() gives its CommandResult"""
+
+    pid = None
+
+    def __init__(self, future: concurrent.futures.Future):
+        self._future = future
+
+    def wait(self) -> CommandResult:
+        try:
+            return self._future.result()
+        except concurrent.futures.CancelledError:
+            return CommandResult(None, '', '', cancelled=True)
+
+    def cancel(self):
+        self._future.cancel()
+
+
+class HttpClient:
+    """Keep-alive HTTP client for HTTP tasks, on its own event loop thread"""
+
+    def __init__(self, max_per_host: int = HTTP_MAX_PER_HOST):
+        self.max_per_host = max(1, max_per_host)
+        self._hosts: Dict[Tuple[str, str, Optional[int]], asyncio.Semaphore] = {}  # Only touched on the loop
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self._thread = None
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='http-tasks', daemon=True)
+        self._thread.start()
+
+        async def create_client():
+            # Timeouts are applied per run by _perform()
+            return httpx.AsyncClient(timeout=None, follow_redirects=False, headers={'User-Agent': USER_AGENT},
+                                     limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                                         max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                                                         keepalive_expiry=HTTP_IDLE_SECONDS))
+
+        self._client = asyncio.run_coroutine_threadsafe(create_client(), self._loop).result()
+
+    def run(self, request: HttpRequest) -> HttpRun:
+        """Start a request; never blocks"""
+        return HttpRun(asyncio.run_coroutine_threadsafe(self._perform(request), self._loop))
+
+    def shutdown(self):
+        """Close pooled connections and stop the event loop"""
+        if not self._loop:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"Could not close HTTP connections: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+        self._loop = None
+        self._client = None
+
+    async def _perform(self, request: HttpRequest) -> CommandResult:
+        try:
+            status, reason, body = await asyncio.wait_for(self._request(request), request.timeout)
+        except asyncio.TimeoutError:
+            return CommandResult(None, '', '', timed_out=True)
+        except (httpx.HTTPError, httpx.InvalidURL, ValueError) as e:
+            return CommandResult(EXIT_REQUEST_FAILED, '', f"{request.method} {request.url} failed: "
+                                                        f"{e or type(e).__name__}")
+
+        stdout = f"HTTP {status} {reason}\n" + body.decode('utf-8', 'replace')
+        expected = parse_expected_status(request.expected_status)
+        if any(low <= status <= high for low, high in expected):
+            return CommandResult(0, stdout, '')
+        return CommandResult(EXIT_UNEXPECTED_STATUS, stdout,
+                             f"Expected status {request.expected_status or '200-299'}, got {status}")
+
+    async def _request(self, request: HttpRequest) -> Tuple[int, str, bytes]:
+        """Send a request; returns the status, reason and up to OUTPUT_BODY_BYTES of the body"""
+        parts = urlsplit(request.url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        semaphore = self._hosts.get(key)
+        if semaphore is None:
+            semaphore = self._hosts[key] = asyncio.Semaphore(self.max_per_host)
+        body = request.body
+        if body is None and request.method in ('POST', 'PUT', 'PATCH'):
+            body = b''  # Sends Content-Length: 0, which some servers require
+
+        async with semaphore:
+            async with self._client.stream(request.method, request.url, headers=request.headers,
+                                           content=body) as response:
+                kept = bytearray()
+                total = 0
+                # Reading the body to its end lets the connection be reused;
+                # leaving a huge one unread closes it instead
+                async for chunk in response.aiter_bytes():
+                    total += len(chunk)
+                    if len(kept) < OUTPUT_BODY_BYTES:
+                        kept += chunk[:OUTPUT_BODY_BYTES - len(kept)]
+                    if total > MAX_BODY_BYTES:
+                        break
+                return response.status_code, response.reason_phrase, bytes(kept)
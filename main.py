@@ -1,11 +1,25 @@
-from fastapi import FastAPI, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Request, Form, Response, Query, Header, Depends
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from contextlib import asynccontextmanager
-from scheduler import TaskScheduler
-from models import TaskCreate, TaskResponse, TaskUpdate
-from database import init_db, get_all_tasks
+from scheduler import TaskScheduler, describe_spread
+from models import (TaskCreate, TaskResponse, TaskUpdate, TaskOptions, TaskBulkDelete, TracingSettings,
+                    SlowQuerySettings)
+from database import (init_db, get_all_tasks, get_all_tasks_rows, get_tasks_page_rows, get_table_version,
+                      get_task_version, get_changes_since, get_tasks_due_within, get_recent_executions, get_dag_run,
+                      get_dag_runs, get_outbox, get_outbox_counts)
+from outbox import OutboxWorker
+from serializers import rows_response, ndjson_response, wants_ndjson
+import queries
+import forecast
+import profiling
+from profiling import traced, tracer, slow_queries, TracingMiddleware
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import hmac
 import logging
 import os
 
@@ -13,19 +27,33 @@ import os
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Largest request body for the bulk endpoints; clients send more in batches
+BULK_MAX_TASKS = 10000
+
+# Rows fetched per page when streaming NDJSON
+NDJSON_PAGE_SIZE = 1000
+
+# Token for the /admin endpoints, sent as X-Admin-Token; without one they are off
+ADMIN_TOKEN = os.environ.get("SCHEDULER_ADMIN_TOKEN")
+
 # Global scheduler instance
 scheduler = None
+outbox_worker = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global scheduler
+    global scheduler, outbox_worker
     init_db()
     scheduler = TaskScheduler()
     scheduler.start()
     logger.info("Task scheduler started")
+    outbox_worker = OutboxWorker()
+    outbox_worker.start()
     yield
     # Shutdown
+    if outbox_worker:
+        outbox_worker.stop()
     if scheduler:
         scheduler.shutdown()
         logger.info("Task scheduler stopped")
@@ -36,15 +64,37 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan
 )
+app.add_middleware(TracingMiddleware, tracer=tracer)
 
 # Create templates directory if it doesn't exist
 os.makedirs("templates", exist_ok=True)
 os.makedirs("static", exist_ok=True)
 
+class TracedTemplates(Jinja2Templates):
+    """Templates whose rendering counts as a 'template' span of a traced request"""
+    
+    @traced("template")
+    def TemplateResponse(self, *args, **kwargs):
+        return super().TemplateResponse(*args, **kwargs)
+
 # Setup templates and static files
-templates = Jinja2Templates(directory="templates")
+templates = TracedTemplates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+def _not_modified(request: Request, etag: str):
+    """Check whether the client's If-None-Match matches the current ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _set_cache_headers(response: Response, etag: str, changed_at):
+    """Attach validators so clients can revalidate instead of refetching"""
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = format_datetime(changed_at.replace(tzinfo=timezone.utc), usegmt=True)
+    response.headers["Cache-Control"] = "no-cache"
+
 @app.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
     """Main dashboard page"""
@@ -98,6 +148,8 @@ async def view_task_page(request: Request, task_id: int):
     return templates.TemplateResponse("view_task.html", {
         "request": request,
         "task": task,
+        "spread": describe_spread(task),
+        "dependencies": scheduler.get_dependencies(task_id),
         "history": history
     })
 
@@ -128,23 +180,83 @@ async def create_task(task: TaskCreate):
             name=task.task_name,
             command=task.command,
             schedule=task.schedule,
-            description=task.description
-        )
-        return TaskResponse(
-            id=task_id,
-            task_name=task.task_name,
-            command=task.command,
-            schedule=task.schedule,
             description=task.description,
-            status="active"
+            depends_on=task.depends_on,
+            **task.dict(include=set(TaskOptions.__fields__), exclude_none=True)
         )
+        return TaskResponse(**dict(scheduler.get_task(task_id)))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# The bulk endpoints are plain functions so FastAPI runs them in its thread
+# pool; their long transactions would otherwise block the event loop
+@app.post("/tasks/bulk")
+def create_tasks_bulk(tasks: List[TaskCreate]):
+    """Create many tasks in one transaction; returns an id or an error per task, in order"""
+    if len(tasks) > BULK_MAX_TASKS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_TASKS} tasks per request")
+    results = scheduler.add_tasks([{
+        'name': task.task_name,
+        'command': task.command,
+        'schedule': task.schedule,
+        'description': task.description,
+        'depends_on': task.depends_on,
+        'options': task.dict(include=set(TaskOptions.__fields__), exclude_none=True),
+    } for task in tasks])
+    return {"created": sum('id' in result for result in results), "results": results}
+
+@app.post("/tasks/bulk-delete")
+def delete_tasks_bulk(body: TaskBulkDelete):
+    """Delete many tasks in one transaction"""
+    if len(body.ids) > BULK_MAX_TASKS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_TASKS} ids per request")
+    deleted = scheduler.remove_tasks(body.ids)
+    found = set(deleted)
+    return {"deleted": deleted, "not_found": [task_id for task_id in body.ids if task_id not in found]}
+
 @app.get("/tasks")
-async def list_tasks():
-    """List all scheduled tasks"""
-    return get_all_tasks()
+async def list_tasks(request: Request, limit: Optional[int] = Query(None, ge=1, le=BULK_MAX_TASKS),
+                     after_id: int = Query(0, ge=0)):
+    """List scheduled tasks: all of them, a page in id order (limit, after_id), or NDJSON in id order"""
+    if wants_ndjson(request.headers.get("accept")):
+        def fetch_page(cursor):
+            columns, rows = get_tasks_page_rows(after_id if cursor is None else cursor, NDJSON_PAGE_SIZE)
+            return columns, rows, rows[-1][0] if len(rows) == NDJSON_PAGE_SIZE else None
+        return ndjson_response(fetch_page)
+    
+    version, changed_at = get_table_version()
+    etag = f'W/"tasks-{version}"' if limit is None else f'W/"tasks-{version}-{after_id}-{limit}"'
+    if _not_modified(request, etag):
+        not_modified = Response(status_code=304)
+        _set_cache_headers(not_modified, etag, changed_at)
+        return not_modified
+    
+    if limit is None:
+        columns, rows = get_all_tasks_rows()
+        response = rows_response(columns, rows)
+    else:
+        columns, rows = get_tasks_page_rows(after_id, limit)
+        headers = None
+        if len(rows) == limit:
+            headers = {"Link": f'</tasks?after_id={rows[-1][0]}&limit={limit}>; rel="next"'}
+        response = rows_response(columns, rows, headers)
+    _set_cache_headers(response, etag, changed_at)
+    return response
+
+@app.get("/tasks/changes")
+async def list_task_changes(since: int = 0):
+    """List tasks changed or deleted since a table version"""
+    return get_changes_since(since)
+
+@app.get("/tasks/due")
+async def list_due_tasks(minutes: int = 60):
+    """List active tasks due to run in the next N minutes"""
+    return get_tasks_due_within(minutes)
+
+@app.get("/executions/recent")
+async def list_recent_executions(minutes: int = 60):
+    """List executions of all tasks in the last N minutes"""
+    return get_recent_executions(minutes)
 
 @app.get("/tasks/{task_id}")
 async def get_task(task_id: int):
@@ -173,13 +285,190 @@ async def delete_task(task_id: int):
         raise HTTPException(status_code=404, detail="Task not found")
     return {"message": f"Task {task_id} deleted successfully"}
 
+def _history_cursor(columns, row) -> str:
+    """Cursor for the executions older than a history row"""
+    return f"{queries.adapt_datetime(row[columns.index('execution_time')])}.{row[columns.index('id')]}"
+
+def _parse_history_cursor(before: Optional[str]):
+    if before is None:
+        return None
+    execution_ms, _, execution_id = before.partition(".")
+    return int(execution_ms), int(execution_id)
+
 @app.get("/tasks/{task_id}/history")
-async def get_task_history(task_id: int):
-    """Get execution history for a specific task"""
-    history = scheduler.get_task_history(task_id)
+async def get_task_history(task_id: int, request: Request, limit: int = Query(50, ge=1, le=1000),
+                           before: Optional[str] = Query(None, pattern=r"^\d+\.\d+$")):
+    """Get execution history for a specific task, newest first; follow the Link header for older runs"""
+    if wants_ndjson(request.headers.get("accept")):
+        if scheduler.get_task(task_id) is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        
+        def fetch_page(cursor):
+            columns, rows = scheduler.get_task_history_rows(task_id, NDJSON_PAGE_SIZE,
+                                                            _parse_history_cursor(cursor or before))
+            return columns, rows, _history_cursor(columns, rows[-1]) if len(rows) == NDJSON_PAGE_SIZE else None
+        return ndjson_response(fetch_page)
+    
+    task_version = get_task_version(task_id)
+    if task_version is not None:
+        version, changed_at = task_version
+        etag = f'W/"task-{task_id}-{version}"' if (limit, before) == (50, None) else \
+            f'W/"task-{task_id}-{version}-{before}-{limit}"'
+        if _not_modified(request, etag):
+            not_modified = Response(status_code=304)
+            _set_cache_headers(not_modified, etag, changed_at)
+            return not_modified
+    
+    history = scheduler.get_task_history_rows(task_id, limit, _parse_history_cursor(before))
     if history is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    return history
+    columns, rows = history
+    headers = None
+    if len(rows) == limit:
+        headers = {"Link": f'</tasks/{task_id}/history?before={_history_cursor(columns, rows[-1])}&limit={limit}>; '
+                           f'rel="next"'}
+    response = rows_response(columns, rows, headers)
+    if task_version is not None:
+        _set_cache_headers(response, etag, changed_at)
+    return response
+
+@app.get("/tasks/{task_id}/dependencies")
+async def get_task_dependencies(task_id: int):
+    """Get the upstream and downstream tasks of a task"""
+    if not scheduler.get_task(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    return scheduler.get_dependencies(task_id)
+
+@app.get("/tasks/{task_id}/dag-runs")
+async def list_dag_runs(task_id: int, limit: int = Query(50, ge=1, le=1000)):
+    """List DAG runs started by a task, newest first"""
+    if not scheduler.get_task(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    return get_dag_runs(task_id, limit)
+
+@app.get("/dag-runs/{run_id}")
+async def get_dag_run_details(run_id: int):
+    """Get a DAG run with its critical path and the executions in it"""
+    run = get_dag_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="DAG run not found")
+    return run
+
+@app.post("/tasks/{task_id}/run", status_code=202)
+async def run_task_now(task_id: int):
+    """Queue a run of a task now, outside its schedule"""
+    run = scheduler.trigger_task(task_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return run.to_dict()
+
+@app.get("/runs")
+async def list_runs(state: Optional[str] = Query(None, pattern="^(queued|running)$"), task_id: Optional[int] = None):
+    """List queued and running task runs with their pids and live durations"""
+    return [run.to_dict() for run in scheduler.runs.list(state, task_id)]
+
+@app.post("/runs/{run_id}/cancel", status_code=202)
+async def cancel_run(run_id: int):
+    """Cancel a queued or running task run"""
+    run = scheduler.runs.cancel(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found or already finished")
+    return run.to_dict()
+
+@app.get("/dispatch/stats")
+async def dispatch_stats():
+    """Get worker usage, queue depth and queue wait times per priority class"""
+    return scheduler.dispatcher.stats()
+
+@app.get("/outbox")
+async def list_outbox(status: Optional[str] = Query(None, pattern="^(queued|sending|sent|failed)$"),
+                      limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    """List queued and delivered emails, newest first"""
+    return get_outbox(status, limit, offset)
+
+@app.get("/outbox/stats")
+async def outbox_stats():
+    """Count outbox emails by delivery status"""
+    return get_outbox_counts()
+
+def _as_utc(value: Optional[datetime]) -> datetime:
+    """Default to now and treat naive query datetimes as UTC"""
+    if value is None:
+        return datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+@app.get("/schedule/forecast")
+async def schedule_forecast(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(1000, ge=1, le=100000)
+):
+    """List upcoming fire times across all active tasks (default: next 24 hours)"""
+    start = _as_utc(start)
+    end = _as_utc(end) if end else start + timedelta(hours=24)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    return forecast.forecast(start, end, limit)
+
+@app.get("/schedule/histogram")
+async def schedule_histogram(
+    start: Optional[datetime] = Query(None, alias="from"),
+    hours: int = Query(24, ge=1, le=24 * 31),
+    bucket_minutes: int = Query(1, ge=1, le=24 * 60)
+):
+    """Bucket expected fires per minute (or bucket_minutes) over a horizon"""
+    return forecast.histogram(_as_utc(start), hours, bucket_minutes)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow a request only with the admin token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set SCHEDULER_ADMIN_TOKEN")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_threads(
+    seconds: float = Query(5, gt=0, le=profiling.MAX_SAMPLE_SECONDS),
+    interval: float = Query(profiling.SAMPLE_INTERVAL_SECONDS, ge=0.001, le=1),
+    format: str = Query("collapsed", pattern="^(collapsed|svg)$"),
+    idle: bool = False
+):
+    """Sample every thread's stack for N seconds; returns collapsed stacks or an SVG flame graph"""
+    try:
+        stacks = await run_in_threadpool(profiling.sample, seconds, interval, idle)
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "svg":
+        title = f"{seconds:g}s every {interval * 1000:g}ms at {datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S} UTC"
+        return Response(profiling.flamegraph_svg(stacks, title), media_type="image/svg+xml")
+    return PlainTextResponse(profiling.collapsed(stacks))
+
+@app.get("/admin/tracing", dependencies=[Depends(require_admin)])
+async def get_tracing():
+    """Get per-route span totals and the most recent traced requests"""
+    return tracer.summary()
+
+@app.put("/admin/tracing", dependencies=[Depends(require_admin)])
+async def set_tracing(settings: TracingSettings):
+    """Turn per-request spans on or off; turning them on clears the earlier traces"""
+    if settings.enabled:
+        tracer.enable()
+    else:
+        tracer.disable()
+    return {"enabled": tracer.enabled}
+
+@app.get("/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def get_slow_queries():
+    """Get the statements that ran over the slow-query threshold"""
+    return slow_queries.summary()
+
+@app.put("/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def set_slow_queries(settings: SlowQuerySettings):
+    """Set the slow-query threshold in milliseconds, or null to turn the log off"""
+    slow_queries.set_threshold(settings.threshold_ms)
+    return {"threshold_ms": slow_queries.threshold_ms}
 
 if __name__ == "__main__":
     import uvicorn
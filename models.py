@@ -1,21 +1,57 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
-class TaskCreate(BaseModel):
+class TaskOptions(BaseModel):
+    """Optional per-task settings; unset means use the service-wide default"""
+    spread_mode: Optional[str] = Field(None, description="Load spreading: 'off', 'offset' (hashed from the task id) or 'jitter'")
+    spread_window: Optional[int] = Field(None, ge=0, description="Spreading window in seconds")
+    misfire_policy: Optional[str] = Field(None, description="Missed fires: 'skip', 'run_once', 'run_all' or 'grace'")
+    misfire_grace: Optional[int] = Field(None, ge=0, description="Grace window in seconds for the 'grace' policy")
+    max_attempts: Optional[int] = Field(None, ge=1, description="Attempts per run including the first; 1 disables retries")
+    retry_backoff: Optional[int] = Field(None, ge=0, description="Base retry delay in seconds, doubled per attempt")
+    retry_exit_codes: Optional[str] = Field(None, description="Comma-separated exit codes to retry; unset retries any failure")
+    breaker_threshold: Optional[int] = Field(None, ge=0, description="Consecutive failures that pause the task; 0 disables")
+    breaker_cooldown: Optional[int] = Field(None, ge=0, description="Seconds the circuit breaker keeps the task paused")
+    timeout_seconds: Optional[int] = Field(None, ge=1, description="Kill the run's process group after this many seconds")
+    cpu_seconds: Optional[int] = Field(None, ge=1, description="CPU time limit per process")
+    memory_mb: Optional[int] = Field(None, ge=1, description="Memory limit in MB")
+    nice: Optional[int] = Field(None, ge=0, le=19, description="Niceness added to the command")
+    io_priority: Optional[str] = Field(None, description="IO priority: 'idle', 'low' or 'normal'")
+    task_type: Optional[str] = Field(None, description="'shell' (default), 'python' for a 'module:function' command or 'http' for a URL")
+    priority: Optional[str] = Field(None, description="Dispatch priority class: 'high', 'normal' or 'low'")
+    weight: Optional[int] = Field(None, ge=1, description="Share of workers within the priority class")
+    alert_window: Optional[int] = Field(None, ge=0, description="Seconds after a failure alert during which further failures are digested")
+    http_method: Optional[str] = Field(None, description="HTTP tasks: request method (default GET)")
+    http_headers: Optional[str] = Field(None, description="HTTP tasks: request headers as a JSON object")
+    http_body: Optional[str] = Field(None, description="HTTP tasks: request body")
+    expected_status: Optional[str] = Field(None, description="HTTP tasks: accepted status codes, e.g. '200', '200-299' or '200,204' (default 2xx)")
+
+class TaskCreate(TaskOptions):
     task_name: str = Field(..., description="Name of the task")
-    command: str = Field(..., description="Command to execute")
+    command: str = Field(..., description="Command to execute, or 'module:function' for Python tasks")
     schedule: str = Field(..., description="Cron expression (e.g., '0 9 * * 1')")
     description: Optional[str] = Field(None, description="Task description")
+    depends_on: Optional[List[int]] = Field(None, description="Upstream task ids; the task runs when they all succeed")
 
-class TaskUpdate(BaseModel):
+class TaskUpdate(TaskOptions):
     task_name: Optional[str] = None
     command: Optional[str] = None
     schedule: Optional[str] = None
     description: Optional[str] = None
     status: Optional[str] = None
+    depends_on: Optional[List[int]] = None
+
+class TaskBulkDelete(BaseModel):
+    ids: List[int] = Field(..., description="Ids of the tasks to delete")
+
+class TracingSettings(BaseModel):
+    enabled: bool = Field(..., description="Record per-request spans")
+
+class SlowQuerySettings(BaseModel):
+    threshold_ms: Optional[float] = Field(None, ge=0, description="Log statements slower than this; null turns the log off")
 
-class TaskResponse(BaseModel):
+class TaskResponse(TaskOptions):
     id: int
     task_name: str
     command: str
@@ -25,11 +61,13 @@ class TaskResponse(BaseModel):
     created_at: Optional[datetime] = None
     last_run: Optional[datetime] = None
     next_run: Optional[datetime] = None
+    consecutive_failures: int = 0
+    breaker_open_until: Optional[datetime] = None
 
 class TaskExecution(BaseModel):
     id: int
     task_id: int
     execution_time: datetime
-    status: str  # 'success', 'failed'
+    status: str  # 'success', 'failed', 'missed', 'skipped', 'cancelled'
     output: Optional[str] = None
     error: Optional[str] = None
\ No newline at end of file
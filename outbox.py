@@ -0,0 +1,196 @@
+"""
+Durable email outbox
+
+queue_email() stores a message in the email_outbox table and returns; the
+caller never waits on SMTP. The delivery worker in the scheduler service
+drains the outbox:
+
+- at most `concurrency` messages are in flight, sent over the SMTP pool
+- each recipient domain has its own token bucket, so a burst to one
+  provider is spread out instead of tripping its rate limits; a message
+  whose domain is out of tokens is pushed back, not failed
+- failed sends are retried with exponential backoff and jitter up to
+  max_attempts; permanent SMTP errors (5xx, refused recipients) fail at once
+- messages left 'sending' by a stopped process are requeued at startup,
+  so delivery is at least once
+"""
+
+import json
+import logging
+import os
+import random
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from database import (enqueue_email, get_due_emails, claim_email, mark_email_sent, retry_email, fail_email,
+                      defer_email, recover_outbox)
+from ratelimit import TokenBucket
+from attachments import validate_compress
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_CONCURRENCY = int(os.environ.get('OUTBOX_CONCURRENCY', '4'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_RETRY_BACKOFF_SECONDS = float(os.environ.get('OUTBOX_RETRY_BACKOFF', '30'))
+OUTBOX_RETRY_MAX_DELAY_SECONDS = float(os.environ.get('OUTBOX_RETRY_MAX_DELAY', '3600'))
+
+# Per recipient domain: up to DOMAIN_BURST messages at once, then
+# DOMAIN_RATE per second
+OUTBOX_DOMAIN_RATE = float(os.environ.get('OUTBOX_DOMAIN_RATE', '1'))
+OUTBOX_DOMAIN_BURST = int(os.environ.get('OUTBOX_DOMAIN_BURST', '10'))
+
+# How often the worker looks for new messages queued by other processes
+OUTBOX_POLL_SECONDS = 1.0
+OUTBOX_BATCH = 100
+
+
+def queue_email(to_email: str, subject: str, body: str, html_body: str = None,
+                attachments: List[str] = None, compress: str = None) -> int:
+    """Queue an email for the delivery worker; returns the outbox id
+
+    Attachments are read when the email is sent; compress is 'gzip' or
+    'zip' (see attachments.py).
+    """
+    validate_compress(compress)
+    email_id = enqueue_email(to_email, subject, body, html_body, attachments, compress)
+    if _worker is not None:
+        _worker.wake()
+    return email_id
+
+
+def retry_delay(attempt: int) -> float:
+    """Backoff before retrying a failed attempt, with equal jitter"""
+    delay = min(OUTBOX_RETRY_MAX_DELAY_SECONDS, OUTBOX_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def is_permanent(error: Exception) -> bool:
+    """Whether retrying cannot help"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def recipient_domain(recipient: str) -> str:
+    return recipient.rsplit('@', 1)[-1].strip().strip('>').lower()
+
+
+def send_outbox_email(email: Dict):
+    """Build and send one outbox row through email_sender's SMTP pool"""
+    import email_sender  # email_sender imports this module
+
+    attachments = json.loads(email['attachments']) if email['attachments'] else None
+    email_sender.deliver(email['recipient'], email['subject'], email['body'], email['html_body'],
+                         attachments, email['compress'])
+
+
+class OutboxWorker:
+    """Background worker delivering queued emails"""
+
+    def __init__(self, send=send_outbox_email, concurrency: int = OUTBOX_CONCURRENCY):
+        self.send = send
+        self.concurrency = max(1, concurrency)
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def start(self):
+        """Requeue interrupted sends and start delivering"""
+        global _worker
+        recovered = recover_outbox()
+        if recovered:
+            logger.warning(f"Requeued {recovered} email(s) interrupted while sending")
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='outbox-send')
+        self._thread = threading.Thread(target=self._run, name='outbox', daemon=True)
+        self._thread.start()
+        _worker = self
+        logger.info(f"Email outbox worker started ({self.concurrency} concurrent sends)")
+
+    def stop(self):
+        """Stop claiming messages and wait for sends in flight"""
+        global _worker
+        if _worker is self:
+            _worker = None
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    def wake(self):
+        self._wake.set()
+
+    def _bucket(self, domain: str) -> TokenBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            bucket = self._buckets[domain] = TokenBucket(OUTBOX_DOMAIN_RATE, OUTBOX_DOMAIN_BURST)
+        return bucket
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                started = self._dispatch_due()
+            except Exception as e:
+                logger.error(f"Email outbox worker error: {e}")
+                started = 0
+            if not started:
+                self._wake.wait(OUTBOX_POLL_SECONDS)
+                self._wake.clear()
+
+    def _dispatch_due(self) -> int:
+        """Claim due messages into free send slots; returns how many started"""
+        with self._lock:
+            free = self.concurrency - self._in_flight
+        if free <= 0:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        started = 0
+        for email in get_due_emails(now, OUTBOX_BATCH):
+            if started >= free:
+                break
+            bucket = self._bucket(recipient_domain(email['recipient']))
+            if not bucket.try_acquire():
+                defer_email(email['id'], now + timedelta(seconds=bucket.wait_time()))
+                continue
+            if not claim_email(email['id']):
+                continue
+            with self._lock:
+                self._in_flight += 1
+            self._executor.submit(self._deliver, email)
+            started += 1
+        return started
+
+    def _deliver(self, email: Dict):
+        attempt = email['attempts'] + 1
+        try:
+            self.send(email)
+            mark_email_sent(email['id'])
+            logger.info(f"Sent outbox email {email['id']} to {email['recipient']}")
+        except Exception as e:
+            if is_permanent(e) or attempt >= OUTBOX_MAX_ATTEMPTS:
+                fail_email(email['id'], str(e))
+                logger.error(f"Giving up on outbox email {email['id']} to {email['recipient']} "
+                             f"after {attempt} attempt(s): {e}")
+            else:
+                delay = retry_delay(attempt)
+                retry_email(email['id'], datetime.now(timezone.utc) + timedelta(seconds=delay), str(e))
+                logger.warning(f"Outbox email {email['id']} to {email['recipient']} failed ({e}); "
+                               f"retrying in {delay:.0f}s")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._wake.set()
+
+
+# The running worker in this process, woken by queue_email()
+_worker = None
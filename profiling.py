@@ -0,0 +1,385 @@
+"""
+Sampling profiler, request spans and slow-query log
+
+Three diagnostics for when the service slows down. Each is switched on and
+off at runtime through the admin endpoints in main.py and costs next to
+nothing while off:
+
+- sample(seconds) takes the stack of every thread (sys._current_frames)
+  every interval and counts them collapsed, one "thread;frame;...;frame"
+  stack per line with its count, the input flamegraph.pl and speedscope
+  read; flamegraph_svg() draws them as an SVG flame graph
+- RequestTracer, while enabled, splits each request's time into spans:
+  database statements, TaskScheduler calls (the @traced('scheduler')
+  methods, including the statements they run) and template rendering.
+  TracingMiddleware sends the split in a Server-Timing header and the
+  tracer keeps the last TRACE_HISTORY requests and totals per route
+- SlowQueryLog logs statements that run longer than its threshold
+  (SCHEDULER_SLOW_QUERY_MS, off by default) and keeps the last
+  SLOW_QUERY_HISTORY of them
+
+Tracing and the slow-query log hook into queries.execute() only while one
+of them is on. When off, a statement costs the one hook-list check it did
+before, a traced call one context variable lookup, and a request one flag
+check in the middleware.
+"""
+
+import functools
+import html
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import queries
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL_SECONDS = 0.01  # 100 samples per second
+MAX_SAMPLE_SECONDS = 60
+
+TRACE_REQUESTS = os.environ.get('SCHEDULER_TRACE_REQUESTS', '0') == '1'
+TRACE_HISTORY = 200
+
+SLOW_QUERY_MS = float(os.environ['SCHEDULER_SLOW_QUERY_MS']) if os.environ.get('SCHEDULER_SLOW_QUERY_MS') else None
+SLOW_QUERY_HISTORY = 200
+
+SPAN_CATEGORIES = ('db', 'scheduler', 'template')
+
+# Innermost frames of a thread that is waiting rather than working
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('socketserver.py', 'serve_forever'),
+    ('connection.py', 'wait'),
+}
+
+
+class ProfilerBusy(RuntimeError):
+    """Another sample is already being taken"""
+
+
+# --- Sampling ---
+
+_sampling = threading.Lock()
+_labels: Dict[object, str] = {}
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def _thread_label(name: str) -> str:
+    """Pool threads share a label, so 'dispatch-3' and 'dispatch-7' merge"""
+    return re.sub(r'[-_]\d+$', '', name).replace(';', ',')
+
+
+def _idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+
+def sample(seconds: float, interval: float = SAMPLE_INTERVAL_SECONDS, idle: bool = False) -> Counter:
+    """Sample every thread's stack for a while; returns a Counter of collapsed stacks
+
+    Threads waiting in a lock, queue or select are left out unless idle is
+    True. The thread taking the sample is always left out.
+    """
+    if not _sampling.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being taken")
+    try:
+        stacks = Counter()
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (not idle and _idle(frame)):
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                frames.append(_thread_label(names.get(ident, str(ident))))
+                stacks[';'.join(reversed(frames))] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _sampling.release()
+
+
+def collapsed(stacks: Counter) -> str:
+    """Collapsed stack text, most frequent stack first"""
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _stack_tree(stacks: Counter) -> dict:
+    root = {'count': 0, 'children': {}}
+    for stack, count in stacks.items():
+        root['count'] += count
+        node = root
+        for frame in stack.split(';'):
+            node = node['children'].setdefault(frame, {'count': 0, 'children': {}})
+            node['count'] += count
+    return root
+
+
+def flamegraph_svg(stacks: Counter, title: str = "Flame graph", width: int = 1200) -> str:
+    """Draw collapsed stacks as a flame graph: callers below callees, width by sample count"""
+    frame_height, font_size, margin = 16, 11, 10
+    root = _stack_tree(stacks)
+    total = root['count'] or 1
+    scale = (width - 2 * margin) / total
+    boxes = []
+
+    def layout(node, x, depth):
+        for name, child in sorted(node['children'].items()):
+            child_width = child['count'] * scale
+            if child_width >= 0.5:
+                boxes.append((name, child['count'], x, depth, child_width))
+                layout(child, x, depth + 1)
+            x += child_width
+
+    layout(root, margin, 0)
+    depth = max((box[3] for box in boxes), default=0) + 1
+    height = depth * frame_height + 3 * margin + font_size * 2
+    lines = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'font-family="monospace" font-size="{font_size}">',
+             f'<rect width="100%" height="100%" fill="#fdfdf6"/>',
+             f'<text x="{width / 2}" y="{margin + font_size}" text-anchor="middle" font-size="{font_size + 3}">'
+             f'{html.escape(title)} ({total} samples)</text>']
+    chars_per_pixel = 1 / (font_size * 0.6)
+    for name, count, x, level, box_width in boxes:
+        y = height - margin - (level + 1) * frame_height
+        hue = zlib.crc32(name.split(' (')[0].encode()) % 60
+        label = html.escape(name)
+        tooltip = f"{label} - {count} samples ({count / total:.1%})"
+        lines.append(f'<g><title>{tooltip}</title>'
+                     f'<rect x="{x:.1f}" y="{y}" width="{box_width:.1f}" height="{frame_height - 1}" '
+                     f'fill="hsl({hue}, 85%, 60%)" rx="2"/>')
+        fits = int((box_width - 4) * chars_per_pixel)
+        if fits >= 3:
+            text = name if len(name) <= fits else name[:fits - 2] + '..'
+            lines.append(f'<text x="{x + 2:.1f}" y="{y + frame_height - 4}">{html.escape(text)}</text>')
+        lines.append('</g>')
+    lines.append('</svg>')
+    return '\n'.join(lines)
+
+
+# --- Request spans ---
+
+class _Spans:
+    __slots__ = ('totals', 'counts', 'active')
+
+    def __init__(self):
+        self.totals = dict.fromkeys(SPAN_CATEGORIES, 0.0)
+        self.counts = dict.fromkeys(SPAN_CATEGORIES, 0)
+        self.active = set()
+
+
+_current_spans: ContextVar[Optional[_Spans]] = ContextVar('profiling_spans', default=None)
+
+
+def traced(category: str):
+    """Count a function's time towards a span of the request calling it
+
+    Outside a traced request this is one context variable lookup. Nested
+    calls in the same category count once, for the outermost call.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            spans = _current_spans.get()
+            if spans is None or category in spans.active:
+                return function(*args, **kwargs)
+            spans.active.add(category)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                spans.totals[category] += time.perf_counter() - start
+                spans.counts[category] += 1
+                spans.active.discard(category)
+        return wrapper
+    return decorate
+
+
+def _record_statement(name: str, seconds: float):
+    spans = _current_spans.get()
+    if spans is not None:
+        spans.totals['db'] += seconds
+        spans.counts['db'] += 1
+
+
+class RequestTracer:
+    """Per-request span timings, kept for the last requests and summed per route"""
+
+    def __init__(self, history: int = TRACE_HISTORY):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=history)
+        self._routes: Dict[str, dict] = {}
+
+    def enable(self):
+        with self._lock:
+            if not self.enabled:
+                self._recent.clear()
+                self._routes.clear()
+                queries.add_timing_hook(_record_statement)
+                self.enabled = True
+
+    def disable(self):
+        with self._lock:
+            if self.enabled:
+                self.enabled = False
+                queries.remove_timing_hook(_record_statement)
+
+    def begin(self):
+        """Start collecting spans for the current request; returns the token for end()"""
+        spans = _Spans()
+        return spans, _current_spans.set(spans)
+
+    def end(self, token, method: str, route: str, status: int, seconds: float) -> dict:
+        spans, context_token = token
+        _current_spans.reset(context_token)
+        trace = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'method': method,
+            'route': route,
+            'status': status,
+            'total_ms': round(seconds * 1000, 3),
+            **{f"{category}_ms": round(spans.totals[category] * 1000, 3) for category in SPAN_CATEGORIES},
+            'db_statements': spans.counts['db'],
+        }
+        with self._lock:
+            self._recent.append(trace)
+            totals = self._routes.setdefault(f"{method} {route}", {
+                'requests': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'db_statements': 0,
+                **{f"{category}_ms": 0.0 for category in SPAN_CATEGORIES}})
+            totals['requests'] += 1
+            totals['max_ms'] = max(totals['max_ms'], trace['total_ms'])
+            totals['db_statements'] += trace['db_statements']
+            for key in ('total_ms', *(f"{category}_ms" for category in SPAN_CATEGORIES)):
+                totals[key] += trace[key]
+        return trace
+
+    def server_timing(self, token, seconds: float) -> str:
+        """Server-Timing header value for the spans so far"""
+        spans = token[0]
+        parts = [f'{category};dur={spans.totals[category] * 1000:.2f}' for category in SPAN_CATEGORIES
+                 if spans.counts[category]]
+        parts.append(f'total;dur={seconds * 1000:.2f}')
+        return ', '.join(parts)
+
+    def summary(self) -> dict:
+        """Recent requests, newest first, and per-route totals, slowest total first"""
+        with self._lock:
+            recent = list(reversed(self._recent))
+            routes = []
+            for route, totals in self._routes.items():
+                routes.append({'route': route, **{key: round(value, 3) for key, value in totals.items()},
+                               'mean_ms': round(totals['total_ms'] / totals['requests'], 3)})
+        routes.sort(key=lambda route: route['total_ms'], reverse=True)
+        return {'enabled': self.enabled, 'routes': routes, 'recent': recent}
+
+
+class TracingMiddleware:
+    """ASGI middleware recording each request's spans while the tracer is enabled"""
+
+    def __init__(self, app, tracer: RequestTracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        token = self.tracer.begin()
+        start = time.perf_counter()
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                header = self.tracer.server_timing(token, time.perf_counter() - start)
+                message = {**message, 'headers': [*message.get('headers', ()),
+                                                  (b'server-timing', header.encode('latin-1'))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            route = scope.get('route')
+            self.tracer.end(token, scope['method'], getattr(route, 'path', scope['path']), status,
+                            time.perf_counter() - start)
+
+
+# --- Slow-query log ---
+
+class SlowQueryLog:
+    """Log statements slower than threshold_ms; None turns the log off"""
+
+    def __init__(self, threshold_ms: Optional[float] = None, history: int = SLOW_QUERY_HISTORY):
+        self.threshold_ms = None
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=history)
+        self._statements: Dict[str, dict] = {}
+        self.set_threshold(threshold_ms)
+
+    def set_threshold(self, threshold_ms: Optional[float]):
+        with self._lock:
+            if threshold_ms is not None and self.threshold_ms is None:
+                queries.add_timing_hook(self._record)
+            elif threshold_ms is None and self.threshold_ms is not None:
+                queries.remove_timing_hook(self._record)
+            self.threshold_ms = threshold_ms
+
+    def _record(self, name: str, seconds: float):
+        threshold_ms = self.threshold_ms
+        milliseconds = seconds * 1000
+        if threshold_ms is None or milliseconds < threshold_ms:
+            return
+        logger.warning(f"Slow query {name}: {milliseconds:.1f} ms")
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'statement': name,
+            'duration_ms': round(milliseconds, 3),
+            'thread': threading.current_thread().name,
+        }
+        with self._lock:
+            self._recent.append(entry)
+            totals = self._statements.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            totals['count'] += 1
+            totals['total_ms'] += milliseconds
+            totals['max_ms'] = max(totals['max_ms'], milliseconds)
+
+    def summary(self) -> dict:
+        """Recent slow statements, newest first, and totals per statement with its SQL"""
+        with self._lock:
+            recent = list(reversed(self._recent))
+            statements = [{'statement': name, 'sql': ' '.join(queries.STATEMENTS[name].split()),
+                           **{key: round(value, 3) for key, value in totals.items()}}
+                          for name, totals in self._statements.items()]
+        statements.sort(key=lambda statement: statement['total_ms'], reverse=True)
+        return {'threshold_ms': self.threshold_ms, 'statements': statements, 'recent': recent}
+
+
+tracer = RequestTracer()
+if TRACE_REQUESTS:
+    tracer.enable()
+
+slow_queries = SlowQueryLog(SLOW_QUERY_MS)
@@ -0,0 +1,337 @@
+"""
+Named SQL statements for database.py
+
+Every access pattern has a fixed SQL string registered here under a name,
+so each persistent connection compiles it once and serves it from its
+statement cache afterwards. The cache is sized well above the number of
+registered statements so nothing is evicted. Dynamic task updates get one
+registered statement per column set instead of a fresh string per call.
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Per-connection compiled statement cache (sqlite3 defaults to 128)
+STATEMENT_CACHE_SIZE = 512
+
+
+def epoch_ms_sql(expression: str) -> str:
+    """SQL converting a date/time expression to integer epoch milliseconds"""
+    return f"CAST(ROUND((julianday({expression}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+# SQL expression for the current time in epoch milliseconds
+NOW_MS = "(" + epoch_ms_sql("'now'") + ")"
+
+STATEMENTS: Dict[str, str] = {
+    # tasks
+    'tasks.insert': '''
+        INSERT INTO tasks (task_name, command, schedule, description)
+        VALUES (?, ?, ?, ?)
+    ''',
+    'tasks.get': 'SELECT * FROM tasks WHERE id = ?',
+    'tasks.all': 'SELECT * FROM tasks ORDER BY created_at DESC',
+    'tasks.page': 'SELECT * FROM tasks WHERE id > ? ORDER BY id LIMIT ?',
+    'tasks.delete': 'DELETE FROM tasks WHERE id = ?',
+    'tasks.update_last_run': 'UPDATE tasks SET last_run = ? WHERE id = ?',
+    'tasks.update_next_run': 'UPDATE tasks SET next_run = ? WHERE id = ?',
+    'tasks.set_status': 'UPDATE tasks SET status = ? WHERE id = ?',
+    'tasks.set_version': 'UPDATE tasks SET version = ? WHERE id = ?',
+    'tasks.versions': 'SELECT id, version FROM tasks',
+    'tasks.changed_since': 'SELECT * FROM tasks WHERE version > ? ORDER BY version',
+    'tasks.active_schedules': '''
+        SELECT id, task_name, schedule, spread_mode, spread_window FROM tasks
+        WHERE status = 'active' AND id NOT IN (SELECT task_id FROM task_dependencies)
+    ''',
+    'tasks.due_between': '''
+        SELECT * FROM tasks
+        WHERE next_run >= ? AND next_run < ? AND status = 'active'
+        ORDER BY next_run
+    ''',
+
+    # task_executions
+    'executions.insert': '''
+        INSERT INTO task_executions (task_id, status, output, error, dag_run_id, attempt, duration_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'executions.insert_at': '''
+        INSERT INTO task_executions (task_id, execution_time, status, output, error)
+        VALUES (?, ?, ?, ?, ?)
+    ''',
+    'executions.page': '''
+        SELECT * FROM task_executions
+        WHERE task_id = ?
+        ORDER BY execution_time DESC, id DESC
+        LIMIT ? OFFSET ?
+    ''',
+    'executions.page_before': '''
+        SELECT * FROM task_executions
+        WHERE task_id = ? AND (execution_time, id) < (?, ?)
+        ORDER BY execution_time DESC, id DESC
+        LIMIT ?
+    ''',
+    'executions.between': '''
+        SELECT * FROM task_executions
+        WHERE execution_time >= ? AND execution_time < ?
+        ORDER BY execution_time DESC, id DESC
+    ''',
+    'executions.for_dag_run': 'SELECT * FROM task_executions WHERE dag_run_id = ? ORDER BY id',
+
+    # task dependencies and DAG runs
+    'dependencies.all': 'SELECT task_id, depends_on FROM task_dependencies',
+    'dependencies.insert': 'INSERT INTO task_dependencies (task_id, depends_on) VALUES (?, ?)',
+    'dependencies.clear': 'DELETE FROM task_dependencies WHERE task_id = ?',
+    'dependencies.delete_task': 'DELETE FROM task_dependencies WHERE task_id = ? OR depends_on = ?',
+    'dag_runs.insert': "INSERT INTO dag_runs (root_task_id, status) VALUES (?, 'running')",
+    'dag_runs.finish': '''
+        UPDATE dag_runs
+        SET status = ?, finished_at = ?, duration_ms = ?, critical_path_ms = ?, critical_path = ?, tasks_run = ?
+        WHERE id = ?
+    ''',
+    'dag_runs.get': 'SELECT * FROM dag_runs WHERE id = ?',
+    'dag_runs.page': 'SELECT * FROM dag_runs WHERE root_task_id = ? ORDER BY id DESC LIMIT ? OFFSET ?',
+    'dag_runs.interrupt': "UPDATE dag_runs SET status = 'interrupted' WHERE status = 'running'",
+
+    # daily execution rollups
+    'rollups.add': '''
+        INSERT INTO execution_daily
+            (day, task_id, runs, successes, failures, cancelled, skipped, missed,
+             timed_runs, total_duration_ms, max_duration_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (day, task_id) DO UPDATE SET
+            runs = runs + excluded.runs,
+            successes = successes + excluded.successes,
+            failures = failures + excluded.failures,
+            cancelled = cancelled + excluded.cancelled,
+            skipped = skipped + excluded.skipped,
+            missed = missed + excluded.missed,
+            timed_runs = timed_runs + excluded.timed_runs,
+            total_duration_ms = total_duration_ms + excluded.total_duration_ms,
+            max_duration_ms = MAX(max_duration_ms, excluded.max_duration_ms)
+    ''',
+    'rollups.add_duration': '''
+        INSERT INTO execution_daily_durations (day, task_id, bucket, count) VALUES (?, ?, ?, 1)
+        ON CONFLICT (day, task_id, bucket) DO UPDATE SET count = count + 1
+    ''',
+    'rollups.between': '''
+        SELECT r.task_id, t.task_name AS name, SUM(runs) AS runs, SUM(successes) AS successes,
+               SUM(failures) AS failures, SUM(cancelled) AS cancelled, SUM(skipped) AS skipped,
+               SUM(missed) AS missed, SUM(timed_runs) AS timed_runs,
+               SUM(total_duration_ms) AS total_duration_ms, MAX(max_duration_ms) AS max_duration_ms
+        FROM execution_daily r LEFT JOIN tasks t ON t.id = r.task_id
+        WHERE day >= ? AND day <= ?
+        GROUP BY r.task_id
+    ''',
+    'rollups.durations_between': '''
+        SELECT task_id, bucket, SUM(count) AS count FROM execution_daily_durations
+        WHERE day >= ? AND day <= ?
+        GROUP BY task_id, bucket
+    ''',
+    'rollups.exists': 'SELECT 1 FROM execution_daily LIMIT 1',
+    'rollups.clear': 'DELETE FROM execution_daily',
+    'rollups.clear_durations': 'DELETE FROM execution_daily_durations',
+    'rollups.rebuild': '''
+        INSERT INTO execution_daily
+        SELECT date(execution_time / 1000, 'unixepoch'), task_id,
+               SUM(status IN ('success', 'failed', 'cancelled')), SUM(status = 'success'),
+               SUM(status = 'failed'), SUM(status = 'cancelled'), SUM(status = 'skipped'),
+               SUM(status = 'missed'), COUNT(duration_ms), COALESCE(SUM(duration_ms), 0),
+               COALESCE(MAX(duration_ms), 0)
+        FROM task_executions
+        GROUP BY 1, 2
+    ''',
+    # duration_bucket() is registered on the connection by rebuild_rollups()
+    'rollups.rebuild_durations': '''
+        INSERT INTO execution_daily_durations
+        SELECT date(execution_time / 1000, 'unixepoch'), task_id, duration_bucket(duration_ms), COUNT(*)
+        FROM task_executions
+        WHERE duration_ms IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''',
+
+    # email outbox
+    'outbox.insert': '''
+        INSERT INTO email_outbox (recipient, subject, body, html_body, attachments, compress)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''',
+    'outbox.due': '''
+        SELECT * FROM email_outbox
+        WHERE status = 'queued' AND next_attempt_at <= ?
+        ORDER BY next_attempt_at, id
+        LIMIT ?
+    ''',
+    'outbox.claim': '''
+        UPDATE email_outbox SET status = 'sending', attempts = attempts + 1
+        WHERE id = ? AND status = 'queued'
+    ''',
+    'outbox.sent': "UPDATE email_outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+    'outbox.retry': "UPDATE email_outbox SET status = 'queued', next_attempt_at = ?, last_error = ? WHERE id = ?",
+    'outbox.fail': "UPDATE email_outbox SET status = 'failed', last_error = ? WHERE id = ?",
+    'outbox.defer': 'UPDATE email_outbox SET next_attempt_at = ? WHERE id = ?',
+    'outbox.recover': "UPDATE email_outbox SET status = 'queued' WHERE status = 'sending'",
+    'outbox.counts': 'SELECT status, COUNT(*) AS count FROM email_outbox GROUP BY status',
+    'outbox.page': 'SELECT * FROM email_outbox ORDER BY id DESC LIMIT ? OFFSET ?',
+    'outbox.page_status': 'SELECT * FROM email_outbox WHERE status = ? ORDER BY id DESC LIMIT ? OFFSET ?',
+
+    # change tracking
+    'versions.bump': f'''
+        UPDATE change_versions SET version = version + 1, changed_at = {NOW_MS}
+        WHERE name = 'tasks'
+    ''',
+    'versions.get': "SELECT version, changed_at FROM change_versions WHERE name = 'tasks'",
+    'deleted.insert': 'INSERT OR REPLACE INTO deleted_tasks (task_id, version) VALUES (?, ?)',
+    'deleted.since': 'SELECT task_id FROM deleted_tasks WHERE version > ? ORDER BY version',
+}
+
+# Single-column updates that have a dedicated statement
+_SINGLE_COLUMN_UPDATES = {
+    'last_run': 'tasks.update_last_run',
+    'next_run': 'tasks.update_next_run',
+    'status': 'tasks.set_status',
+}
+
+_registry_lock = threading.Lock()
+
+
+def register(name: str, sql: str):
+    """Register a named statement"""
+    with _registry_lock:
+        existing = STATEMENTS.get(name)
+        if existing is not None and existing != sql:
+            raise ValueError(f"Statement {name} is already registered with different SQL")
+        STATEMENTS[name] = sql
+
+
+def update_statement(columns: Iterable[str]) -> Tuple[str, List[str]]:
+    """Get the statement name for updating a set of task columns
+
+    Returns the name and the column order its parameters must follow.
+    """
+    ordered = sorted(columns)
+    if len(ordered) == 1 and ordered[0] in _SINGLE_COLUMN_UPDATES:
+        return _SINGLE_COLUMN_UPDATES[ordered[0]], ordered
+
+    name = 'tasks.update:' + ','.join(ordered)
+    if name not in STATEMENTS:
+        assignments = ', '.join(f"{column} = ?" for column in ordered)
+        register(name, f"UPDATE tasks SET {assignments} WHERE id = ?")
+    return name, ordered
+
+
+# --- Type adapters and converters ---
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MS = timedelta(milliseconds=1)
+
+
+def adapt_datetime(value: datetime) -> int:
+    """Store datetimes as integer epoch milliseconds; naive values are UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // _ONE_MS
+
+
+def adapt_date(value: date) -> str:
+    return value.isoformat()
+
+
+def convert_epoch_ms(value: bytes) -> datetime:
+    """Read an EPOCH_MS column back as an aware UTC datetime"""
+    # Float seconds are exact to well under a microsecond for any real date
+    return datetime.fromtimestamp(int(value) / 1000, timezone.utc)
+
+
+def to_epoch_ms(value) -> int:
+    """Convert a datetime, ISO-8601 string or epoch-ms int to epoch ms"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return adapt_datetime(value)
+    return int(value)
+
+
+sqlite3.register_adapter(datetime, adapt_datetime)
+sqlite3.register_adapter(date, adapt_date)
+sqlite3.register_converter('EPOCH_MS', convert_epoch_ms)
+
+# Column-level adapters applied to values written through update_statement()
+COLUMN_ADAPTERS: Dict[str, Callable] = {
+    'created_at': to_epoch_ms,
+    'last_run': to_epoch_ms,
+    'next_run': to_epoch_ms,
+    'breaker_open_until': to_epoch_ms,
+    'execution_time': to_epoch_ms,
+    'started_at': to_epoch_ms,
+    'finished_at': to_epoch_ms,
+}
+
+
+def adapt(column: str, value):
+    """Adapt a value for a column; None passes through"""
+    adapter = COLUMN_ADAPTERS.get(column)
+    if adapter is not None and value is not None:
+        return adapter(value)
+    return value
+
+
+# --- Timing hooks ---
+
+_timing_hooks: List[Callable[[str, float], None]] = []
+
+
+def add_timing_hook(hook: Callable[[str, float], None]):
+    """Call hook(statement_name, seconds) after every statement executes"""
+    _timing_hooks.append(hook)
+
+
+def remove_timing_hook(hook: Callable[[str, float], None]):
+    """Stop calling a previously added timing hook"""
+    try:
+        _timing_hooks.remove(hook)
+    except ValueError:
+        pass
+
+
+# --- Execution ---
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a connection with a statement cache large enough for the registry"""
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE,
+                           detect_types=sqlite3.PARSE_DECLTYPES)
+    # In WAL mode (set by init_db) NORMAL skips the fsync on each commit;
+    # a commit survives a crash of the process, just not a power loss
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+
+def execute(cursor: sqlite3.Cursor, name: str, params=()) -> sqlite3.Cursor:
+    """Execute a registered statement by name"""
+    sql = STATEMENTS[name]
+    if not _timing_hooks:
+        return cursor.execute(sql, params)
+
+    start = time.perf_counter()
+    try:
+        return cursor.execute(sql, params)
+    finally:
+        elapsed = time.perf_counter() - start
+        for hook in list(_timing_hooks):
+            hook(name, elapsed)
+
+
+def executemany(cursor: sqlite3.Cursor, name: str, seq_of_params) -> sqlite3.Cursor:
+    """Execute a registered statement once per parameter tuple"""
+    sql = STATEMENTS[name]
+    if not _timing_hooks:
+        return cursor.executemany(sql, seq_of_params)
+
+    start = time.perf_counter()
+    try:
+        return cursor.executemany(sql, seq_of_params)
+    finally:
+        elapsed = time.perf_counter() - start
+        for hook in list(_timing_hooks):
+            hook(name, elapsed)
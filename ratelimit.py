@@ -0,0 +1,64 @@
+"""
+Token-bucket rate limiting
+
+A bucket holds up to `capacity` tokens and refills at `rate` tokens per
+second. Taking a token when the bucket is empty waits for the next refill,
+so work can burst up to the capacity and then proceeds at the steady rate.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket"""
+
+    def __init__(self, rate: float, capacity: int, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        if capacity < 1:
+            raise ValueError("Token bucket capacity must be at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        """Take tokens if they are available right now"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens: int = 1) -> float:
+        """Seconds until the requested tokens will be available"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def acquire(self, tokens: int = 1, timeout: float = None, stop: threading.Event = None) -> bool:
+        """Wait for tokens; returns False on timeout or when stop is set"""
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            if self.try_acquire(tokens):
+                return True
+            delay = self.wait_time(tokens)
+            if deadline is not None:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            if stop is not None:
+                if stop.wait(delay):
+                    return False
+            else:
+                time.sleep(delay)
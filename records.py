@@ -0,0 +1,106 @@
+"""
+Compact, tuple-backed records for database rows
+
+Each record stores its values in a single tuple and shares the column
+layout with every other row of the same query, so a loaded task costs a
+fraction of an equivalent dict. Records support attribute access
+(``task.task_name``, used by the templates) and read-only mapping access
+(``task['status']``, ``dict(task)``, used by the scheduler and the API).
+"""
+
+from collections.abc import Mapping
+from typing import Dict, Tuple
+
+
+class Record(Mapping):
+    """Read-only row with attribute and mapping access"""
+    __slots__ = ('_values',)
+
+    _fields: Tuple[str, ...] = ()
+    _index: Dict[str, int] = {}
+
+    def __init__(self, values: tuple):
+        self._values = values
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._values[key]
+        try:
+            return self._values[self._index[key]]
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __getattr__(self, name):
+        index = type(self)._index.get(name)
+        if index is None:
+            raise AttributeError(f"{type(self).__name__} has no field {name!r}")
+        return self._values[index]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in zip(self._fields, self._values))
+        return f"{type(self).__name__}({fields})"
+
+    def values_tuple(self) -> tuple:
+        """Get the underlying values in column order"""
+        return self._values
+
+
+class TaskRecord(Record):
+    """A row from the tasks table"""
+    __slots__ = ()
+
+
+class ExecutionRecord(Record):
+    """A row from the task_executions table"""
+    __slots__ = ()
+
+
+_record_classes: Dict[Tuple[type, Tuple[str, ...]], type] = {}
+
+
+def record_class(base: type, fields: Tuple[str, ...]) -> type:
+    """Get the record class for a column layout, creating it on first use"""
+    key = (base, fields)
+    cls = _record_classes.get(key)
+    if cls is None:
+        cls = type(base.__name__, (base,), {
+            '__slots__': (),
+            '_fields': fields,
+            '_index': {name: i for i, name in enumerate(fields)},
+        })
+        _record_classes[key] = cls
+    return cls
+
+
+def _base_for(fields: Tuple[str, ...]) -> type:
+    if 'task_name' in fields:
+        return TaskRecord
+    if 'execution_time' in fields:
+        return ExecutionRecord
+    return Record
+
+
+# cursor.description is built once per statement, so remembering the last
+# one seen skips the layout lookup for every row after the first
+_last_layout = (None, None)
+
+
+def record_factory(cursor, row: tuple) -> Record:
+    """sqlite3 row_factory producing TaskRecord/ExecutionRecord instances"""
+    global _last_layout
+    description = cursor.description
+    last_description, cls = _last_layout
+    if last_description is not description:
+        fields = tuple(column[0] for column in description)
+        cls = record_class(_base_for(fields), fields)
+        _last_layout = (description, cls)
+    return cls(row)
@@ -0,0 +1,155 @@
+"""
+Execution reports built from the daily rollups
+
+The numbers come from the execution_daily and execution_daily_durations
+tables, which log_task_execution() keeps up to date, so a report reads a
+few rows per task and day instead of scanning task_executions. Duration
+percentiles are estimated from the rollup histograms and are within 5%
+of the exact value.
+
+Email bodies are rendered from the Jinja templates in templates/email.
+Compiled templates are kept as bytecode, so the short-lived email_sender
+process a report task runs loads them without parsing or compiling. The
+cache is Jinja's per-user directory under the system temp dir, or
+REPORT_TEMPLATE_CACHE if set; either must be owned by this user and closed
+to others, as the cached code is loaded and run.
+"""
+
+import logging
+import math
+import os
+import stat
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+from database import bucket_duration_ms, get_rollups
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
+REPORT_TEMPLATE_CACHE = os.environ.get('REPORT_TEMPLATE_CACHE')
+
+# Tasks listed under "slowest" and "most failures"
+TOP_TASKS = 5
+
+_environment = None
+
+
+def percentile(histogram: Dict[int, int], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile (in ms) of a duration histogram"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = max(1, math.ceil(fraction * total))
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= rank:
+            return bucket_duration_ms(bucket)
+
+
+def format_duration(ms: Optional[float]) -> str:
+    if ms is None:
+        return '-'
+    if ms < 1000:
+        return f"{ms:.0f} ms"
+    if ms < 60_000:
+        return f"{ms / 1000:.1f} s"
+    if ms < 3_600_000:
+        return f"{ms / 60_000:.1f} min"
+    return f"{ms / 3_600_000:.1f} h"
+
+
+def format_rate(rate: Optional[float]) -> str:
+    return '-' if rate is None else f"{rate:.1f}%"
+
+
+def _task_stats(row: Dict, histogram: Dict[int, int]) -> Dict:
+    finished = row['successes'] + row['failures']
+    timed = row['timed_runs']
+    stats = dict(row)
+    stats['name'] = row['name'] or f"Task {row['task_id']} (deleted)"
+    stats['success_rate'] = row['successes'] / finished * 100 if finished else None
+    stats['mean_ms'] = row['total_duration_ms'] / timed if timed else None
+    stats['max_ms'] = row['max_duration_ms'] if timed else None
+    for key, fraction in (('p50_ms', 0.5), ('p95_ms', 0.95)):
+        estimate = percentile(histogram, fraction)
+        # A bucket's midpoint can overshoot the slowest run in it
+        stats[key] = min(estimate, stats['max_ms']) if estimate is not None else None
+    return stats
+
+
+def build_report(title: str, first_day: date, last_day: date) -> Dict:
+    """Aggregate task runs over the UTC days first_day..last_day"""
+    totals, histograms = get_rollups(first_day, last_day)
+    tasks = sorted((_task_stats(row, histograms.get(row['task_id'], {})) for row in totals),
+                   key=lambda task: task['name'].lower())
+
+    summary = {key: sum(task[key] for task in tasks)
+               for key in ('runs', 'successes', 'failures', 'cancelled', 'skipped', 'missed')}
+    finished = summary['successes'] + summary['failures']
+    summary['success_rate'] = summary['successes'] / finished * 100 if finished else None
+    summary['tasks'] = len(tasks)
+
+    timed = [task for task in tasks if task['p95_ms'] is not None]
+    return {
+        'title': title,
+        'first_day': first_day,
+        'last_day': last_day,
+        'generated_at': datetime.now(timezone.utc),
+        'summary': summary,
+        'tasks': tasks,
+        'slowest': sorted(timed, key=lambda task: task['p95_ms'], reverse=True)[:TOP_TASKS],
+        'failing': sorted((task for task in tasks if task['failures']),
+                          key=lambda task: task['failures'], reverse=True)[:TOP_TASKS],
+    }
+
+
+def daily_report(day: date = None) -> Dict:
+    """Report on one UTC day, by default yesterday"""
+    day = day or datetime.now(timezone.utc).date() - timedelta(days=1)
+    return build_report(f"Daily Report - {day.isoformat()}", day, day)
+
+
+def weekly_summary(last_day: date = None) -> Dict:
+    """Report on the 7 UTC days ending with last_day, by default yesterday"""
+    last_day = last_day or datetime.now(timezone.utc).date() - timedelta(days=1)
+    first_day = last_day - timedelta(days=6)
+    return build_report(f"Weekly Summary - {first_day.isoformat()} to {last_day.isoformat()}",
+                        first_day, last_day)
+
+
+def _bytecode_cache() -> FileSystemBytecodeCache:
+    if REPORT_TEMPLATE_CACHE is None:
+        return FileSystemBytecodeCache()  # Creates and checks a private per-user directory
+    os.makedirs(REPORT_TEMPLATE_CACHE, mode=0o700, exist_ok=True)
+    info = os.lstat(REPORT_TEMPLATE_CACHE)
+    if not stat.S_ISDIR(info.st_mode) or (os.name == 'posix' and (info.st_uid != os.getuid()
+                                                                   or info.st_mode & 0o077)):
+        raise PermissionError(f"{REPORT_TEMPLATE_CACHE} must be a directory owned by this user "
+                              f"and not accessible to others")
+    return FileSystemBytecodeCache(REPORT_TEMPLATE_CACHE)
+
+
+def _templates() -> Environment:
+    global _environment
+    if _environment is None:
+        bytecode_cache = None
+        try:
+            bytecode_cache = _bytecode_cache()
+        except OSError as e:
+            logger.warning(f"Not caching compiled report templates: {e}")
+        _environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), bytecode_cache=bytecode_cache,
+                                   autoescape=select_autoescape(['html']), trim_blocks=True, lstrip_blocks=True)
+        _environment.filters['duration'] = format_duration
+        _environment.filters['rate'] = format_rate
+    return _environment
+
+
+def render(report: Dict) -> Tuple[str, str]:
+    """Render a report as (plain text, HTML) email bodies"""
+    templates = _templates()
+    return (templates.get_template('report.txt').render(report=report),
+            templates.get_template('report.html').render(report=report))
@@ -0,0 +1,264 @@
+"""
+Command execution with per-run resource limits
+
+Every command runs in its own session, so it leads a new process group
+that can be killed as a whole on timeout or cancel, grandchildren
+included. On POSIX the child applies its limits before exec:
+
+- cpu_seconds: RLIMIT_CPU (SIGXCPU at the limit, SIGKILL shortly after)
+- memory_mb: RLIMIT_AS for each process, or memory.max for the whole run
+  when a delegated cgroup v2 directory is configured (SCHEDULER_CGROUP_ROOT)
+- nice: added to the scheduler's own niceness
+- io_priority: 'idle' or 'low' via ionice, when it is installed
+
+A command with none of the first three runs without a preexec_fn, as any
+preexec_fn makes subprocess fall back from vfork to a full fork, which is
+slow from a large scheduler process.
+"""
+
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+IS_POSIX = os.name == 'posix'
+
+# Delegated cgroup v2 directory to create per-run child cgroups in, e.g.
+# /sys/fs/cgroup/task-scheduler (unset: per-process rlimits only)
+CGROUP_ROOT = os.environ.get('SCHEDULER_CGROUP_ROOT')
+
+# Seconds between SIGTERM and SIGKILL when a process group is stopped
+KILL_GRACE_SECONDS = 5
+
+# ionice (class, level) for each io_priority
+IO_PRIORITIES = {
+    'idle': ('3', None),
+    'low': ('2', '7'),
+    'normal': None,
+}
+
+
+@dataclass
+class ResourceLimits:
+    """Limits applied to one command run; None means unlimited"""
+    timeout: Optional[float] = 300
+    cpu_seconds: Optional[int] = None
+    memory_mb: Optional[int] = None
+    nice: Optional[int] = None
+    io_priority: Optional[str] = None
+
+
+@dataclass
+class CommandResult:
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    cancelled: bool = False
+
+    @property
+    def error(self) -> Optional[str]:
+        """Describe why the command did not succeed, or None if it did"""
+        if self.timed_out:
+            return 'Task execution timed out'
+        if self.cancelled:
+            return 'Task run was cancelled'
+        if self.returncode is not None and self.returncode < 0:
+            signum = -self.returncode
+            if signum == getattr(signal, 'SIGXCPU', None):
+                return 'CPU time limit exceeded'
+            try:
+                name = signal.Signals(signum).name
+            except ValueError:
+                name = str(signum)
+            return self.stderr or f'Killed by {name}'
+        if self.returncode:
+            return self.stderr
+        return None
+
+
+def validate_limits(options: dict):
+    """Check per-task resource limit settings"""
+    for field in ('timeout_seconds', 'cpu_seconds', 'memory_mb'):
+        if options.get(field) is not None and options[field] < 1:
+            raise ValueError(f"{field} must be a positive number")
+    if options.get('nice') is not None and not 0 <= options['nice'] <= 19:
+        raise ValueError("nice must be between 0 and 19")
+    io_priority = options.get('io_priority')
+    if io_priority is not None and io_priority not in IO_PRIORITIES:
+        raise ValueError(f"Invalid io_priority {io_priority!r}. Expected one of: {', '.join(IO_PRIORITIES)}")
+
+
+class _Cgroup:
+    """A per-run child cgroup (cgroup v2) limiting the whole process tree"""
+
+    def __init__(self, root: str, limits: ResourceLimits):
+        self.path = os.path.join(root, f"run-{uuid.uuid4().hex[:12]}")
+        os.mkdir(self.path)
+        if limits.memory_mb:
+            self._write('memory.max', str(limits.memory_mb * 1024 * 1024))
+            self._write('memory.swap.max', '0', required=False)
+
+    def _write(self, name: str, value: str, required: bool = True):
+        try:
+            with open(os.path.join(self.path, name), 'w') as f:
+                f.write(value)
+        except OSError:
+            if required:
+                raise
+
+    def join(self):
+        """Move the calling process into the cgroup (runs in the child)"""
+        with open(os.path.join(self.path, 'cgroup.procs'), 'w') as f:
+            f.write('0')
+
+    def kill(self) -> bool:
+        try:
+            self._write('cgroup.kill', '1')
+            return True
+        except OSError:
+            return False
+
+    def remove(self):
+        for _ in range(50):
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.1)  # Still has processes exiting
+        logger.warning(f"Could not remove cgroup {self.path}")
+
+
+def _preexec(limits: ResourceLimits, cgroup: Optional[_Cgroup]):
+    """Build the function the child runs before exec to apply its limits; None if there are none"""
+    if resource is None or not (cgroup is not None or limits.cpu_seconds or limits.memory_mb or limits.nice):
+        return None
+
+    def apply():
+        if cgroup is not None:
+            cgroup.join()
+        if limits.cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + 5))
+        if limits.memory_mb and cgroup is None:
+            size = limits.memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (size, size))
+        if limits.nice:
+            os.nice(limits.nice)
+    return apply
+
+
+def _build_args(command: str, limits: ResourceLimits):
+    """Get the Popen arguments, wrapping the shell in ionice if requested"""
+    priority = IO_PRIORITIES.get(limits.io_priority) if limits.io_priority else None
+    if priority and IS_POSIX:
+        ionice = shutil.which('ionice')
+        if ionice:
+            io_class, level = priority
+            args = [ionice, '-c', io_class] + (['-n', level] if level else [])
+            return args + ['/bin/sh', '-c', command], False
+        logger.debug("ionice not found; running without an IO priority")
+    return command, True
+
+
+class CommandRun:
+    """A running command that can be waited on or cancelled"""
+
+    def __init__(self, command: str, limits: ResourceLimits):
+        self.limits = limits
+        self._cancelled = threading.Event()
+        self._cgroup = None
+
+        args, shell = _build_args(command, limits)
+        kwargs = {}
+        if IS_POSIX:
+            if CGROUP_ROOT and limits.memory_mb:
+                try:
+                    self._cgroup = _Cgroup(CGROUP_ROOT, limits)
+                except OSError as e:
+                    logger.warning(f"Cgroup limits unavailable ({e}); using per-process limits")
+            kwargs['start_new_session'] = True
+            kwargs['preexec_fn'] = _preexec(limits, self._cgroup)
+        else:
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+
+        try:
+            self.process = subprocess.Popen(args, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                            text=True, **kwargs)
+        except Exception:
+            self._cleanup()
+            raise
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def wait(self) -> CommandResult:
+        """Wait for the command, killing its process group on timeout"""
+        timed_out = False
+        try:
+            stdout, stderr = self.process.communicate(timeout=self.limits.timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            self.kill()
+            try:
+                stdout, stderr = self.process.communicate(timeout=KILL_GRACE_SECONDS)
+            except subprocess.TimeoutExpired:
+                # Something outside the group still holds the pipes open
+                self.process.kill()
+                stdout, stderr = '', ''
+        finally:
+            self._cleanup()
+        return CommandResult(self.process.returncode, stdout, stderr,
+                             timed_out=timed_out, cancelled=self._cancelled.is_set())
+
+    def cancel(self):
+        """Stop the whole process group; wait() then reports it as cancelled"""
+        self._cancelled.set()
+        self.kill()
+
+    def kill(self):
+        """SIGTERM the process group, then SIGKILL whatever is left after a grace period"""
+        if self._cgroup is not None and self._cgroup.kill():
+            return
+        if not IS_POSIX:
+            self.process.kill()
+            return
+
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        try:
+            self.process.wait(timeout=KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            pass
+        # The shell may be gone while grandchildren in its group live on
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _cleanup(self):
+        if self._cgroup is not None:
+            self._cgroup.remove()
+            self._cgroup = None
+
+
+def run_command(command: str, limits: ResourceLimits = None) -> CommandResult:
+    """Run a shell command in its own process group with resource limits"""
+    return CommandRun(command, limits or ResourceLimits()).wait()
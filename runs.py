@@ -0,0 +1,126 @@
+"""
+In-memory registry of active task runs
+
+Every run of a task's command is registered while it is queued or
+running, with its trigger, pid, start time and live duration, so runs can
+be listed and cancelled through the API. Run ids count up from 1 and are
+not persisted; finished runs are recorded in task_executions instead.
+"""
+
+import itertools
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RUN_STATES = ('queued', 'running')
+
+
+@dataclass
+class ActiveRun:
+    run_id: int
+    task_id: int
+    task_name: str
+    trigger: str  # 'manual', 'schedule', 'retry' or 'dag'
+    queued_at: datetime
+    attempt: int = 1
+    started_at: Optional[datetime] = None
+    cancel_requested: bool = False
+    handle: object = field(default=None, repr=False)  # CommandRun, ForkServerRun or PythonRun
+
+    @property
+    def state(self) -> str:
+        return 'queued' if self.started_at is None else 'running'
+
+    @property
+    def pid(self) -> Optional[int]:
+        return getattr(self.handle, 'pid', None)
+
+    def to_dict(self) -> dict:
+        now = datetime.now(timezone.utc)
+        return {
+            'run_id': self.run_id,
+            'task_id': self.task_id,
+            'task_name': self.task_name,
+            'trigger': self.trigger,
+            'attempt': self.attempt,
+            'state': self.state,
+            'pid': self.pid,
+            'queued_at': self.queued_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'duration_seconds': round((now - self.started_at).total_seconds(), 3) if self.started_at else None,
+            'cancel_requested': self.cancel_requested,
+        }
+
+
+class RunRegistry:
+    """Thread-safe registry of queued and running task runs"""
+
+    def __init__(self):
+        self._runs: Dict[int, ActiveRun] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def queue(self, task_id: int, task_name: str, trigger: str = 'manual') -> ActiveRun:
+        """Register a run that has been submitted but not started"""
+        with self._lock:
+            run = ActiveRun(next(self._ids), task_id, task_name, trigger, datetime.now(timezone.utc))
+            self._runs[run.run_id] = run
+            return run
+
+    def start(self, run_id: Optional[int], task_id: int, task_name: str, trigger: str,
+              attempt: int = 1) -> ActiveRun:
+        """Mark a queued run as running, or register a new running run"""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            run = self._runs.get(run_id) if run_id is not None else None
+            if run is None:
+                run = ActiveRun(next(self._ids), task_id, task_name, trigger, now)
+                self._runs[run.run_id] = run
+            run.attempt = attempt
+            run.started_at = now
+            return run
+
+    def attach(self, run: ActiveRun, handle) -> bool:
+        """Set the command handle of a run; False if it was cancelled meanwhile"""
+        with self._lock:
+            run.handle = handle
+            cancelled = run.cancel_requested
+        if cancelled:
+            handle.cancel()
+        return not cancelled
+
+    def finish(self, run: ActiveRun):
+        with self._lock:
+            self._runs.pop(run.run_id, None)
+
+    def get(self, run_id: int) -> Optional[ActiveRun]:
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def list(self, state: str = None, task_id: int = None) -> List[ActiveRun]:
+        """List active runs, oldest first"""
+        with self._lock:
+            runs = list(self._runs.values())
+        return [run for run in runs
+                if (state is None or run.state == state) and (task_id is None or run.task_id == task_id)]
+
+    def cancel(self, run_id: int) -> Optional[ActiveRun]:
+        """Request cancellation of a run; returns None if it is not active
+
+        A running command's process group is stopped in the background, so
+        this returns at once; a queued run is cancelled as soon as it starts.
+        """
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return None
+            run.cancel_requested = True
+            handle = run.handle
+        if handle is not None:
+            threading.Thread(target=handle.cancel, name=f"cancel-run-{run_id}", daemon=True).start()
+        logger.warning(f"Cancelling run {run_id} of task {run.task_name}")
+        return run
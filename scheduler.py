@@ -1,13 +1,284 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.jobstores.memory import MemoryJobStore
-import subprocess
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+from apscheduler.jobstores.base import JobLookupError
 import logging
-from datetime import datetime
-from database import create_task, get_task, get_all_tasks, update_task, delete_task, log_task_execution, get_task_history
+import hashlib
+import os
+import random
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from database import (create_task, create_tasks, get_task, get_all_tasks, update_task, delete_task, delete_tasks,
+                      log_task_execution, log_missed_runs, get_task_history, get_task_history_rows,
+                      get_task_history_page_rows, get_dependency_edges,
+                      set_dependencies, create_dag_run, finish_dag_run, interrupt_dag_runs)
+from dag import DagRun, build_graph, check_dependencies
+from ratelimit import TokenBucket
+from runner import CommandRun, ResourceLimits, validate_limits
+from workers import PythonWorkerPool, validate_callable
+from runs import RunRegistry
+from dispatch import Dispatcher, validate_priority
+from forkserver import ForkServer
+from alerts import AlertManager
+from http_tasks import HttpClient, HttpRequest, validate_http_options, validate_url
+from profiling import traced
 
 logger = logging.getLogger(__name__)
 
+# Load spreading for tasks that share a schedule. Tasks can override both
+# settings; these are the service-wide defaults.
+#   off    - fire exactly on the cron time
+#   offset - fire at a fixed offset in [0, window) hashed from the task id
+#   jitter - let APScheduler add a random delay of up to window seconds
+SPREAD_MODES = ('off', 'offset', 'jitter')
+SPREAD_MODE = os.environ.get('SCHEDULER_SPREAD_MODE', 'off')
+SPREAD_WINDOW_SECONDS = int(os.environ.get('SCHEDULER_SPREAD_WINDOW', '0'))
+
+# What to do with fires that could not run on time (service down, executor
+# saturated or the previous run still going). Missed fires are always
+# recorded as 'missed' executions; tasks can override both settings.
+#   skip     - only record them
+#   run_once - record them, then run once to catch up
+#   run_all  - record them, then replay every one
+#   grace    - run the latest if it is at most the grace window late
+MISFIRE_POLICIES = ('skip', 'run_once', 'run_all', 'grace')
+MISFIRE_POLICY = os.environ.get('SCHEDULER_MISFIRE_POLICY', 'grace')
+MISFIRE_GRACE_SECONDS = int(os.environ.get('SCHEDULER_MISFIRE_GRACE', '60'))
+
+# Catch-up runs are released through a token bucket: up to CATCHUP_BURST
+# at once, then CATCHUP_RATE per second
+CATCHUP_RATE = float(os.environ.get('SCHEDULER_CATCHUP_RATE', '1'))
+CATCHUP_BURST = int(os.environ.get('SCHEDULER_CATCHUP_BURST', '5'))
+
+# After downtime, missed fires are looked for this far back and at most the
+# latest MAX_MISSED_RUNS of them are recorded per task
+MISSED_LOOKBACK = timedelta(days=7)
+MAX_MISSED_RUNS = 1000
+
+# Failed runs are retried as one-shot jobs with exponential backoff and
+# jitter. max_attempts counts the first run, so 1 disables retries; unset
+# exit codes mean any failure (including a timeout) is retried.
+MAX_ATTEMPTS = int(os.environ.get('SCHEDULER_MAX_ATTEMPTS', '1'))
+RETRY_BACKOFF_SECONDS = int(os.environ.get('SCHEDULER_RETRY_BACKOFF', '10'))
+RETRY_MAX_DELAY_SECONDS = int(os.environ.get('SCHEDULER_RETRY_MAX_DELAY', '600'))
+
+# Circuit breaker: after this many consecutive failed runs the task's job
+# is paused for the cooldown, then one trial run decides whether it closes
+# again or reopens. A threshold of 0 disables it.
+BREAKER_THRESHOLD = int(os.environ.get('SCHEDULER_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN_SECONDS = int(os.environ.get('SCHEDULER_BREAKER_COOLDOWN', '300'))
+
+# Worker threads running task commands. Due runs wait in a dispatch queue
+# with strict priority classes and weighted fair sharing (see dispatch.py);
+# APScheduler's own threads only queue them.
+DISPATCH_WORKERS = int(os.environ.get('SCHEDULER_WORKERS', '10'))
+
+# Timeout for tasks without their own timeout_seconds
+TASK_TIMEOUT_SECONDS = int(os.environ.get('SCHEDULER_TASK_TIMEOUT', '300'))
+
+# Unix socket of a fork server to start shell commands from (see
+# forkserver.py); one is launched there if nothing is listening. Unset:
+# commands are started directly from the scheduler process.
+FORK_SERVER_SOCKET = os.environ.get('SCHEDULER_FORK_SERVER')
+
+# What a task's command is:
+#   shell  - a shell command run in its own process group
+#   python - a 'module:function' callable run in a warm worker (see workers.py)
+#   http   - a URL requested on the shared HTTP client (see http_tasks.py)
+TASK_TYPES = ('shell', 'python', 'http')
+
+class OffsetCronTrigger(CronTrigger):
+    """Cron trigger whose fire times are all shifted by a fixed offset"""
+    offset = timedelta(0)
+    
+    def get_next_fire_time(self, previous_fire_time, now):
+        if previous_fire_time is not None:
+            previous_fire_time -= self.offset
+        next_fire_time = super().get_next_fire_time(previous_fire_time, now - self.offset)
+        if next_fire_time is None:
+            return None
+        return next_fire_time + self.offset
+    
+    def __str__(self):
+        return f"{super().__str__()} +{self.offset.total_seconds():g}s"
+
+def resolve_spread(mode, window):
+    """Apply the service-wide defaults to per-task spreading settings"""
+    mode = mode or SPREAD_MODE
+    if window is None:
+        window = SPREAD_WINDOW_SECONDS
+    if mode == 'off' or window <= 0:
+        return 'off', 0
+    return mode, window
+
+def spread_settings(task):
+    """Get the effective (mode, window_seconds) for a task"""
+    return resolve_spread(task.get('spread_mode'), task.get('spread_window'))
+
+def spread_offset(task_id: int, mode: str, window: int) -> float:
+    """Get the deterministic start offset in seconds (millisecond resolution)"""
+    if mode != 'offset' or window <= 0:
+        return 0.0
+    digest = hashlib.blake2b(str(task_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % (window * 1000) / 1000
+
+def describe_spread(task):
+    """Describe when a task starts relative to its cron time, or None when it isn't spread"""
+    mode, window = spread_settings(task)
+    if mode == 'offset':
+        return f"+{spread_offset(task['id'], mode, window):g}s after each cron time (window {window}s)"
+    if mode == 'jitter':
+        return f"Random delay of up to {window}s after each cron time"
+    return None
+
+def validate_spread(mode, window):
+    """Check per-task spreading settings"""
+    if mode is not None and mode not in SPREAD_MODES:
+        raise ValueError(f"Invalid spread mode {mode!r}. Expected one of: {', '.join(SPREAD_MODES)}")
+    if window is not None and window < 0:
+        raise ValueError("Spread window must be zero or a positive number of seconds")
+
+def misfire_settings(task):
+    """Get the effective (policy, grace_seconds) for a task"""
+    policy = task.get('misfire_policy') or MISFIRE_POLICY
+    grace = task.get('misfire_grace')
+    if grace is None:
+        grace = MISFIRE_GRACE_SECONDS
+    return policy, grace
+
+def job_misfire_options(task) -> dict:
+    """APScheduler job options for a task's misfire policy
+    
+    Coalescing is off so every late fire is reported and recorded on its
+    own. Only the grace policy lets APScheduler run late fires itself; for
+    the others anything over a second late is handed to the catch-up queue.
+    """
+    policy, grace = misfire_settings(task)
+    return {
+        'misfire_grace_time': max(1, grace) if policy == 'grace' else 1,
+        'coalesce': False,
+    }
+
+def validate_misfire(policy, grace):
+    """Check per-task misfire settings"""
+    if policy is not None and policy not in MISFIRE_POLICIES:
+        raise ValueError(f"Invalid misfire policy {policy!r}. Expected one of: {', '.join(MISFIRE_POLICIES)}")
+    if grace is not None and grace < 0:
+        raise ValueError("Misfire grace must be zero or a positive number of seconds")
+
+def parse_exit_codes(value):
+    """Parse a comma-separated exit code list; None when any failure counts"""
+    if not value:
+        return None
+    try:
+        return {int(code) for code in str(value).split(',') if code.strip()}
+    except ValueError:
+        raise ValueError(f"Invalid retry exit codes {value!r}. Expected comma-separated integers") from None
+
+def retry_settings(task):
+    """Get the effective (max_attempts, backoff_seconds, retryable_exit_codes) for a task"""
+    max_attempts = task.get('max_attempts') or MAX_ATTEMPTS
+    backoff = task.get('retry_backoff')
+    if backoff is None:
+        backoff = RETRY_BACKOFF_SECONDS
+    return max_attempts, backoff, parse_exit_codes(task.get('retry_exit_codes'))
+
+def retry_delay(backoff: float, attempt: int) -> float:
+    """Seconds to wait after failed attempt N: doubling, capped, half of it random"""
+    delay = min(RETRY_MAX_DELAY_SECONDS, backoff * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def breaker_settings(task):
+    """Get the effective (threshold, cooldown_seconds) for a task's circuit breaker"""
+    threshold = task.get('breaker_threshold')
+    if threshold is None:
+        threshold = BREAKER_THRESHOLD
+    cooldown = task.get('breaker_cooldown')
+    if cooldown is None:
+        cooldown = BREAKER_COOLDOWN_SECONDS
+    return threshold, cooldown
+
+def breaker_open(task) -> bool:
+    """Whether a task's circuit breaker is open right now"""
+    until = task.get('breaker_open_until')
+    return until is not None and until > datetime.now(timezone.utc)
+
+def validate_retry(options: dict):
+    """Check per-task retry and circuit breaker settings"""
+    if options.get('max_attempts') is not None and options['max_attempts'] < 1:
+        raise ValueError("Max attempts must be at least 1")
+    for field in ('retry_backoff', 'breaker_threshold', 'breaker_cooldown'):
+        if options.get(field) is not None and options[field] < 0:
+            raise ValueError(f"{field} must be zero or positive")
+    parse_exit_codes(options.get('retry_exit_codes'))
+
+def resource_limits(task) -> ResourceLimits:
+    """Get the effective resource limits for a task's command"""
+    return ResourceLimits(
+        timeout=task.get('timeout_seconds') or TASK_TIMEOUT_SECONDS,
+        cpu_seconds=task.get('cpu_seconds'),
+        memory_mb=task.get('memory_mb'),
+        nice=task.get('nice'),
+        io_priority=task.get('io_priority'),
+    )
+
+def validate_task_type(task_type, command):
+    """Check a task type and that the command fits it"""
+    if task_type is not None and task_type not in TASK_TYPES:
+        raise ValueError(f"Invalid task type {task_type!r}. Expected one of: {', '.join(TASK_TYPES)}")
+    if task_type == 'python':
+        validate_callable(command)
+    elif task_type == 'http':
+        validate_url(command)
+
+def missed_fire_times(trigger, since: datetime, now: datetime, limit: int = MAX_MISSED_RUNS):
+    """List the latest `limit` fire times from `since` (inclusive) up to `now`"""
+    if since < now - MISSED_LOOKBACK:
+        since = trigger.get_next_fire_time(None, now - MISSED_LOOKBACK)
+    fires = deque(maxlen=limit)
+    fire_time = since
+    while fire_time is not None and fire_time < now:
+        fires.append(fire_time)
+        fire_time = trigger.get_next_fire_time(fire_time, fire_time)
+    return list(fires)
+
+def build_trigger(schedule: str, task=None) -> CronTrigger:
+    """Build the cron trigger for a task's schedule expression
+    
+    Without a task this is the plain cron trigger; with one, the task's
+    load spreading settings are applied.
+    """
+    if task is None:
+        return CronTrigger.from_crontab(schedule)
+    
+    mode, window = spread_settings(task)
+    if mode == 'offset':
+        trigger = OffsetCronTrigger.from_crontab(schedule)
+        trigger.offset = timedelta(seconds=spread_offset(task['id'], mode, window))
+        return trigger
+    
+    trigger = CronTrigger.from_crontab(schedule)
+    if mode == 'jitter':
+        trigger.jitter = window
+    return trigger
+
+def validate_schedule(schedule: str):
+    """Check a cron expression, field values included, before anything is written"""
+    try:
+        cron_parts = schedule.split()
+        if len(cron_parts) != 5:
+            raise ValueError("Invalid cron expression. Expected 5 parts: minute hour day month day_of_week")
+        build_trigger(schedule)
+    except Exception as e:
+        raise ValueError(f"Invalid cron expression: {e}")
+
+# Updates to these fields replace the task's job
+RESCHEDULE_FIELDS = {'schedule', 'status', 'command', 'spread_mode', 'spread_window', 'misfire_policy', 'misfire_grace'}
+
 class TaskScheduler:
     def __init__(self):
         jobstores = {
@@ -18,106 +289,565 @@ class TaskScheduler:
             jobstores=jobstores,
             timezone='UTC'
         )
+        self.scheduler.add_listener(self._on_job_missed, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+        
+        # Catch-up runs for missed fires, released by a token bucket
+        self._catchup_queue = queue.Queue()
+        self._catchup_pending = set()
+        self._catchup_lock = threading.Lock()
+        self._catchup_bucket = TokenBucket(CATCHUP_RATE, CATCHUP_BURST)
+        self._catchup_thread = None
+        self._stopping = threading.Event()
+        
+        self.dispatcher = Dispatcher(DISPATCH_WORKERS)
+        
+        # Queued and running runs, so they can be listed and cancelled
+        self.runs = RunRegistry()
+        
+        # Failure and recovery notifications, sent from a background thread
+        self.alerts = AlertManager()
+        
+        self._fork_server = None
+        
+        # Warm workers for Python callable tasks, started on first use
+        self._python_pool = None
+        self._python_pool_lock = threading.Lock()
+        
+        # Keep-alive HTTP client for HTTP tasks, started on first use
+        self._http = None
+        self._http_lock = threading.Lock()
+        
+        # Dependency graph, reloaded whenever dependencies change
+        self._graph_lock = threading.Lock()
+        self._edges = []
+        self._upstream = {}
+        self._downstream = {}
         
     def start(self):
         """Start the scheduler"""
+        self._stopping.clear()
+        self._catchup_thread = threading.Thread(target=self._run_catchup, name="catch-up", daemon=True)
+        self._catchup_thread.start()
+        
+        if FORK_SERVER_SOCKET:
+            try:
+                fork_server = ForkServer(FORK_SERVER_SOCKET)
+                fork_server.start()
+                self._fork_server = fork_server
+            except (OSError, RuntimeError, AttributeError) as e:
+                # AttributeError: no Unix sockets on this platform
+                logger.warning(f"Fork server unavailable ({e}); starting commands directly")
+        
+        self.alerts.start()
+        self.dispatcher.start()
         self.scheduler.start()
         logger.info("Scheduler started")
         
+        interrupted = interrupt_dag_runs()
+        if interrupted:
+            logger.warning(f"Marked {interrupted} unfinished DAG run(s) as interrupted")
+        
         # Load existing tasks from database
+        self._load_dependencies()
         self._load_existing_tasks()
     
     def shutdown(self):
         """Shutdown the scheduler"""
+        self._stopping.set()
         self.scheduler.shutdown()
+        self.dispatcher.shutdown()
+        if self._catchup_thread:
+            self._catchup_thread.join(timeout=5)
+        if self._python_pool:
+            self._python_pool.shutdown()
+        if self._http:
+            self._http.shutdown()
+        if self._fork_server:
+            self._fork_server.stop()
+        self.alerts.stop()
         logger.info("Scheduler shutdown")
     
     def _load_existing_tasks(self):
         """Load existing active tasks from database into scheduler"""
+        now = datetime.now(timezone.utc)
         tasks = get_all_tasks()
         for task in tasks:
             if task['status'] == 'active':
                 try:
+                    # next_run is stored after every run, so one in the past
+                    # means fires were missed while the service was down
+                    missed = []
+                    since = task['next_run']
+                    if since and since < now and not self._upstream.get(task['id']):
+                        trigger = build_trigger(task['schedule'], task)
+                        if task['last_run'] and task['last_run'] > since:
+                            # Rows written before next_run was kept current
+                            since = trigger.get_next_fire_time(None, task['last_run'])
+                        missed = missed_fire_times(trigger, since, now)
+                    
                     self._schedule_task(task)
                     logger.info(f"Loaded task: {task['task_name']}")
+                    
+                    if missed:
+                        logger.warning(f"Task {task['task_name']} missed {len(missed)} run(s) while the scheduler was down")
+                        self._handle_missed(task, missed, "Scheduler was not running")
                 except Exception as e:
                     logger.error(f"Failed to load task {task['id']}: {e}")
     
+    def _handle_missed(self, task, run_times, reason: str):
+        """Record missed fires and queue catch-up runs per the task's misfire policy"""
+        policy, grace = misfire_settings(task)
+        now = datetime.now(timezone.utc)
+        
+        catch_up = []
+        if policy == 'grace' and now - run_times[-1] <= timedelta(seconds=grace):
+            # Still within the grace window, so it runs late instead of being missed
+            catch_up, run_times = run_times[-1:], run_times[:-1]
+        elif policy == 'run_once':
+            catch_up = run_times[-1:]
+        elif policy == 'run_all':
+            catch_up = run_times
+        
+        log_missed_runs(task['id'], run_times, reason)
+        
+        coalesce = policy != 'run_all'
+        for run_time in catch_up:
+            with self._catchup_lock:
+                if coalesce and task['id'] in self._catchup_pending:
+                    continue
+                self._catchup_pending.add(task['id'])
+            self._catchup_queue.put((task['id'], run_time))
+    
+    def _on_job_missed(self, event):
+        """Handle fires APScheduler skipped as too late or overlapping"""
+        if not event.job_id.isdigit():
+            return  # Catch-up jobs never miss
+        task = get_task(int(event.job_id))
+        if not task:
+            return
+        
+        if event.code == EVENT_JOB_MAX_INSTANCES:
+            run_times, reason = event.scheduled_run_times, "Previous run was still in progress"
+        else:
+            run_times, reason = [event.scheduled_run_time], "Run started later than the misfire grace time"
+        self._record_missed(task, run_times, reason)
+    
+    def _record_missed(self, task, run_times, reason: str):
+        """Handle fires missed while the service was running"""
+        logger.warning(f"Task {task['task_name']} missed run at {run_times[-1].isoformat()}: {reason}")
+        try:
+            self._handle_missed(task, run_times, reason)
+            next_run = self._next_run_update(task['id'])
+            if next_run:
+                update_task(task['id'], next_run)
+        except Exception as e:
+            logger.error(f"Failed to record missed run of task {task['id']}: {e}")
+    
+    def _run_catchup(self):
+        """Submit queued catch-up runs to the executor as tokens allow"""
+        while not self._stopping.is_set():
+            try:
+                task_id, run_time = self._catchup_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if not self._catchup_bucket.acquire(stop=self._stopping):
+                break
+            
+            task = get_task(task_id)
+            if not task or task['status'] != 'active':
+                self._catchup_done(task_id)
+                continue
+            logger.info(f"Catching up task {task['task_name']} (missed run at {run_time.isoformat()})")
+            if not self._dispatch(task_id, self._execute_catchup, [task_id]):
+                self._catchup_done(task_id)
+    
+    def _execute_catchup(self, task_id: int):
+        """Run a catch-up; further misses coalesce into it until it finishes"""
+        try:
+            self._execute_task(task_id)
+        finally:
+            self._catchup_done(task_id)
+    
+    def _catchup_done(self, task_id: int):
+        with self._catchup_lock:
+            self._catchup_pending.discard(task_id)
+    
+    def _next_run_update(self, task_id: int) -> dict:
+        """Get the task update storing its job's next fire time, if it has one"""
+        job = self.scheduler.get_job(str(task_id))
+        if job and job.next_run_time:
+            return {'next_run': job.next_run_time}
+        return {}
+    
+    def _load_dependencies(self):
+        """Reload the dependency graph from the database"""
+        edges = get_dependency_edges()
+        upstream, downstream = build_graph(edges)
+        with self._graph_lock:
+            self._edges = edges
+            self._upstream = upstream
+            self._downstream = downstream
+    
+    def _set_dependencies(self, task_id: int, depends_on):
+        """Validate and store a task's upstream dependencies"""
+        depends_on = sorted(set(depends_on))
+        for upstream_id in depends_on:
+            if not get_task(upstream_id):
+                raise ValueError(f"Upstream task {upstream_id} not found")
+        with self._graph_lock:
+            check_dependencies(self._edges, task_id, depends_on)
+        set_dependencies(task_id, depends_on)
+        self._load_dependencies()
+    
     def _schedule_task(self, task):
         """Schedule a task with APScheduler"""
+        if self._upstream.get(task['id']):
+            # Runs when its upstream tasks succeed, not on its own schedule
+            try:
+                self.scheduler.remove_job(str(task['id']))
+            except Exception:
+                pass
+            if task['next_run'] is not None:
+                update_task(task['id'], {'next_run': None})
+            return
+        
         try:
             # Create cron trigger from expression
-            trigger = CronTrigger.from_crontab(task['schedule'])
+            trigger = build_trigger(task['schedule'], task)
             
             # Add job to scheduler
             self.scheduler.add_job(
-                func=self._execute_task,
+                func=self._dispatch_scheduled,
                 trigger=trigger,
                 args=[task['id']],
                 id=str(task['id']),
                 name=task['task_name'],
-                replace_existing=True
+                replace_existing=True,
+                **job_misfire_options(task)
             )
             
+            if breaker_open(task):
+                # Stays paused until the breaker's cooldown ends
+                self._open_breaker(task['id'], task['breaker_open_until'])
+                return
+            
             # Update next run time in database
-            job = self.scheduler.get_job(str(task['id']))
-            if job and job.next_run_time:
-                update_task(task['id'], {'next_run': job.next_run_time})
+            next_run = self._next_run_update(task['id'])
+            if next_run:
+                update_task(task['id'], next_run)
                 
         except Exception as e:
             logger.error(f"Failed to schedule task {task['id']}: {e}")
             raise
     
-    def _execute_task(self, task_id: int):
-        """Execute a scheduled task"""
+    def _dispatch(self, task_id: int, func, args, kwargs=None, key=None) -> bool:
+        """Queue a call for one of a task's runs at the task's priority and weight"""
+        task = get_task(task_id) or {}
+        return self.dispatcher.submit(func, args, kwargs, priority=task.get('priority'),
+                                      weight=task.get('weight'), flow=task_id, key=key)
+    
+    def _dispatch_scheduled(self, task_id: int):
+        """Queue a scheduled run; the fire is missed if the last one is still queued or running"""
+        if self._dispatch(task_id, self._execute_task, [task_id], key=task_id) or self._stopping.is_set():
+            return
+        task = get_task(task_id)
+        if task:
+            self._record_missed(task, [datetime.now(timezone.utc)], "Previous run was still in progress")
+    
+    def _execute_task(self, task_id: int, attempt: int = 1, run_id: int = None):
+        """Execute a scheduled task, as the root of a DAG run if it has downstream tasks"""
+        if attempt == 1 and self._downstream.get(task_id):
+            self._start_dag_run(task_id, run_id)
+            return
+        
+        outcome, exit_code = self._run_task(task_id, attempt=attempt, run_id=run_id)
+        if outcome == 'failed':
+            self._schedule_retry(task_id, attempt, exit_code, self._execute_task, [task_id])
+    
+    def _run_task(self, task_id: int, dag_run_id: int = None, attempt: int = 1, run_id: int = None):
+        """Run a task's command and log the result
+        
+        Returns the outcome ('success', 'failed', 'cancelled' or 'skipped')
+        and the exit code, which is None when the command timed out or could
+        not run. run_id is the registry id of a manually queued run.
+        """
         task = get_task(task_id)
         if not task:
             logger.error(f"Task {task_id} not found")
-            return
+            self._finish_queued(run_id)
+            return 'skipped', None
+        if dag_run_id is not None and task['status'] != 'active':
+            log_task_execution(task_id, 'skipped', None, 'Task is paused', dag_run_id, attempt)
+            self._finish_queued(run_id)
+            return 'skipped', None
+        if breaker_open(task):
+            log_task_execution(task_id, 'skipped', None, 'Circuit breaker is open', dag_run_id, attempt)
+            self._finish_queued(run_id)
+            return 'skipped', None
+        
+        trigger = 'manual' if run_id is not None else 'dag' if dag_run_id is not None else (
+            'retry' if attempt > 1 else 'schedule')
+        active = self.runs.start(run_id, task_id, task['task_name'], trigger, attempt)
+        if active.cancel_requested:
+            self.runs.finish(active)
+            log_task_execution(task_id, 'cancelled', None, 'Task run was cancelled before it started',
+                               dag_run_id, attempt)
+            return 'cancelled', None
         
         logger.info(f"Executing task: {task['task_name']}")
         
+        exit_code = None
+        error = None
         try:
-            # Execute the command
-            result = subprocess.run(
-                task['command'],
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout
-            )
+            started = time.monotonic()
+            command_run = self._start_run(task)
+            self.runs.attach(active, command_run)
+            result = command_run.wait()
+            duration_ms = round((time.monotonic() - started) * 1000)
+            exit_code = None if result.timed_out else result.returncode
+            error = result.error
             
-            if result.returncode == 0:
+            if result.cancelled:
+                log_task_execution(task_id, 'cancelled', result.stdout, result.error, dag_run_id, attempt,
+                                   duration_ms)
+                logger.warning(f"Task {task['task_name']} was cancelled")
+                outcome = 'cancelled'
+            elif result.timed_out:
+                log_task_execution(task_id, 'failed', result.stdout, result.error, dag_run_id, attempt,
+                                   duration_ms)
+                logger.error(f"Task {task['task_name']} timed out")
+                outcome = 'failed'
+            elif result.returncode == 0:
                 # Success
-                log_task_execution(task_id, 'success', result.stdout)
+                log_task_execution(task_id, 'success', result.stdout, None, dag_run_id, attempt, duration_ms)
                 logger.info(f"Task {task['task_name']} completed successfully")
+                outcome = 'success'
             else:
                 # Failed
-                log_task_execution(task_id, 'failed', result.stdout, result.stderr)
+                log_task_execution(task_id, 'failed', result.stdout, result.error, dag_run_id, attempt,
+                                   duration_ms)
                 logger.error(f"Task {task['task_name']} failed with return code {result.returncode}")
+                outcome = 'failed'
             
-            # Update last run time
-            update_task(task_id, {'last_run': datetime.utcnow()})
-            
-        except subprocess.TimeoutExpired:
-            log_task_execution(task_id, 'failed', None, 'Task execution timed out')
-            logger.error(f"Task {task['task_name']} timed out")
         except Exception as e:
-            log_task_execution(task_id, 'failed', None, str(e))
+            error = str(e)
+            log_task_execution(task_id, 'failed', None, error, dag_run_id, attempt)
             logger.error(f"Task {task['task_name']} failed with exception: {e}")
+            outcome = 'failed'
+        finally:
+            self.runs.finish(active)
+        
+        self._record_outcome(task, outcome)
+        if outcome == 'failed':
+            self.alerts.failure(task, error or f"Exit code {exit_code}", attempt)
+        elif outcome == 'success' and task['consecutive_failures']:
+            self.alerts.recovery(task, task['consecutive_failures'])
+        return outcome, exit_code
+    
+    def _finish_queued(self, run_id: int = None):
+        """Drop a manually queued run that is skipped before it starts from the registry"""
+        queued = self.runs.get(run_id) if run_id is not None else None
+        if queued:
+            self.runs.finish(queued)
+    
+    def _start_run(self, task):
+        """Start a task's command, its callable for Python tasks or its request for HTTP tasks"""
+        limits = resource_limits(task)
+        if task.get('task_type') == 'python':
+            return self._python_workers().run(task['command'], limits.timeout)
+        if task.get('task_type') == 'http':
+            return self._http_client().run(HttpRequest.from_task(task, task.get('timeout_seconds')))
+        if self._fork_server:
+            try:
+                return self._fork_server.run(task['command'], limits)
+            except OSError as e:
+                logger.warning(f"Fork server unavailable ({e}); starting {task['task_name']} directly")
+        # Execute the command in its own process group with the task's limits
+        return CommandRun(task['command'], limits)
+    
+    def _python_workers(self) -> PythonWorkerPool:
+        with self._python_pool_lock:
+            if self._python_pool is None:
+                self._python_pool = PythonWorkerPool()
+                self._python_pool.start()
+            return self._python_pool
+    
+    def _http_client(self) -> HttpClient:
+        with self._http_lock:
+            if self._http is None:
+                self._http = HttpClient()
+                self._http.start()
+            return self._http
+    
+    def _record_outcome(self, task, outcome: str):
+        """Update last/next run times and the circuit breaker after a run"""
+        now = datetime.now(timezone.utc)
+        updates = {'last_run': now}
+        
+        if outcome == 'success':
+            if task['consecutive_failures'] or task['breaker_open_until']:
+                updates.update(consecutive_failures=0, breaker_open_until=None)
+                if task['breaker_open_until']:
+                    logger.info(f"Circuit breaker closed for task {task['task_name']}")
+        elif outcome == 'failed':
+            failures = (task['consecutive_failures'] or 0) + 1
+            updates['consecutive_failures'] = failures
+            threshold, cooldown = breaker_settings(task)
+            if threshold and failures >= threshold:
+                until = now + timedelta(seconds=cooldown)
+                updates['breaker_open_until'] = until
+                logger.warning(f"Circuit breaker opened for task {task['task_name']} after {failures} "
+                               f"consecutive failures; paused until {until.isoformat()}")
+                self._open_breaker(task['id'], until)
+        
+        # next_run is kept current for downtime detection; None while paused
+        updates.update(self._next_run_update(task['id']) or {'next_run': None})
+        update_task(task['id'], updates)
+    
+    @traced('scheduler')
+    def trigger_task(self, task_id: int):
+        """Queue a run of a task now, outside its schedule; returns the queued run"""
+        task = get_task(task_id)
+        if not task:
+            return None
+        run = self.runs.queue(task_id, task['task_name'])
+        if not self._dispatch(task_id, self._execute_task, [task_id], {'run_id': run.run_id}):
+            self.runs.finish(run)
+            raise RuntimeError("Scheduler is shutting down")
+        logger.info(f"Queued manual run {run.run_id} of task {task['task_name']}")
+        return run
+    
+    def cancel_running(self, task_id: int) -> int:
+        """Cancel a task's queued and running runs; returns how many"""
+        runs = self.runs.list(task_id=task_id)
+        for run in runs:
+            self.runs.cancel(run.run_id)
+        return len(runs)
+    
+    def _open_breaker(self, task_id: int, until: datetime):
+        """Pause a task's job until its breaker cooldown ends"""
+        try:
+            self.scheduler.pause_job(str(task_id))
+        except JobLookupError:
+            pass  # Tasks with upstream dependencies have no job of their own
+        self.scheduler.add_job(
+            func=self._half_open_breaker,
+            trigger='date',
+            run_date=until,
+            args=[task_id],
+            id=f"breaker-{task_id}",
+            name=f"Circuit breaker cooldown for task {task_id}",
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+    
+    def _half_open_breaker(self, task_id: int):
+        """Resume a task after its breaker cooldown; its next run is the trial"""
+        task = get_task(task_id)
+        if not task or task['status'] != 'active':
+            return
+        logger.info(f"Circuit breaker half-open for task {task['task_name']}: allowing a trial run")
+        try:
+            self.scheduler.resume_job(str(task_id))
+        except JobLookupError:
+            return
+        next_run = self._next_run_update(task_id)
+        if next_run:
+            update_task(task_id, next_run)
+    
+    def _schedule_retry(self, task_id: int, attempt: int, exit_code, func, args) -> bool:
+        """Schedule a one-shot retry of a failed attempt if the task's policy allows it"""
+        task = get_task(task_id)
+        if not task or task['status'] != 'active' or breaker_open(task):
+            return False
+        max_attempts, backoff, exit_codes = retry_settings(task)
+        if attempt >= max_attempts:
+            return False
+        if exit_code is not None and exit_codes is not None and exit_code not in exit_codes:
+            return False
+        
+        delay = retry_delay(backoff, attempt)
+        self.scheduler.add_job(
+            func=self._dispatch,
+            trigger='date',
+            run_date=datetime.now(timezone.utc) + timedelta(seconds=delay),
+            args=[task_id, func, args, {'attempt': attempt + 1}],
+            name=f"{task['task_name']} (retry {attempt + 1} of {max_attempts})",
+            misfire_grace_time=None
+        )
+        logger.info(f"Retrying task {task['task_name']} in {delay:.1f}s (attempt {attempt + 1} of {max_attempts})")
+        return True
+    
+    def _start_dag_run(self, root_id: int, run_id: int = None):
+        """Run a task and, as they become ready, everything downstream of it"""
+        with self._graph_lock:
+            edges = self._edges
+        run = DagRun(create_dag_run(root_id), root_id, edges)
+        logger.info(f"Starting DAG run {run.run_id} from task {root_id} ({len(run.nodes)} tasks)")
+        
+        # The root runs in this worker; downstream tasks get one-shot jobs
+        self._run_dag_node(run, root_id, run_id=run_id)
     
-    def add_task(self, name: str, command: str, schedule: str, description: str = None) -> int:
-        """Add a new scheduled task"""
-        # Validate cron expression
+    def _run_dag_node(self, run: DagRun, task_id: int, attempt: int = 1, run_id: int = None):
+        """Run one task of a DAG run, then release the tasks waiting on it"""
+        if attempt == 1:
+            run.start(task_id)
         try:
-            cron_parts = schedule.split()
-            if len(cron_parts) != 5:
-                raise ValueError("Invalid cron expression. Expected 5 parts: minute hour day month day_of_week")
+            outcome, exit_code = self._run_task(task_id, run.run_id, attempt, run_id)
         except Exception as e:
-            raise ValueError(f"Invalid cron expression: {e}")
+            logger.error(f"Task {task_id} of DAG run {run.run_id} failed with exception: {e}")
+            outcome, exit_code = 'failed', None
+        
+        # A retried task stays running in the DAG until its final attempt
+        if outcome == 'failed' and self._schedule_retry(task_id, attempt, exit_code, self._run_dag_node, [run, task_id]):
+            return
+        ready, skipped, done = run.complete(task_id, outcome)
+        
+        for skipped_id in skipped:
+            log_task_execution(skipped_id, 'skipped', None, f"Upstream task {task_id} did not succeed", run.run_id)
+        
+        for ready_id in ready:
+            if not self._dispatch(ready_id, self._run_dag_node, [run, ready_id]):
+                logger.error(f"Failed to submit task {ready_id} of DAG run {run.run_id}")
+                self._fail_dag_node(run, ready_id, "Scheduler is shutting down")
+        
+        if done:
+            self._finish_dag_run(run)
+    
+    def _fail_dag_node(self, run: DagRun, task_id: int, error: str):
+        """Record a DAG task that could not be started"""
+        log_task_execution(task_id, 'failed', None, error, run.run_id)
+        run.start(task_id)
+        _, skipped, done = run.complete(task_id, 'failed')
+        for skipped_id in skipped:
+            log_task_execution(skipped_id, 'skipped', None, f"Upstream task {task_id} did not succeed", run.run_id)
+        if done:
+            self._finish_dag_run(run)
+    
+    def _finish_dag_run(self, run: DagRun):
+        """Record a finished DAG run with its critical path"""
+        duration = time.monotonic() - run.created
+        critical_seconds, critical_path = run.critical_path()
+        tasks_run = len(run.started)
+        finish_dag_run(run.run_id, run.status, round(duration * 1000), round(critical_seconds * 1000),
+                       critical_path, tasks_run)
+        logger.info(f"DAG run {run.run_id} {run.status} in {duration:.2f}s "
+                    f"(critical path {critical_seconds:.2f}s through tasks {critical_path})")
+    
+    @traced('scheduler')
+    def add_task(self, name: str, command: str, schedule: str, description: str = None,
+                 depends_on=None, **options) -> int:
+        """Add a new scheduled task, with optional upstream dependencies and per-task settings (see database.TASK_OPTIONS)"""
+        self._validate_new_task(command, schedule, options)
+        
+        for upstream_id in depends_on or ():
+            if not get_task(upstream_id):
+                raise ValueError(f"Upstream task {upstream_id} not found")
         
         # Create task in database
-        task_id = create_task(name, command, schedule, description)
+        task_id = create_task(name, command, schedule, description, options)
+        if depends_on:
+            self._set_dependencies(task_id, depends_on)
         
         # Schedule the task
         task = get_task(task_id)
@@ -126,6 +856,56 @@ class TaskScheduler:
         logger.info(f"Added new task: {name}")
         return task_id
     
+    @traced('scheduler')
+    def add_tasks(self, tasks: list) -> list:
+        """Add many tasks, written in one transaction
+        
+        Each item has add_task()'s arguments as a dict ('name', 'command',
+        'schedule', optional 'description', 'depends_on' and 'options').
+        Returns {'id': task_id} or {'error': message} per item, in order.
+        """
+        results = [None] * len(tasks)
+        valid = []
+        for index, item in enumerate(tasks):
+            if item.get('depends_on'):
+                continue  # Added one by one below, once their upstreams may exist
+            try:
+                self._validate_new_task(item['command'], item['schedule'], item.get('options') or {})
+                valid.append(index)
+            except ValueError as e:
+                results[index] = {'error': str(e)}
+        
+        task_ids = create_tasks([{'task_name': tasks[index]['name'], 'command': tasks[index]['command'],
+                                  'schedule': tasks[index]['schedule'],
+                                  'description': tasks[index].get('description'),
+                                  'options': tasks[index].get('options')} for index in valid])
+        for index, task_id in zip(valid, task_ids):
+            self._schedule_task(get_task(task_id))
+            results[index] = {'id': task_id}
+        
+        for index, item in enumerate(tasks):
+            if results[index] is None:
+                try:
+                    results[index] = {'id': self.add_task(item['name'], item['command'], item['schedule'],
+                                                          item.get('description'), item['depends_on'],
+                                                          **(item.get('options') or {}))}
+                except ValueError as e:
+                    results[index] = {'error': str(e)}
+        
+        logger.info(f"Added {len(task_ids)} task(s) in bulk")
+        return results
+    
+    def _validate_new_task(self, command: str, schedule: str, options: dict):
+        validate_schedule(schedule)
+        validate_spread(options.get('spread_mode'), options.get('spread_window'))
+        validate_misfire(options.get('misfire_policy'), options.get('misfire_grace'))
+        validate_retry(options)
+        validate_limits(options)
+        validate_priority(options.get('priority'), options.get('weight'))
+        validate_http_options(options)
+        validate_task_type(options.get('task_type'), command)
+    
+    @traced('scheduler')
     def remove_task(self, task_id: int) -> bool:
         """Remove a scheduled task"""
         # Remove from scheduler
@@ -135,24 +915,86 @@ class TaskScheduler:
             pass  # Job might not exist in scheduler
         
         # Remove from database
+        downstream = self._downstream.get(task_id, set())
         success = delete_task(task_id)
         if success:
             logger.info(f"Removed task: {task_id}")
+            self._load_dependencies()
+            
+            # Downstream tasks left without upstreams go back on their own schedule
+            for downstream_id in downstream:
+                task = get_task(downstream_id)
+                if task and task['status'] == 'active' and not self._upstream.get(downstream_id):
+                    self._schedule_task(task)
         
         return success
     
+    @traced('scheduler')
+    def remove_tasks(self, task_ids: list) -> list:
+        """Remove many tasks in one transaction; returns the ids that existed"""
+        for task_id in task_ids:
+            try:
+                self.scheduler.remove_job(str(task_id))
+            except JobLookupError:
+                pass
+        
+        downstream = set()
+        for task_id in task_ids:
+            downstream |= self._downstream.get(task_id, set())
+        deleted = delete_tasks(task_ids)
+        if deleted:
+            logger.info(f"Removed {len(deleted)} task(s) in bulk")
+            self._load_dependencies()
+            for downstream_id in downstream - set(deleted):
+                task = get_task(downstream_id)
+                if task and task['status'] == 'active' and not self._upstream.get(downstream_id):
+                    self._schedule_task(task)
+        
+        return deleted
+    
+    @traced('scheduler')
     def update_task(self, task_id: int, updates: dict):
         """Update an existing task"""
+        if 'schedule' in updates:
+            validate_schedule(updates['schedule'])
+        validate_spread(updates.get('spread_mode'), updates.get('spread_window'))
+        validate_misfire(updates.get('misfire_policy'), updates.get('misfire_grace'))
+        validate_retry(updates)
+        validate_limits(updates)
+        validate_priority(updates.get('priority'), updates.get('weight'))
+        validate_http_options(updates)
+        if 'task_type' in updates or 'command' in updates:
+            current = get_task(task_id) or {}
+            validate_task_type(updates.get('task_type', current.get('task_type')),
+                               updates.get('command', current.get('command')))
+        
+        updates = dict(updates)
+        depends_on = updates.pop('depends_on', None)
+        if 'status' in updates:
+            # Pausing or resuming by hand resets the circuit breaker
+            updates.update(consecutive_failures=0, breaker_open_until=None)
+            try:
+                self.scheduler.remove_job(f"breaker-{task_id}")
+            except JobLookupError:
+                pass
+        if depends_on is not None:
+            if not get_task(task_id):
+                return None
+            self._set_dependencies(task_id, depends_on)
+        
         # Update in database
-        success = update_task(task_id, updates)
-        if not success:
-            return None
+        if updates:
+            success = update_task(task_id, updates)
+            if not success:
+                return None
         
         # Get updated task
         task = get_task(task_id)
+        if not task:
+            return None
         
-        # If schedule, command or status changed, reschedule the job
-        if 'schedule' in updates or 'status' in updates or 'command' in updates:
+        # If schedule, command, status, spreading or dependencies changed, reschedule the job
+        if RESCHEDULE_FIELDS.intersection(updates) or depends_on is not None:
             try:
                 self.scheduler.remove_job(str(task_id))
             except:
@@ -164,13 +1006,35 @@ class TaskScheduler:
         logger.info(f"Updated task: {task_id}")
         return task
     
+    @traced('scheduler')
     def get_task(self, task_id: int):
         """Get task details"""
         return get_task(task_id)
     
+    @traced('scheduler')
     def get_task_history(self, task_id: int):
         """Get task execution history"""
         task = get_task(task_id)
         if not task:
             return None
-        return get_task_history(task_id)
\ No newline at end of file
+        return get_task_history(task_id)
+    
+    @traced('scheduler')
+    def get_dependencies(self, task_id: int):
+        """Get a task's upstream and downstream task ids"""
+        with self._graph_lock:
+            return {
+                "task_id": task_id,
+                "depends_on": sorted(self._upstream.get(task_id, ())),
+                "downstream": sorted(self._downstream.get(task_id, ())),
+            }
+    
+    @traced('scheduler')
+    def get_task_history_rows(self, task_id: int, limit: int = 50, before=None):
+        """Get task execution history as column names plus raw rows, optionally only runs older than before"""
+        task = get_task(task_id)
+        if not task:
+            return None
+        if before is not None:
+            return get_task_history_page_rows(task_id, before, limit)
+        return get_task_history_rows(task_id, limit)
\ No newline at end of file
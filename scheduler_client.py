@@ -0,0 +1,313 @@
+"""
+Python client for the scheduler API
+
+SchedulerClient (blocking) and AsyncSchedulerClient (asyncio) keep one
+pooled HTTP session, so scripts reuse kept-alive connections instead of
+opening one per call:
+
+    with SchedulerClient() as client:
+        results = client.bulk_create(
+            {'task_name': f"ping-{n}", 'command': 'true', 'schedule': '*/5 * * * *'} for n in range(20000))
+        for task in client.stream_tasks():
+            ...
+
+- requests that fail to connect are retried, as are idempotent requests
+  (GET, PUT, DELETE) answered with 502/503/504 or cut off, with
+  exponential backoff
+- iter_tasks() and iter_history() page through GET /tasks and
+  GET /tasks/{id}/history by following their Link headers
+- stream_tasks() and stream_history() read the NDJSON form of the same
+  endpoints row by row, without holding the whole listing
+- bulk_create() and bulk_delete() send any number of tasks in batches of
+  up to BULK_BATCH_SIZE, each written in one transaction
+
+Errors from the API raise SchedulerAPIError with the status and detail.
+Base URL: SCHEDULER_URL (default http://localhost:8001).
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import httpx
+
+BASE_URL = os.environ.get('SCHEDULER_URL', 'http://localhost:8001')
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 0.5
+RETRY_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+MAX_CONNECTIONS = 10
+
+PAGE_SIZE = 1000  # Rows per page for iter_tasks() and iter_history()
+BULK_BATCH_SIZE = 1000  # Tasks per bulk request; the server takes up to 10000
+
+NDJSON = 'application/x-ndjson'
+
+
+class SchedulerAPIError(Exception):
+    """The API answered with an error status"""
+
+    def __init__(self, status_code: int, detail):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _retry_delay(attempt: int) -> float:
+    return RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+
+
+def _should_retry(method: str, response: httpx.Response = None, error: Exception = None) -> bool:
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True  # Nothing was sent
+    if method not in IDEMPOTENT_METHODS:
+        return False
+    if error is not None:
+        return isinstance(error, httpx.TransportError)
+    return response.status_code in RETRY_STATUSES
+
+
+def _check(response: httpx.Response):
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get('detail', response.text)
+        except (ValueError, AttributeError):
+            detail = response.text
+        raise SchedulerAPIError(response.status_code, detail)
+
+
+def _next_url(response: httpx.Response) -> Optional[str]:
+    return response.links.get('next', {}).get('url')
+
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _merge_deleted(total: Dict, result: Dict):
+    total['deleted'].extend(result['deleted'])
+    total['not_found'].extend(result['not_found'])
+
+
+class SchedulerClient:
+    """Blocking client on a pooled keep-alive session; pass http= to use a ready httpx.Client"""
+
+    def __init__(self, base_url: str = BASE_URL, timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 max_connections: int = MAX_CONNECTIONS, http: httpx.Client = None):
+        self.retries = retries
+        self._http = http or httpx.Client(base_url=base_url, timeout=timeout,
+                                          limits=httpx.Limits(max_connections=max_connections,
+                                                              max_keepalive_connections=max_connections))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._http.close()
+
+    def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request with retries; returns the response whatever its status"""
+        for attempt in itertools.count(1):
+            try:
+                response = self._http.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if attempt > self.retries or not _should_retry(method, error=e):
+                    raise
+            else:
+                if attempt > self.retries or not _should_retry(method, response):
+                    return response
+            time.sleep(_retry_delay(attempt))
+
+    def _call(self, method: str, path: str, **kwargs):
+        response = self.request(method, path, **kwargs)
+        _check(response)
+        return response.json()
+
+    def create_task(self, task: Dict) -> Dict:
+        return self._call('POST', '/tasks', json=task)
+
+    def get_task(self, task_id: int) -> Dict:
+        return self._call('GET', f'/tasks/{task_id}')
+
+    def update_task(self, task_id: int, updates: Dict) -> Dict:
+        return self._call('PUT', f'/tasks/{task_id}', json=updates)
+
+    def delete_task(self, task_id: int) -> Dict:
+        return self._call('DELETE', f'/tasks/{task_id}')
+
+    def run_task(self, task_id: int) -> Dict:
+        return self._call('POST', f'/tasks/{task_id}/run')
+
+    def cancel_run(self, run_id: int) -> Dict:
+        return self._call('POST', f'/runs/{run_id}/cancel')
+
+    def list_tasks(self) -> List[Dict]:
+        return self._call('GET', '/tasks')
+
+    def iter_tasks(self, page_size: int = PAGE_SIZE) -> Iterator[Dict]:
+        """Every task in id order, fetched a page at a time"""
+        yield from self._pages(f'/tasks?limit={page_size}')
+
+    def iter_history(self, task_id: int, page_size: int = PAGE_SIZE) -> Iterator[Dict]:
+        """A task's executions, newest first, fetched a page at a time"""
+        yield from self._pages(f'/tasks/{task_id}/history?limit={page_size}')
+
+    def _pages(self, url: str) -> Iterator[Dict]:
+        while url:
+            response = self.request('GET', url)
+            _check(response)
+            yield from response.json()
+            url = _next_url(response)
+
+    def stream_tasks(self) -> Iterator[Dict]:
+        """Every task in id order, read from an NDJSON stream"""
+        yield from self._stream('/tasks')
+
+    def stream_history(self, task_id: int) -> Iterator[Dict]:
+        """A task's executions, newest first, read from an NDJSON stream"""
+        yield from self._stream(f'/tasks/{task_id}/history')
+
+    def _stream(self, path: str) -> Iterator[Dict]:
+        with self._http.stream('GET', path, headers={'Accept': NDJSON}) as response:
+            if response.status_code >= 400:
+                response.read()
+                _check(response)
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def bulk_create(self, tasks: Iterable[Dict], batch_size: int = BULK_BATCH_SIZE) -> List[Dict]:
+        """Create tasks in batches; returns {'id': ...} or {'error': ...} per task, in order"""
+        results = []
+        for batch in _batches(tasks, batch_size):
+            results.extend(self._call('POST', '/tasks/bulk', json=batch)['results'])
+        return results
+
+    def bulk_delete(self, task_ids: Iterable[int], batch_size: int = BULK_BATCH_SIZE) -> Dict:
+        """Delete tasks in batches; returns the 'deleted' and 'not_found' ids"""
+        total = {'deleted': [], 'not_found': []}
+        for batch in _batches(task_ids, batch_size):
+            _merge_deleted(total, self._call('POST', '/tasks/bulk-delete', json={'ids': batch}))
+        return total
+
+
+class AsyncSchedulerClient:
+    """asyncio client on a pooled keep-alive session; pass http= to use a ready httpx.AsyncClient"""
+
+    def __init__(self, base_url: str = BASE_URL, timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 max_connections: int = MAX_CONNECTIONS, http: httpx.AsyncClient = None):
+        self.retries = retries
+        self._http = http or httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                               limits=httpx.Limits(max_connections=max_connections,
+                                                                   max_keepalive_connections=max_connections))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._http.aclose()
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request with retries; returns the response whatever its status"""
+        for attempt in itertools.count(1):
+            try:
+                response = await self._http.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if attempt > self.retries or not _should_retry(method, error=e):
+                    raise
+            else:
+                if attempt > self.retries or not _should_retry(method, response):
+                    return response
+            await asyncio.sleep(_retry_delay(attempt))
+
+    async def _call(self, method: str, path: str, **kwargs):
+        response = await self.request(method, path, **kwargs)
+        _check(response)
+        return response.json()
+
+    async def create_task(self, task: Dict) -> Dict:
+        return await self._call('POST', '/tasks', json=task)
+
+    async def get_task(self, task_id: int) -> Dict:
+        return await self._call('GET', f'/tasks/{task_id}')
+
+    async def update_task(self, task_id: int, updates: Dict) -> Dict:
+        return await self._call('PUT', f'/tasks/{task_id}', json=updates)
+
+    async def delete_task(self, task_id: int) -> Dict:
+        return await self._call('DELETE', f'/tasks/{task_id}')
+
+    async def run_task(self, task_id: int) -> Dict:
+        return await self._call('POST', f'/tasks/{task_id}/run')
+
+    async def cancel_run(self, run_id: int) -> Dict:
+        return await self._call('POST', f'/runs/{run_id}/cancel')
+
+    async def list_tasks(self) -> List[Dict]:
+        return await self._call('GET', '/tasks')
+
+    async def iter_tasks(self, page_size: int = PAGE_SIZE):
+        """Every task in id order, fetched a page at a time"""
+        async for task in self._pages(f'/tasks?limit={page_size}'):
+            yield task
+
+    async def iter_history(self, task_id: int, page_size: int = PAGE_SIZE):
+        """A task's executions, newest first, fetched a page at a time"""
+        async for execution in self._pages(f'/tasks/{task_id}/history?limit={page_size}'):
+            yield execution
+
+    async def _pages(self, url: str):
+        while url:
+            response = await self.request('GET', url)
+            _check(response)
+            for row in response.json():
+                yield row
+            url = _next_url(response)
+
+    async def stream_tasks(self):
+        """Every task in id order, read from an NDJSON stream"""
+        async for task in self._stream('/tasks'):
+            yield task
+
+    async def stream_history(self, task_id: int):
+        """A task's executions, newest first, read from an NDJSON stream"""
+        async for execution in self._stream(f'/tasks/{task_id}/history'):
+            yield execution
+
+    async def _stream(self, path: str):
+        async with self._http.stream('GET', path, headers={'Accept': NDJSON}) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                _check(response)
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def bulk_create(self, tasks: Iterable[Dict], batch_size: int = BULK_BATCH_SIZE) -> List[Dict]:
+        """Create tasks in batches; returns {'id': ...} or {'error': ...} per task, in order"""
+        results = []
+        for batch in _batches(tasks, batch_size):
+            results.extend((await self._call('POST', '/tasks/bulk', json=batch))['results'])
+        return results
+
+    async def bulk_delete(self, task_ids: Iterable[int], batch_size: int = BULK_BATCH_SIZE) -> Dict:
+        """Delete tasks in batches; returns the 'deleted' and 'not_found' ids"""
+        total = {'deleted': [], 'not_found': []}
+        for batch in _batches(task_ids, batch_size):
+            _merge_deleted(total, await self._call('POST', '/tasks/bulk-delete', json={'ids': batch}))
+        return total
@@ -0,0 +1,130 @@
+"""
+Fast-path JSON serialization for task and history responses
+
+Rows are encoded straight from sqlite3 row tuples to bytes, skipping the
+per-field walk of FastAPI's jsonable_encoder. Large listings can also be
+streamed as NDJSON, one object per line, read from the database in pages.
+"""
+
+import json
+import os
+from datetime import date, datetime
+from json.encoder import encode_basestring
+from typing import Callable, Sequence, Tuple
+
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+# "auto" picks orjson when it is installed, otherwise the stdlib row encoder
+JSON_SERIALIZER = os.environ.get("JSON_SERIALIZER", "auto")
+
+
+class StdlibRowSerializer:
+    """Encode rows with pre-encoded keys and the C string escaper"""
+    name = "stdlib"
+
+    def dumps_rows(self, columns: Sequence[str], rows) -> bytes:
+        return ("[" + ",".join(self._encode_rows(columns, rows)) + "]").encode("utf-8")
+
+    def dumps_ndjson(self, columns: Sequence[str], rows) -> bytes:
+        return "".join([row + "\n" for row in self._encode_rows(columns, rows)]).encode("utf-8")
+
+    def _encode_rows(self, columns: Sequence[str], rows):
+        prefixes = [("{" if i == 0 else ",") + encode_basestring(column) + ":"
+                    for i, column in enumerate(columns)]
+        pairs = list(enumerate(prefixes))
+        encode = self._encode_value
+
+        parts = []
+        for row in rows:
+            parts.append("".join([prefix + encode(row[i]) for i, prefix in pairs]) + "}")
+        return parts
+
+    @staticmethod
+    def _encode_value(value) -> str:
+        if value is None:
+            return "null"
+        if isinstance(value, str):
+            return encode_basestring(value)
+        if value is True:
+            return "true"
+        if value is False:
+            return "false"
+        if isinstance(value, int):
+            return int.__repr__(value)
+        if isinstance(value, float):
+            return float.__repr__(value)
+        if isinstance(value, (datetime, date)):
+            return '"' + value.isoformat() + '"'
+        return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class OrjsonRowSerializer:
+    """Encode rows with orjson, which handles datetimes natively"""
+    name = "orjson"
+
+    def dumps_rows(self, columns: Sequence[str], rows) -> bytes:
+        # orjson has no tuple-with-keys type, so zip each row into a
+        # throwaway mapping that is consumed immediately by the C encoder
+        columns = tuple(columns)
+        return orjson.dumps([dict(zip(columns, row)) for row in rows])
+
+    def dumps_ndjson(self, columns: Sequence[str], rows) -> bytes:
+        columns = tuple(columns)
+        return b"".join([orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows])
+
+
+def get_serializer(name: str = None):
+    """Get a row serializer by name ('auto', 'orjson' or 'stdlib')"""
+    name = name or JSON_SERIALIZER
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        if orjson is None:
+            raise ValueError("orjson serializer requested but orjson is not installed")
+        return OrjsonRowSerializer()
+    if name in ("auto", "stdlib"):
+        return StdlibRowSerializer()
+    raise ValueError(f"Unknown JSON serializer: {name}")
+
+
+class RowsJSONResponse(Response):
+    """JSON response whose body is already encoded bytes"""
+    media_type = "application/json"
+
+
+serializer = get_serializer()
+
+
+def rows_response(columns: Sequence[str], rows, headers: dict = None) -> RowsJSONResponse:
+    """Build a JSON response straight from database rows"""
+    return RowsJSONResponse(content=serializer.dumps_rows(columns, rows), headers=headers)
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(accept: str) -> bool:
+    return NDJSON_MEDIA_TYPE in (accept or "")
+
+
+def ndjson_response(fetch_page: Callable[[object], Tuple[Sequence[str], list, object]],
+                    headers: dict = None) -> StreamingResponse:
+    """Stream rows as NDJSON, one page at a time
+
+    fetch_page(cursor) returns (columns, rows, next_cursor) and is called
+    with None first, then with each next_cursor until it is None. Pages are
+    fetched from the threadpool, so each uses that thread's connection.
+    """
+    def pages():
+        cursor = None
+        while True:
+            columns, rows, cursor = fetch_page(cursor)
+            if rows:
+                yield serializer.dumps_ndjson(columns, rows)
+            if cursor is None:
+                return
+
+    return StreamingResponse(pages(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
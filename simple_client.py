@@ -3,12 +3,17 @@
 Simple command-line client to manage scheduled tasks
 """
 
-import requests
+import httpx
 import json
 from datetime import datetime
 
+from scheduler_client import SchedulerClient
+
 BASE_URL = "http://localhost:8001"
 
+# One pooled session, so every call reuses the same connection
+client = SchedulerClient(BASE_URL)
+
 def print_header(title):
     print("\n" + "="*50)
     print(f"  {title}")
@@ -39,7 +44,7 @@ def create_task():
     }
     
     try:
-        response = requests.post(f"{BASE_URL}/tasks", json=task_data)
+        response = client.request("POST", "/tasks", json=task_data)
         if response.status_code == 200:
             result = response.json()
             print(f"\n✅ Task created successfully!")
@@ -56,7 +61,7 @@ def list_tasks():
     print_header("ALL SCHEDULED TASKS")
     
     try:
-        response = requests.get(f"{BASE_URL}/tasks")
+        response = client.request("GET", "/tasks")
         if response.status_code == 200:
             tasks = response.json()
             if not tasks:
@@ -85,7 +90,7 @@ def view_task_history():
     task_id = input("Enter Task ID: ")
     
     try:
-        response = requests.get(f"{BASE_URL}/tasks/{task_id}/history")
+        response = client.request("GET", f"/tasks/{task_id}/history")
         if response.status_code == 200:
             history = response.json()
             if not history:
@@ -117,7 +122,7 @@ def delete_task():
     
     if confirm.lower() == 'y':
         try:
-            response = requests.delete(f"{BASE_URL}/tasks/{task_id}")
+            response = client.request("DELETE", f"/tasks/{task_id}")
             if response.status_code == 200:
                 print(f"\n✅ Task {task_id} deleted successfully!")
             else:
@@ -160,6 +165,6 @@ if __name__ == "__main__":
         main_menu()
     except KeyboardInterrupt:
         print("\n\nExiting... 👋")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         print("❌ Could not connect to the task scheduler service.")
         print("   Make sure the server is running: python main.py")
\ No newline at end of file
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Deterministic simulation of the scheduler on a simulated clock
+
+Replays days of firing for many tasks in seconds, with the scheduler's own
+policy code and no waiting:
+
+- fire times come from the tasks' cron schedules with their load spreading
+  (spread_offset() for 'offset', a seeded random delay for 'jitter')
+- runs go through the real FairQueue (priority classes and weights) to a
+  fixed number of simulated workers; a fire while the task's previous run
+  is still queued or running is an overlap, as in _dispatch_scheduled()
+- overlaps and fires during downtime are handled like _handle_missed():
+  recorded as missed and/or replayed per the misfire policy, with catch-up
+  runs released through the real TokenBucket
+- shutting down drops queued runs, as Dispatcher.shutdown() does
+
+Run durations come from a callable, so a simulation is fully determined by
+its tasks, settings and seed. The result lists every dispatch in order,
+every missed fire and overlap, and has a digest() to compare runs for
+regression checks. Cron times are in UTC here.
+
+APScheduler itself is not in the loop (its BackgroundScheduler only runs on
+wall-clock threads); the simulation stands in for its thread handing fires
+to the dispatcher on time.
+
+Usage: python simulation.py [tasks] [days] [--workers N] [--job-seconds S]
+                            [--spread-mode MODE --spread-window S]
+                            [--misfire-policy POLICY] [--downtime START_H:END_H]
+                            [--seed N] [--json]
+"""
+
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import random
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from apscheduler.triggers.cron import CronTrigger
+
+from dispatch import DEFAULT_PRIORITY, FairQueue, _Item
+from ratelimit import TokenBucket
+from scheduler import (CATCHUP_BURST, CATCHUP_RATE, DISPATCH_WORKERS, MAX_MISSED_RUNS, misfire_settings,
+                       spread_offset, spread_settings)
+
+# Event kinds, in the order they are handled when due at the same moment
+_FINISH, _SHUTDOWN, _RESTART, _FIRE, _CATCHUP = range(5)
+
+# Schedules given to the generated tasks of the command line, in turn
+SCHEDULE_MIX = ('0 * * * *', '0 */6 * * *', '0 0 * * *', '30 2 * * *', '0 9 * * 1-5')
+
+
+class SimClock:
+    """A clock that only moves when the simulation advances it"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@dataclass
+class Dispatch:
+    task_id: int
+    kind: str  # 'scheduled' or 'catchup'
+    fire_time: float  # Seconds from the simulation start
+    start: float
+    finish: float
+    priority: str
+    concurrent: bool = False  # Started while another run of the task was running
+
+    @property
+    def lag(self) -> float:
+        return self.start - self.fire_time
+
+
+@dataclass
+class Missed:
+    task_id: int
+    fire_time: float
+    reason: str  # 'overlap' or 'downtime'
+
+
+@dataclass
+class SimulationResult:
+    start: datetime
+    end: datetime
+    fires: int = 0
+    dispatches: List[Dispatch] = field(default_factory=list)
+    missed: List[Missed] = field(default_factory=list)
+    overlaps: List[Tuple[int, float]] = field(default_factory=list)  # (task_id, fire_time)
+    dropped: int = 0  # Queued runs dropped at shutdown
+    peak_queue: int = 0
+    peak_busy: int = 0
+
+    def summary(self) -> Dict:
+        scheduled = sorted(dispatch.lag for dispatch in self.dispatches if dispatch.kind == 'scheduled')
+        catchup = sorted(dispatch.lag for dispatch in self.dispatches if dispatch.kind == 'catchup')
+        return {
+            'fires': self.fires,
+            'dispatched': len(self.dispatches),
+            'catchup_runs': len(catchup),
+            'missed': len(self.missed),
+            'overlaps': len(self.overlaps),
+            'concurrent_runs': sum(dispatch.concurrent for dispatch in self.dispatches),
+            'dropped': self.dropped,
+            'peak_queue': self.peak_queue,
+            'peak_busy': self.peak_busy,
+            'lag_seconds': _lag_summary(scheduled),
+            'catchup_lag_seconds': _lag_summary(catchup),
+            'digest': self.digest(),
+        }
+
+    def digest(self) -> str:
+        """Hash of the dispatch order and missed fires, to tell whether two simulations behaved the same"""
+        digest = hashlib.sha256()
+        for dispatch in self.dispatches:
+            digest.update(f"{dispatch.task_id} {dispatch.kind} {dispatch.fire_time:.3f} "
+                          f"{dispatch.start:.3f}\n".encode())
+        for missed in self.missed:
+            digest.update(f"missed {missed.task_id} {missed.fire_time:.3f} {missed.reason}\n".encode())
+        return digest.hexdigest()[:16]
+
+
+def _lag_summary(lags: List[float]) -> Optional[Dict]:
+    if not lags:
+        return None
+    return {name: round(lags[min(len(lags) - 1, int(len(lags) * fraction))], 3)
+            for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))}
+
+
+def constant_duration(seconds: float) -> Callable:
+    return lambda task, fire_time: seconds
+
+
+class Simulation:
+    """Replay a set of tasks on a simulated clock
+
+    tasks are dicts like task rows: 'id' and 'schedule', plus any of the
+    spread_*, misfire_*, priority and weight options. duration(task,
+    fire_time) gives each run's length in seconds. downtime is a list of
+    (down, up) datetimes when the service is not running.
+    """
+
+    def __init__(self, tasks: Sequence[Dict], start: datetime, workers: int = DISPATCH_WORKERS,
+                 duration: Callable = constant_duration(1.0), downtime: Sequence[Tuple[datetime, datetime]] = (),
+                 seed: int = 0):
+        self.tasks = {task['id']: task for task in tasks}
+        self._spread = {}  # Task id -> (fixed offset, jitter window) in seconds
+        for task in tasks:
+            mode, window = spread_settings(task)
+            self._spread[task['id']] = (spread_offset(task['id'], mode, window), window if mode == 'jitter' else 0)
+        self.start = start
+        self.workers = max(1, workers)
+        self.duration = duration
+        self.downtime = [(down, up) for down, up in downtime]
+        self.rng = random.Random(seed)
+
+        self.clock = SimClock()
+        self._queue = FairQueue(self.clock)
+        self._queued = 0  # len(self._queue), which is slow to ask
+        self._events = []
+        self._seq = itertools.count()
+        self._idle = self.workers
+        self._in_flight = set()  # Tasks with a scheduled run queued or running
+        self._running: Dict[int, int] = {}
+        self._catchup_queue = deque()
+        self._catchup_pending = set()
+        self._catchup_bucket = TokenBucket(CATCHUP_RATE, CATCHUP_BURST, self.clock)
+        self._catchup_due = None
+        self._down = False
+        self._missed_while_down: Dict[int, deque] = {}
+
+    def _seconds(self, moment: datetime) -> float:
+        return (moment - self.start).total_seconds()
+
+    def _push(self, at: float, kind: int, *data):
+        heapq.heappush(self._events, (at, kind, next(self._seq), data))
+
+    def _fire_times(self, end: datetime) -> Dict[str, List[float]]:
+        """Plain cron fire times per distinct schedule, shared by all tasks with it"""
+        fires = {}
+        for schedule in {task['schedule'] for task in self.tasks.values()}:
+            trigger = CronTrigger.from_crontab(schedule, timezone='UTC')
+            times = []
+            fire_time = trigger.get_next_fire_time(None, self.start)
+            while fire_time is not None and fire_time < end:
+                times.append(self._seconds(fire_time))
+                fire_time = trigger.get_next_fire_time(fire_time, fire_time)
+            fires[schedule] = times
+        return fires
+
+    def _next_fire(self, task, base: List[float], index: int):
+        """Queue the task's fire for base[index], shifted by its spreading"""
+        if index >= len(base):
+            return
+        offset, jitter = self._spread[task['id']]
+        delay = self.rng.uniform(0, jitter) if jitter else offset
+        self._push(base[index] + delay, _FIRE, task['id'], index)
+
+    def run(self, until: datetime) -> SimulationResult:
+        """Simulate from the start up to until"""
+        result = SimulationResult(self.start, until)
+        horizon = self._seconds(until)
+        base_fires = self._fire_times(until)
+        for task in self.tasks.values():
+            self._next_fire(task, base_fires[task['schedule']], 0)
+        for down, up in self.downtime:
+            self._push(self._seconds(down), _SHUTDOWN)
+            self._push(self._seconds(up), _RESTART)
+
+        while self._events:
+            at, kind, _, data = heapq.heappop(self._events)
+            if at >= horizon and kind != _FINISH:
+                continue
+            self.clock.now = at
+            if kind == _FIRE:
+                task_id, index = data
+                task = self.tasks[task_id]
+                self._next_fire(task, base_fires[task['schedule']], index + 1)
+                result.fires += 1
+                self._fire(task, at, result)
+            elif kind == _FINISH:
+                self._finish(*data)
+            elif kind == _CATCHUP:
+                self._catchup_due = None
+                self._release_catchup()
+            elif kind == _SHUTDOWN:
+                self._shutdown(result)
+            elif kind == _RESTART:
+                self._restart(result)
+            if self._queued:
+                result.peak_queue = max(result.peak_queue, self._queued)
+                if self._idle:
+                    self._start_runs(result)
+        return result
+
+    def _fire(self, task, fire_time: float, result: SimulationResult):
+        task_id = task['id']
+        if self._down:
+            self._missed_while_down.setdefault(task_id, deque(maxlen=MAX_MISSED_RUNS)).append(fire_time)
+            return
+        if task_id in self._in_flight:
+            # Previous run still queued or running, as _dispatch_scheduled() finds it
+            result.overlaps.append((task_id, fire_time))
+            self._handle_missed(task, [fire_time], 'overlap', result)
+            return
+        self._in_flight.add(task_id)
+        self._enqueue(task, 'scheduled', fire_time)
+
+    def _enqueue(self, task, kind: str, fire_time: float):
+        self._queue.push(_Item(None, (kind, fire_time), {}, task['id'], None, self.clock.now),
+                         task.get('priority') or DEFAULT_PRIORITY, task.get('weight') or 1)
+        self._queued += 1
+
+    def _handle_missed(self, task, run_times: List[float], reason: str, result: SimulationResult):
+        """The misfire policy, as TaskScheduler._handle_missed() applies it"""
+        policy, grace = misfire_settings(task)
+        catch_up = []
+        if policy == 'grace' and self.clock.now - run_times[-1] <= grace:
+            catch_up, run_times = run_times[-1:], run_times[:-1]
+        elif policy == 'run_once':
+            catch_up = run_times[-1:]
+        elif policy == 'run_all':
+            catch_up = run_times
+
+        result.missed.extend(Missed(task['id'], run_time, reason) for run_time in run_times)
+        coalesce = policy != 'run_all'
+        for run_time in catch_up:
+            if coalesce and task['id'] in self._catchup_pending:
+                continue
+            self._catchup_pending.add(task['id'])
+            self._catchup_queue.append((task['id'], run_time))
+        self._release_catchup()
+
+    def _release_catchup(self):
+        """Hand queued catch-up runs to the dispatcher as the token bucket allows"""
+        while self._catchup_queue and not self._down:
+            if not self._catchup_bucket.try_acquire():
+                if self._catchup_due is None:
+                    self._catchup_due = self.clock.now + self._catchup_bucket.wait_time()
+                    self._push(self._catchup_due, _CATCHUP)
+                return
+            task_id, run_time = self._catchup_queue.popleft()
+            self._enqueue(self.tasks[task_id], 'catchup', run_time)
+
+    def _start_runs(self, result: SimulationResult):
+        while self._idle and self._queued:
+            item, priority = self._queue.pop()
+            self._queued -= 1
+            kind, fire_time = item.args
+            task = self.tasks[item.flow]
+            now = self.clock.now
+            finish = now + max(0.0, self.duration(task, self._from_seconds(fire_time)))
+            running = self._running.get(item.flow, 0)
+            result.dispatches.append(Dispatch(item.flow, kind, fire_time, now, finish, priority, running > 0))
+            self._running[item.flow] = running + 1
+            self._idle -= 1
+            self._push(finish, _FINISH, item.flow, kind)
+        result.peak_busy = max(result.peak_busy, self.workers - self._idle)
+
+    def _from_seconds(self, seconds: float) -> datetime:
+        return self.start + timedelta(seconds=seconds)
+
+    def _finish(self, task_id: int, kind: str):
+        self._idle += 1
+        self._running[task_id] -= 1
+        if kind == 'scheduled':
+            self._in_flight.discard(task_id)
+        else:
+            self._catchup_pending.discard(task_id)
+
+    def _shutdown(self, result: SimulationResult):
+        """Queued runs are dropped; running ones finish"""
+        self._down = True
+        while self._queued:
+            item, _ = self._queue.pop()
+            self._queued -= 1
+            result.dropped += 1
+            if item.args[0] == 'scheduled':
+                self._in_flight.discard(item.flow)
+        self._catchup_queue.clear()
+        self._catchup_pending.clear()
+
+    def _restart(self, result: SimulationResult):
+        """Handle the fires missed while down, in the order tasks are loaded (newest first)"""
+        self._down = False
+        missed, self._missed_while_down = self._missed_while_down, {}
+        for task_id in sorted(missed, reverse=True):
+            self._handle_missed(self.tasks[task_id], list(missed[task_id]), 'downtime', result)
+
+
+def generated_tasks(count: int, spread_mode: str = None, spread_window: int = None,
+                    misfire_policy: str = None) -> List[Dict]:
+    """Tasks cycling through SCHEDULE_MIX with the given settings"""
+    return [{'id': task_id, 'schedule': SCHEDULE_MIX[task_id % len(SCHEDULE_MIX)], 'spread_mode': spread_mode,
+             'spread_window': spread_window, 'misfire_policy': misfire_policy}
+            for task_id in range(1, count + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the scheduler on a simulated clock")
+    parser.add_argument('tasks', type=int, nargs='?', default=100000)
+    parser.add_argument('days', type=float, nargs='?', default=1)
+    parser.add_argument('--workers', type=int, default=DISPATCH_WORKERS)
+    parser.add_argument('--job-seconds', type=float, default=1.0)
+    parser.add_argument('--spread-mode', choices=('off', 'offset', 'jitter'))
+    parser.add_argument('--spread-window', type=int)
+    parser.add_argument('--misfire-policy', choices=('skip', 'run_once', 'run_all', 'grace'))
+    parser.add_argument('--downtime', help="Service down from START to END hours into the run, e.g. 2:3.5")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    start = datetime(2025, 1, 6, tzinfo=timezone.utc)  # A Monday
+    downtime = []
+    if args.downtime:
+        down, up = (float(hours) for hours in args.downtime.split(':'))
+        downtime.append((start + timedelta(hours=down), start + timedelta(hours=up)))
+    tasks = generated_tasks(args.tasks, args.spread_mode, args.spread_window, args.misfire_policy)
+    simulation = Simulation(tasks, start, args.workers, constant_duration(args.job_seconds), downtime, args.seed)
+
+    began = time.perf_counter()
+    result = simulation.run(start + timedelta(days=args.days))
+    elapsed = time.perf_counter() - began
+    summary = result.summary()
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{args.tasks} tasks over {args.days:g} day(s), {args.workers} workers, {args.job_seconds:g}s runs "
+          f"(simulated in {elapsed:.1f}s)\n")
+    for name, value in summary.items():
+        if isinstance(value, dict):
+            value = '  '.join(f"{key} {amount:g}s" for key, amount in value.items())
+        print(f"{name:<20} {value}")
+
+
+if __name__ == "__main__":
+    main()
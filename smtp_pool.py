@@ -0,0 +1,214 @@
+"""
+Pooled, persistent SMTP connections
+
+Opening an SMTP session costs a TCP connect plus EHLO, STARTTLS and AUTH
+round trips, which is most of the time it takes to send one message. The
+pool keeps up to `size` authenticated sessions open and sends each message
+over an idle one:
+
+- a session idle for longer than keepalive_seconds is checked with NOOP
+  before it is used, and one idle for longer than max_idle_seconds is
+  closed (servers drop idle clients after a few minutes)
+- a session is replaced after max_messages messages, as many providers cap
+  messages per connection
+- a send that fails because the connection broke is retried once on a
+  fresh session
+
+send_stream() writes a message to the DATA command chunk by chunk, for
+messages with large attachments that should not be built in memory.
+"""
+
+import contextlib
+import logging
+import smtplib
+import ssl
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _broken(error: Exception) -> bool:
+    """Whether an error means the session is unusable, not that the message was refused"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421  # Service closing the channel
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+def _rset(smtp: smtplib.SMTP):
+    try:
+        smtp.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
+
+
+def send_data_stream(smtp: smtplib.SMTP, from_addr: str, to_addrs: List[str],
+                     chunks: Iterable[bytes]) -> Dict[str, tuple]:
+    """Like SMTP.sendmail(), but the message comes from an iterable of
+    dot-stuffed, CRLF-terminated chunks; returns the refused recipients"""
+    smtp.ehlo_or_helo_if_needed()
+    code, response = smtp.mail(from_addr)
+    if code != 250:
+        _rset(smtp)
+        raise smtplib.SMTPSenderRefused(code, response, from_addr)
+    refused = {}
+    for address in to_addrs:
+        code, response = smtp.rcpt(address)
+        if code not in (250, 251):
+            refused[address] = (code, response)
+    if len(refused) == len(to_addrs):
+        _rset(smtp)
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, response = smtp.docmd('data')
+    if code != 354:
+        _rset(smtp)
+        raise smtplib.SMTPDataError(code, response)
+    for chunk in chunks:
+        smtp.send(chunk)
+    smtp.send(b'.\r\n')
+    code, response = smtp.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+    return refused
+
+
+class _Session:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.sent = 0
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+
+
+class SMTPPool:
+    """A bounded pool of authenticated SMTP sessions to one server"""
+
+    def __init__(self, host: str, port: int, username: str = None, password: str = None,
+                 use_tls: bool = True, size: int = 4, keepalive_seconds: float = 30,
+                 max_idle_seconds: float = 240, max_messages: int = 100, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = max(1, size)
+        self.keepalive_seconds = keepalive_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self._idle: List[_Session] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self.connections_opened = 0
+
+    def _open(self) -> _Session:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.use_tls:
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.connections_opened += 1
+        logger.debug(f"Opened SMTP session to {self.host}:{self.port}")
+        return _Session(smtp)
+
+    def _alive(self, session: _Session) -> bool:
+        idle = time.monotonic() - session.last_used
+        if idle > self.max_idle_seconds:
+            return False
+        if idle > self.keepalive_seconds:
+            try:
+                return session.smtp.noop()[0] == 250
+            except OSError:  # Includes smtplib.SMTPException
+                return False
+        return True
+
+    def _checkout(self, timeout: Optional[float], fresh: bool = False) -> _Session:
+        acquired = self._slots.acquire() if timeout is None else self._slots.acquire(timeout=timeout)
+        if not acquired:
+            raise TimeoutError("No SMTP session available")
+        try:
+            while True:
+                with self._lock:
+                    session = self._idle.pop() if self._idle and not fresh else None
+                if session is None:
+                    return self._open()
+                if self._alive(session):
+                    return session
+                session.close()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, session: _Session, reusable: bool):
+        try:
+            if reusable and session.sent < self.max_messages:
+                session.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(session)
+            else:
+                session.close()
+        finally:
+            self._slots.release()
+
+    @contextlib.contextmanager
+    def session(self, timeout: Optional[float] = None):
+        """Borrow an authenticated smtplib.SMTP, e.g. to send a batch over one session"""
+        session = self._checkout(timeout)
+        try:
+            yield session.smtp
+        except Exception as e:
+            self._checkin(session, not _broken(e))
+            raise
+        self._checkin(session, True)
+
+    def send_message(self, msg, from_addr: str = None, to_addrs=None, timeout: Optional[float] = None):
+        """Send an email.message.Message, retrying once on a fresh session if the connection broke"""
+        return self._send(lambda smtp: smtp.send_message(msg, from_addr, to_addrs), timeout)
+
+    def send_stream(self, from_addr: str, to_addrs: List[str], chunks: Callable[[], Iterable[bytes]],
+                    timeout: Optional[float] = None):
+        """Send a message written out by chunks(), called again if the send is retried"""
+        return self._send(lambda smtp: send_data_stream(smtp, from_addr, to_addrs, chunks()), timeout)
+
+    def _send(self, send: Callable[[smtplib.SMTP], Dict], timeout: Optional[float]):
+        for attempt in (1, 2):
+            session = self._checkout(timeout, fresh=attempt > 1)
+            try:
+                result = send(session.smtp)
+            except Exception as e:
+                if not _broken(e):
+                    # The message was refused; the session itself is still fine
+                    self._checkin(session, True)
+                    raise
+                self._checkin(session, False)
+                if attempt == 2:
+                    raise
+                logger.warning(f"SMTP session to {self.host} broke ({e}); retrying on a new one")
+                continue
+            session.sent += 1
+            self._checkin(session, True)
+            return result
+
+    def close(self):
+        """QUIT all idle sessions"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Local SMTP stand-in for trying email tasks without a real mail server
+
+Speaks enough SMTP for smtplib (EHLO/HELO, AUTH PLAIN/LOGIN accepting any
+credentials, MAIL, RCPT, DATA, RSET, NOOP, QUIT) and keeps what it
+receives in memory. There is no STARTTLS, so point clients at it with TLS
+off. `handshake_delay` adds a pause to the greeting and to AUTH to stand in
+for the TLS and authentication round trips of a real provider.
+
+Usage: python smtp_stub_server.py [port] [handshake_delay_seconds]
+"""
+
+import socketserver
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+DEFAULT_PORT = 8025
+
+
+@dataclass
+class ReceivedMessage:
+    sender: str
+    recipients: List[str]
+    data: bytes = field(repr=False)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        time.sleep(server.handshake_delay)
+        self.reply('220 localhost stub SMTP ready')
+        sender, recipients = None, []
+        with server.lock:
+            server.connections += 1
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode('utf-8', 'replace').strip().partition(' ')
+            command = command.upper()
+
+            if command == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250-AUTH PLAIN LOGIN')
+                self.reply('250 8BITMIME')
+            elif command == 'HELO':
+                self.reply('250 localhost')
+            elif command == 'AUTH':
+                time.sleep(server.handshake_delay)
+                mechanism, _, initial = argument.partition(' ')
+                if mechanism.upper() == 'LOGIN':
+                    for prompt in ('334 VXNlcm5hbWU6', '334 UGFzc3dvcmQ6'):
+                        self.reply(prompt)
+                        self.rfile.readline()
+                elif not initial:
+                    self.reply('334 ')
+                    self.rfile.readline()
+                self.reply('235 Authentication successful')
+            elif command == 'MAIL':
+                sender, recipients = argument.split(':', 1)[-1].strip().strip('<>').split('>')[0], []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipients.append(argument.split(':', 1)[-1].strip().strip('<>').split('>')[0])
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                with server.lock:
+                    server.messages.append(ReceivedMessage(sender, recipients, b''.join(lines)))
+                sender, recipients = None, []
+                self.reply('250 OK: queued')
+            elif command == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif command == 'NOOP':
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    """Threaded stub SMTP server; port 0 picks a free port"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, handshake_delay: float = 0.0):
+        super().__init__((host, port), _Handler)
+        self.handshake_delay = handshake_delay
+        self.messages: List[ReceivedMessage] = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name='stub-smtp', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    stub = StubSMTPServer(port=port, handshake_delay=delay)
+    print(f"📧 Stub SMTP server on 127.0.0.1:{stub.port} (no TLS). Ctrl+C to stop.")
+    stub.start()
+    try:
+        seen = 0
+        while True:
+            time.sleep(0.5)
+            with stub.lock:
+                new = stub.messages[seen:]
+            for message in new:
+                print(f"✉️  {message.sender} -> {', '.join(message.recipients)} ({len(message.data)} bytes)")
+            seen += len(new)
+    except KeyboardInterrupt:
+        stub.stop()
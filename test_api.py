@@ -3,12 +3,17 @@
 Test script to demonstrate the Scheduled Task Execution Service API
 """
 
-import requests
+import httpx
 import json
 import time
 
+from scheduler_client import SchedulerClient
+
 BASE_URL = "http://localhost:8001"
 
+# One pooled session, so every call reuses the same connection
+client = SchedulerClient(BASE_URL)
+
 def test_api():
     print("🚀 Testing Scheduled Task Execution Service API\n")
     
@@ -21,7 +26,7 @@ def test_api():
         "description": "Run system health check every 2 minutes"
     }
     
-    response = requests.post(f"{BASE_URL}/tasks", json=task_data)
+    response = client.request("POST", "/tasks", json=task_data)
     if response.status_code == 200:
         task = response.json()
         task_id = task['id']
@@ -34,7 +39,7 @@ def test_api():
     
     # Test 2: List all tasks
     print("\n2. Listing all tasks...")
-    response = requests.get(f"{BASE_URL}/tasks")
+    response = client.request("GET", "/tasks")
     if response.status_code == 200:
         tasks = response.json()
         print(f"✅ Found {len(tasks)} task(s)")
@@ -45,7 +50,7 @@ def test_api():
     
     # Test 3: Get specific task
     print(f"\n3. Getting task details for ID {task_id}...")
-    response = requests.get(f"{BASE_URL}/tasks/{task_id}")
+    response = client.request("GET", f"/tasks/{task_id}")
     if response.status_code == 200:
         task = response.json()
         print(f"✅ Task details retrieved:")
@@ -65,7 +70,7 @@ def test_api():
         "description": "Run daily database backup"
     }
     
-    response = requests.post(f"{BASE_URL}/tasks", json=backup_task)
+    response = client.request("POST", "/tasks", json=backup_task)
     if response.status_code == 200:
         backup_task_id = response.json()['id']
         print(f"✅ Backup task created! ID: {backup_task_id}")
@@ -78,7 +83,7 @@ def test_api():
         "description": "Updated: Run system health check every 2 minutes"
     }
     
-    response = requests.put(f"{BASE_URL}/tasks/{task_id}", json=update_data)
+    response = client.request("PUT", f"/tasks/{task_id}", json=update_data)
     if response.status_code == 200:
         print("✅ Task updated successfully!")
     else:
@@ -89,7 +94,7 @@ def test_api():
     print("   (The health check task should execute at least once)")
     time.sleep(180)  # Wait 3 minutes
     
-    response = requests.get(f"{BASE_URL}/tasks/{task_id}/history")
+    response = client.request("GET", f"/tasks/{task_id}/history")
     if response.status_code == 200:
         history = response.json()
         print(f"✅ Task execution history ({len(history)} executions):")
@@ -102,7 +107,7 @@ def test_api():
     
     # Test 7: Delete task
     print(f"\n7. Deleting task {task_id}...")
-    response = requests.delete(f"{BASE_URL}/tasks/{task_id}")
+    response = client.request("DELETE", f"/tasks/{task_id}")
     if response.status_code == 200:
         print("✅ Task deleted successfully!")
     else:
@@ -113,7 +118,7 @@ def test_api():
 if __name__ == "__main__":
     try:
         test_api()
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         print("❌ Could not connect to the API server.")
         print("   Make sure the server is running: python main.py")
     except KeyboardInterrupt:
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for dependency graphs and DAG runs, with stub node runners
+
+Runs with pytest, or directly: python test_dag.py
+"""
+
+from dag import DagRun, DependencyCycleError, check_dependencies
+
+# 1 fans out to 2 and 3, which both feed 4; 5 runs after 4. 6 is upstream
+# of 3 but not reachable from 1, so it is not part of runs rooted at 1.
+EDGES = [(2, 1), (3, 1), (4, 2), (4, 3), (5, 4), (3, 6)]
+
+
+def run_dag(run: DagRun, outcomes=None):
+    """Run a DAG like the scheduler does, with a stub runner per node
+
+    Every task released together is started as one wave. Returns the waves
+    and every task skipped.
+    """
+    outcomes = outcomes or {}
+    waves, skipped = [], []
+    ready = [run.root_id]
+    done = False
+    while ready:
+        waves.append(ready)
+        released = []
+        for task_id in ready:
+            run.start(task_id)
+        for task_id in ready:
+            now_ready, now_skipped, done = run.complete(task_id, outcomes.get(task_id, 'success'))
+            released += now_ready
+            skipped += now_skipped
+        ready = released
+    assert done
+    return waves, skipped
+
+
+def test_ready_sets_run_in_dependency_order():
+    run = DagRun(1, 1, EDGES)
+    assert run.nodes == {1, 2, 3, 4, 5}
+    waves, skipped = run_dag(run)
+    # 2 and 3 are released together; 4 only once both have succeeded
+    assert waves == [[1], [2, 3], [4], [5]]
+    assert skipped == []
+    assert run.status == 'success'
+
+
+def test_join_waits_for_every_upstream_task():
+    run = DagRun(1, 1, EDGES)
+    run.start(1)
+    assert run.complete(1, 'success') == ([2, 3], [], False)
+    run.start(2)
+    assert run.complete(2, 'success') == ([], [], False)
+    run.start(3)
+    assert run.complete(3, 'success') == ([4], [], False)
+
+
+def test_failure_skips_everything_downstream():
+    run = DagRun(1, 1, EDGES)
+    waves, skipped = run_dag(run, {2: 'failed'})
+    # 3 is independent of 2 and still runs; 4 and 5 are skipped
+    assert waves == [[1], [2, 3]]
+    assert sorted(skipped) == [4, 5]
+    assert run.states == {1: 'success', 2: 'failed', 3: 'success', 4: 'skipped', 5: 'skipped'}
+    assert run.status == 'failed'
+
+
+def test_paused_root_skips_the_whole_run():
+    run = DagRun(1, 1, EDGES)
+    waves, skipped = run_dag(run, {1: 'skipped'})
+    assert waves == [[1]]
+    assert sorted(skipped) == [2, 3, 4, 5]
+
+
+def test_cycles_are_rejected():
+    check_dependencies(EDGES, 6, [])
+    try:
+        check_dependencies(EDGES, 1, [5])
+    except DependencyCycleError as e:
+        assert 'cycle' in str(e)
+    else:
+        raise AssertionError("Expected a dependency cycle")
+    try:
+        check_dependencies(EDGES, 2, [2])
+    except DependencyCycleError:
+        pass
+    else:
+        raise AssertionError("Expected a self-dependency to be rejected")
+
+
+if __name__ == "__main__":
+    test_ready_sets_run_in_dependency_order()
+    test_join_waits_for_every_upstream_task()
+    test_failure_skips_everything_downstream()
+    test_paused_root_skips_the_whole_run()
+    test_cycles_are_rejected()
+    print("✅ DAG tests passed")
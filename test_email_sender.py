@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the email_sender.py command line against an empty database
+
+Runs with pytest, or directly: python test_email_sender.py
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_cli(workdir, *args):
+    """Run email_sender.py in workdir, where it creates its own tasks.db"""
+    env = {**os.environ, 'PYTHONPATH': REPO_DIR}
+    return subprocess.run([sys.executable, os.path.join(REPO_DIR, 'email_sender.py'), *args], cwd=workdir, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def queued_subjects(workdir):
+    with sqlite3.connect(os.path.join(workdir, 'tasks.db')) as conn:
+        return [row[0] for row in conn.execute('SELECT subject FROM email_outbox ORDER BY id')]
+
+
+def test_report_commands_on_empty_database():
+    with tempfile.TemporaryDirectory() as workdir:
+        for command in ('daily_report', 'weekly_summary'):
+            result = run_cli(workdir, command, '2024-01-08')
+            assert result.returncode == 0, result.stderr
+            assert 'Email queued' in result.stdout
+        assert len(queued_subjects(workdir)) == 2
+
+
+def test_alert_only_creates_the_outbox():
+    with tempfile.TemporaryDirectory() as workdir:
+        result = run_cli(workdir, 'alert', 'Disk', 'Disk is full')
+        assert result.returncode == 0, result.stderr
+        with sqlite3.connect(os.path.join(workdir, 'tasks.db')) as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert tables - {'sqlite_sequence'} == {'email_outbox'}
+        assert queued_subjects(workdir) == ['🚨 ALERT: Disk']
+
+
+if __name__ == "__main__":
+    test_report_commands_on_empty_database()
+    test_alert_only_creates_the_outbox()
+    print("✅ email_sender tests passed")
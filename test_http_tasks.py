@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for HTTP tasks against the local stub HTTP server
+
+Runs with pytest, or directly: python test_http_tasks.py
+"""
+
+from http_stub_server import StubHTTPServer
+from http_tasks import EXIT_REQUEST_FAILED, EXIT_UNEXPECTED_STATUS, HttpClient, HttpRequest
+
+
+def run_requests(keep_alive_header: bool, count: int = 5):
+    stub = StubHTTPServer(port=0, keep_alive_header=keep_alive_header)
+    stub.start()
+    client = HttpClient()
+    client.start()
+    try:
+        results = [client.run(HttpRequest(f"{stub.url}/hooks/{n}", 'POST', body=b'{}')).wait() for n in range(count)]
+        return results, stub.connections
+    finally:
+        client.shutdown()
+        stub.stop()
+
+
+def test_connections_are_reused():
+    results, connections = run_requests(keep_alive_header=False)
+    assert [result.returncode for result in results] == [0] * 5
+    assert connections == 1
+
+
+def test_connections_are_reused_with_explicit_keep_alive_header():
+    """HTTP/1.1 servers such as nginx send Connection: keep-alive; the connection is still reused"""
+    results, connections = run_requests(keep_alive_header=True)
+    assert [result.returncode for result in results] == [0] * 5
+    assert connections == 1
+
+
+def test_status_timeout_and_failure():
+    stub = StubHTTPServer(port=0)
+    stub.start()
+    client = HttpClient()
+    client.start()
+    try:
+        ok = client.run(HttpRequest(f"{stub.url}/status/204", expected_status='204')).wait()
+        assert ok.returncode == 0 and ok.stdout.startswith('HTTP 204')
+        unexpected = client.run(HttpRequest(f"{stub.url}/status/503")).wait()
+        assert unexpected.returncode == EXIT_UNEXPECTED_STATUS
+        timed_out = client.run(HttpRequest(f"{stub.url}/?delay=1", timeout=0.2)).wait()
+        assert timed_out.timed_out
+        refused = client.run(HttpRequest('http://127.0.0.1:1/')).wait()
+        assert refused.returncode == EXIT_REQUEST_FAILED
+    finally:
+        client.shutdown()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    test_connections_are_reused()
+    test_connections_are_reused_with_explicit_keep_alive_header()
+    test_status_timeout_and_failure()
+    print("✅ HTTP task tests passed")
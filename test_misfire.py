@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for the misfire policies and the rate-limited catch-up, on a simulated clock
+
+Runs with pytest, or directly: python test_misfire.py
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from ratelimit import TokenBucket
+from scheduler import CATCHUP_BURST, CATCHUP_RATE
+from simulation import Simulation, SimClock
+
+START = datetime(2025, 1, 6, tzinfo=timezone.utc)  # A Monday
+HOUR = 3600
+
+
+def simulate_downtime(policy: str, grace: int = None, tasks: int = 1, down=(0.5, 3.5)):
+    """Hourly tasks with the service down between the given hours; returns the result"""
+    simulation = Simulation(
+        [{'id': task_id, 'schedule': '0 * * * *', 'misfire_policy': policy, 'misfire_grace': grace}
+         for task_id in range(1, tasks + 1)],
+        START, workers=tasks, downtime=[(START + timedelta(hours=down[0]), START + timedelta(hours=down[1]))])
+    return simulation.run(START + timedelta(hours=6))
+
+
+def test_token_bucket_burst_then_rate():
+    clock = SimClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == 0.5
+    clock.now = 0.25
+    assert not bucket.try_acquire()
+    clock.now = 0.5
+    assert bucket.try_acquire()
+    # Refills never go over the capacity
+    clock.now = 100
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_skip_only_records_missed_fires():
+    result = simulate_downtime('skip')
+    assert [missed.fire_time for missed in result.missed] == [1 * HOUR, 2 * HOUR, 3 * HOUR]
+    assert {missed.reason for missed in result.missed} == {'downtime'}
+    assert [(dispatch.kind, dispatch.fire_time) for dispatch in result.dispatches] == [
+        ('scheduled', 0), ('scheduled', 4 * HOUR), ('scheduled', 5 * HOUR)]
+
+
+def test_run_once_catches_up_the_latest_fire():
+    result = simulate_downtime('run_once')
+    # Missed fires are recorded whether or not they are caught up
+    assert [missed.fire_time for missed in result.missed] == [1 * HOUR, 2 * HOUR, 3 * HOUR]
+    catchup = [dispatch for dispatch in result.dispatches if dispatch.kind == 'catchup']
+    assert [(dispatch.fire_time, dispatch.start) for dispatch in catchup] == [(3 * HOUR, 3.5 * HOUR)]
+    assert catchup[0].lag == 0.5 * HOUR
+
+
+def test_run_all_replays_every_fire():
+    result = simulate_downtime('run_all')
+    assert len(result.missed) == 3
+    catchup = [dispatch for dispatch in result.dispatches if dispatch.kind == 'catchup']
+    assert [dispatch.fire_time for dispatch in catchup] == [1 * HOUR, 2 * HOUR, 3 * HOUR]
+    # One worker: the replays run back to back from the restart
+    assert [dispatch.start for dispatch in catchup] == [3.5 * HOUR, 3.5 * HOUR + 1, 3.5 * HOUR + 2]
+    assert result.summary()['catchup_lag_seconds']['max'] == 2.5 * HOUR
+
+
+def test_grace_runs_the_latest_fire_only_within_the_window():
+    late = simulate_downtime('grace', grace=60)
+    assert len(late.missed) == 3
+    assert not [dispatch for dispatch in late.dispatches if dispatch.kind == 'catchup']
+
+    # A fire run late within the grace window is not recorded as missed
+    within = simulate_downtime('grace', grace=HOUR)
+    assert [missed.fire_time for missed in within.missed] == [1 * HOUR, 2 * HOUR]
+    assert [(dispatch.kind, dispatch.fire_time) for dispatch in within.dispatches if dispatch.kind == 'catchup'] == [
+        ('catchup', 3 * HOUR)]
+
+
+def test_catchup_is_released_at_the_bucket_rate():
+    tasks = CATCHUP_BURST + 3
+    result = simulate_downtime('run_once', tasks=tasks, down=(0.5, 1.5))
+    assert len(result.missed) == tasks
+    restart = 1.5 * HOUR
+    starts = sorted(dispatch.start for dispatch in result.dispatches if dispatch.kind == 'catchup')
+    expected = [restart] * CATCHUP_BURST + [restart + n / CATCHUP_RATE for n in range(1, tasks - CATCHUP_BURST + 1)]
+    assert len(starts) == tasks
+    assert all(abs(start - want) < 1e-6 for start, want in zip(starts, expected))
+
+
+if __name__ == "__main__":
+    test_token_bucket_burst_then_rate()
+    test_skip_only_records_missed_fires()
+    test_run_once_catches_up_the_latest_fire()
+    test_run_all_replays_every_fire()
+    test_grace_runs_the_latest_fire_only_within_the_window()
+    test_catchup_is_released_at_the_bucket_rate()
+    print("✅ Misfire tests passed")
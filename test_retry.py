@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for retries with backoff and the circuit breaker, on a scratch database
+
+Runs with pytest, or directly: python test_retry.py
+"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import database
+from scheduler import RETRY_MAX_DELAY_SECONDS, TaskScheduler, breaker_open, retry_delay
+
+# Never fires during a test, so only the runs started here happen
+YEARLY = '0 0 1 1 *'
+
+
+@contextmanager
+def scratch_scheduler():
+    """A started TaskScheduler on an empty database in a temporary directory"""
+    previous = database.DATABASE_FILE
+    with tempfile.TemporaryDirectory() as workdir:
+        database.DATABASE_FILE = os.path.join(workdir, 'tasks.db')
+        database.init_db()
+        scheduler = TaskScheduler()
+        scheduler.start()
+        try:
+            yield scheduler
+        finally:
+            scheduler.shutdown()
+            database.DATABASE_FILE = previous
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting"
+        time.sleep(0.05)
+
+
+def retry_jobs(scheduler):
+    return [job for job in scheduler.scheduler.get_jobs() if '(retry ' in job.name]
+
+
+def test_retry_delay_doubles_with_jitter_and_a_cap():
+    for attempt in range(1, 6):
+        delay = 10 * 2 ** (attempt - 1)
+        for _ in range(20):
+            assert delay / 2 <= retry_delay(10, attempt) <= delay
+    for _ in range(20):
+        assert RETRY_MAX_DELAY_SECONDS / 2 <= retry_delay(10, 30) <= RETRY_MAX_DELAY_SECONDS
+
+
+def test_failed_run_schedules_a_retry_after_the_backoff():
+    with scratch_scheduler() as scheduler:
+        task_id = scheduler.add_task('flaky', 'false', YEARLY, max_attempts=3, retry_backoff=60,
+                                     breaker_threshold=0)
+        before = datetime.now(timezone.utc)
+        scheduler._execute_task(task_id)
+        jobs = retry_jobs(scheduler)
+        assert [job.name for job in jobs] == ['flaky (retry 2 of 3)']
+        assert before + timedelta(seconds=30) <= jobs[0].next_run_time <= before + timedelta(seconds=61)
+
+        # The last attempt is not retried
+        scheduler.scheduler.remove_job(jobs[0].id)
+        scheduler._execute_task(task_id, attempt=3)
+        assert retry_jobs(scheduler) == []
+
+
+def test_only_listed_exit_codes_are_retried():
+    with scratch_scheduler() as scheduler:
+        task_id = scheduler.add_task('picky', 'exit 1', YEARLY, max_attempts=3, retry_exit_codes='75',
+                                     breaker_threshold=0)
+        scheduler._execute_task(task_id)
+        assert retry_jobs(scheduler) == []
+        assert database.get_task(task_id)['consecutive_failures'] == 1
+
+
+def test_breaker_opens_goes_half_open_and_closes():
+    with scratch_scheduler() as scheduler:
+        task_id = scheduler.add_task('broken', 'false', YEARLY, breaker_threshold=2, breaker_cooldown=1)
+        job = scheduler.scheduler.get_job(str(task_id))
+
+        assert scheduler._run_task(task_id) == ('failed', 1)
+        assert not breaker_open(database.get_task(task_id))
+        assert scheduler._run_task(task_id) == ('failed', 1)
+        task = database.get_task(task_id)
+        assert task['consecutive_failures'] == 2 and breaker_open(task)
+        assert scheduler.scheduler.get_job(job.id).next_run_time is None
+
+        # Open: runs are skipped without starting the command
+        assert scheduler._run_task(task_id) == ('skipped', None)
+        assert database.get_task(task_id)['consecutive_failures'] == 2
+
+        # Half-open after the cooldown: the job is resumed, a failed trial reopens it
+        wait_for(lambda: scheduler.scheduler.get_job(job.id).next_run_time is not None)
+        assert not breaker_open(database.get_task(task_id))
+        assert scheduler._run_task(task_id) == ('failed', 1)
+        assert breaker_open(database.get_task(task_id))
+        assert scheduler.scheduler.get_job(job.id).next_run_time is None
+
+        # A successful trial closes it
+        wait_for(lambda: scheduler.scheduler.get_job(job.id).next_run_time is not None)
+        database.update_task(task_id, {'command': 'true'})
+        assert scheduler._run_task(task_id) == ('success', 0)
+        task = database.get_task(task_id)
+        assert task['consecutive_failures'] == 0 and task['breaker_open_until'] is None
+
+
+if __name__ == "__main__":
+    test_retry_delay_doubles_with_jitter_and_a_cap()
+    test_failed_run_schedules_a_retry_after_the_backoff()
+    test_only_listed_exit_codes_are_retried()
+    test_breaker_opens_goes_half_open_and_closes()
+    print("✅ Retry and circuit breaker tests passed")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the SMTP pool against the local stub SMTP server
+
+Runs with pytest, or directly: python test_smtp_pool.py
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+from smtp_pool import SMTPPool
+from smtp_stub_server import StubSMTPServer
+
+SENDER = 'scheduler@example.com'
+
+
+def make_message(index):
+    msg = MIMEText(f"Message {index}")
+    msg['From'] = SENDER
+    msg['To'] = f"user{index}@example.com"
+    msg['Subject'] = f"Test {index}"
+    return msg
+
+
+def test_more_concurrent_sends_than_sessions():
+    """Sends beyond the pool size wait for a free session instead of failing"""
+    stub = StubSMTPServer(port=0, handshake_delay=0.05)
+    stub.start()
+    pool = SMTPPool('127.0.0.1', stub.port, SENDER, 'password', use_tls=False, size=2)
+    start = threading.Barrier(8)
+
+    def send(index):
+        start.wait()
+        return pool.send_message(make_message(index))
+
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(send, range(8)))
+    finally:
+        pool.close()
+        stub.stop()
+
+    assert results == [{}] * 8
+    assert len(stub.messages) == 8
+    assert pool.connections_opened <= 2
+
+
+def test_session_timeout_when_all_sessions_busy():
+    """An explicit timeout still gives up when no session frees up in time"""
+    stub = StubSMTPServer(port=0)
+    stub.start()
+    pool = SMTPPool('127.0.0.1', stub.port, use_tls=False, size=1)
+    try:
+        with pool.session():
+            try:
+                pool.send_message(make_message(0), timeout=0.1)
+            except TimeoutError:
+                pass
+            else:
+                raise AssertionError("Expected TimeoutError while the only session is in use")
+    finally:
+        pool.close()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    test_more_concurrent_sends_than_sessions()
+    test_session_timeout_when_all_sessions_busy()
+    print("✅ SMTP pool tests passed")
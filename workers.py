@@ -0,0 +1,228 @@
+"""
+Warm worker processes for Python callable tasks
+
+Tasks with task_type 'python' name a callable as 'module:function' instead
+of a shell command. They run in a small pool of long-lived worker
+processes that have the preload modules imported already, so a run costs
+a pipe round trip instead of a shell, an interpreter start and the
+imports. Workers are started with 'spawn', so they don't inherit the
+scheduler's threads or memory.
+
+A worker captures stdout and stderr, prints the return value as
+"Result: ..." like the example_tasks.py command line does, and maps
+SystemExit codes and exceptions to an exit code. A run that times out or
+is cancelled kills its worker, which is replaced with a fresh one; workers
+are also recycled after MAX_RUNS_PER_WORKER runs.
+"""
+
+import contextlib
+import importlib
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import traceback
+
+from runner import CommandResult
+
+logger = logging.getLogger(__name__)
+
+PYTHON_WORKERS = int(os.environ.get('SCHEDULER_PYTHON_WORKERS', '2'))
+PRELOAD_MODULES = [name.strip() for name in os.environ.get('SCHEDULER_PYTHON_PRELOAD', 'example_tasks').split(',')
+                   if name.strip()]
+MAX_RUNS_PER_WORKER = int(os.environ.get('SCHEDULER_PYTHON_WORKER_MAX_RUNS', '1000'))
+
+CALLABLE_PATTERN = re.compile(r'^[A-Za-z_][\w.]*:[A-Za-z_][\w.]*$')
+
+# How often a waiting run checks whether it was cancelled
+_POLL_SECONDS = 0.2
+
+
+def validate_callable(reference: str):
+    """Check a 'module:function' reference"""
+    if not CALLABLE_PATTERN.match(reference or ''):
+        raise ValueError(f"Invalid Python callable {reference!r}. Expected 'module:function'")
+
+
+def resolve(reference: str):
+    """Import a 'module:function' reference and return the callable"""
+    module_name, attribute = reference.split(':', 1)
+    target = importlib.import_module(module_name)
+    for part in attribute.split('.'):
+        target = getattr(target, part)
+    return target
+
+
+def _worker_main(conn, preload):
+    """Worker process loop: run callables sent over the pipe until told to stop"""
+    for module_name in preload:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"Could not preload {module_name}: {e}", file=sys.stderr)
+
+    while True:
+        try:
+            reference = conn.recv()
+        except (EOFError, OSError):
+            return
+        if reference is None:
+            return
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        returncode = 0
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                result = resolve(reference)()
+                if result is not None:
+                    print(f"Result: {result}")
+            except SystemExit as e:
+                if e.code is None or isinstance(e.code, int):
+                    returncode = e.code or 0
+                else:
+                    print(e.code, file=sys.stderr)
+                    returncode = 1
+            except BaseException:
+                traceback.print_exc()
+                returncode = 1
+        conn.send((returncode, stdout.getvalue(), stderr.getvalue()))
+
+
+class _Worker:
+    def __init__(self, context, preload):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, preload),
+                                       name='python-task-worker', daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class PythonRun:
+    """One callable run on the pool, with the same wait()/cancel() as runner.CommandRun"""
+
+    def __init__(self, pool: 'PythonWorkerPool', reference: str, timeout: float = None):
+        self.pool = pool
+        self.reference = reference
+        self.timeout = timeout
+        self._cancelled = threading.Event()
+        self._worker = None
+
+    @property
+    def pid(self):
+        """The pid of the worker running the callable, once it has one"""
+        return self._worker.process.pid if self._worker else None
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def wait(self) -> CommandResult:
+        worker = self.pool._checkout(self._cancelled)
+        if worker is None:
+            return CommandResult(None, '', '', cancelled=True)
+        self._worker = worker
+
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        try:
+            worker.conn.send(self.reference)
+            while not worker.conn.poll(_POLL_SECONDS):
+                if self._cancelled.is_set():
+                    self.pool._recycle(worker)
+                    return CommandResult(None, '', '', cancelled=True)
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.pool._recycle(worker)
+                    return CommandResult(None, '', '', timed_out=True)
+            returncode, stdout, stderr = worker.conn.recv()
+        except (EOFError, OSError):
+            # The worker died mid-run, e.g. the callable crashed the interpreter
+            worker.process.join(timeout=5)
+            exitcode = worker.process.exitcode
+            self.pool._recycle(worker)
+            return CommandResult(exitcode if exitcode else 1, '', 'Python worker exited unexpectedly')
+
+        self.pool._checkin(worker)
+        return CommandResult(returncode, stdout, stderr)
+
+
+class PythonWorkerPool:
+    """A fixed number of warm worker processes for Python callable tasks"""
+
+    def __init__(self, size: int = PYTHON_WORKERS, preload=None):
+        self.size = max(1, size)
+        self.preload = list(PRELOAD_MODULES if preload is None else preload)
+        self._context = multiprocessing.get_context('spawn')
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._closed = False
+
+    def start(self):
+        """Start the workers"""
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+        logger.info(f"Started {self.size} Python task worker(s), preloaded: {', '.join(self.preload) or 'nothing'}")
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self.preload)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _checkout(self, cancelled: threading.Event):
+        while not cancelled.is_set():
+            try:
+                return self._idle.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return None
+
+    def _checkin(self, worker: _Worker):
+        worker.runs += 1
+        if worker.runs >= MAX_RUNS_PER_WORKER:
+            with self._lock:
+                self._workers.discard(worker)
+            worker.stop()
+            worker = self._spawn()
+        self._idle.put(worker)
+
+    def _recycle(self, worker: _Worker):
+        """Kill a worker and replace it"""
+        with self._lock:
+            self._workers.discard(worker)
+        worker.kill()
+        if not self._closed:
+            self._idle.put(self._spawn())
+
+    def run(self, reference: str, timeout: float = None) -> PythonRun:
+        """Prepare a run of a 'module:function' callable; call wait() to run it"""
+        return PythonRun(self, reference, timeout)
+
+    def shutdown(self):
+        """Stop all workers"""
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()